@@ -5,31 +5,35 @@ import aiohttp
 from aiogram import Bot, Router, F, BaseMiddleware
 from aiogram.types import (
 	Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
-	ReplyKeyboardMarkup, KeyboardButton
+	ReplyKeyboardMarkup, KeyboardButton, InlineQuery
 )
 from aiogram.filters import Command, BaseFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import Union, Dict, Any
 
-from config import ADMINS, BOT_TOKEN
+from config import ADMINS, BOT_TOKEN, BOT_STATUS_REFRESH_INTERVAL
 from database import (
-	get_user, get_all_users, update_balance, add_transaction,
+	get_user, count_users,
 	add_wallet, get_all_wallets, delete_wallet, get_wallet,
 	add_payment_method, get_all_payment_methods, delete_payment_method, get_payment_method,
 	get_setting, update_setting, search_user_by_id, search_user_by_bot_id,
 	block_user, unblock_user, is_user_blocked, add_money_to_user, subtract_money_from_user,
-	create_connection
+	create_connection, run_db, run_write, get_stats_counters
 )
 from channels import (
 	get_required_channels, delete_required_channel, add_required_channel,
 	get_required_bots, delete_required_bot, add_required_bot,
 	create_subscription_keyboard, check_subscription_status,
-	get_custom_links, add_custom_link, delete_custom_link
+	get_custom_links, add_custom_link, delete_custom_link,
+	subscription_cache, join_request_users
 )
 
 router = Router()
 
+# YANGI: bot holati keshi - middleware har bir yangilanishda bazaga murojaat qilmaydi
+_bot_status = {"is_active": None, "loaded_at": 0.0}
+
 class AdminHolati(StatesGroup):
 	hamyon_nomi_kutilmoqda = State()
 	karta_raqami_kutilmoqda = State()
@@ -139,7 +143,7 @@ async def admin_list_callback(callback: CallbackQuery):
 	main_admin = get_main_admin()
 	
 	for admin_id in ADMINS:
-		user = get_user(admin_id)
+		user = await run_db(get_user, admin_id)
 		admin_name = user[2] if user else f"Admin {admin_id}"
 		
 		if admin_id == main_admin:
@@ -179,7 +183,7 @@ async def admin_info_callback(callback: CallbackQuery):
 		return
 	
 	admin_id = int(callback.data.split("_")[2])
-	user = get_user(admin_id)
+	user = await run_db(get_user, admin_id)
 	main_admin = get_main_admin()
 	
 	if not user:
@@ -251,7 +255,7 @@ async def process_admin_id(message: Message, state: FSMContext):
 	try:
 		new_admin_id = int(message.text.strip())
 		
-		user = get_user(new_admin_id)
+		user = await run_db(get_user, new_admin_id)
 		
 		if not user:
 			await message.answer(
@@ -342,7 +346,7 @@ async def remove_admin_callback(callback: CallbackQuery):
 		
 		update_config_file()
 		
-		user = get_user(admin_id)
+		user = await run_db(get_user, admin_id)
 		user_name = user[2] if user else f"ID: {admin_id}"
 		
 		await callback.answer(f"✅ {user_name} adminlikdan olib tashlandi.")
@@ -377,32 +381,47 @@ def update_config_file():
 		logging.error(f"Config faylini yangilashda xatolik: {e}")
 		return False
 
+def format_cache_stats():
+	"""Obuna keshlari statistikasi (hit/miss)"""
+	text = "🗄 Kesh statistikasi:\n"
+	for cache in (subscription_cache, join_request_users):
+		stats = cache.stats()
+		text += (
+			f"• {stats['name']}: {stats['size']}/{stats['maxsize']}, "
+			f"hit {stats['hits']}, miss {stats['misses']} ({stats['hit_rate']:.1f}%)\n"
+		)
+	return text
+
 @router.callback_query(F.data == "admin_stats")
 async def admin_stats_callback(callback: CallbackQuery):
 	if callback.from_user.id not in ADMINS:
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	users = get_all_users()
-	total_users = len(users)
+	# YANGI: hisoblagichlar jadvalidan o'qiladi - foydalanuvchilar soniga bog'liq emas
+	stats = await run_db(get_stats_counters)
+	total_users = stats.get("users_total", 0)
 	
-	total_balance = sum(user[4] for user in users if user[4])
-	blocked_users = sum(1 for user in users if user[10] == 1)
-	users_with_phone = sum(1 for user in users if user[8])
+	total_balance = stats.get("balance_total", 0)
+	blocked_users = stats.get("users_blocked", 0)
+	users_with_phone = stats.get("users_with_phone", 0)
+	# YANGI: xabar yetkazib bo'lmaydigan (botni bloklagan/o'chirilgan) foydalanuvchilar faol hisoblanmaydi
+	inactive_users = stats.get("users_unreachable", 0)
+	active_users = stats.get("users_active", 0)
 	
-	wallets = get_all_wallets()
+	wallets = await run_db(get_all_wallets)
 	total_wallets = len(wallets)
 	
-	payment_methods = get_all_payment_methods()
+	payment_methods = await run_db(get_all_payment_methods)
 	total_payment_methods = len(payment_methods)
 	
-	channels = get_required_channels()
+	channels = await run_db(get_required_channels)
 	total_channels = len(channels)
 	
-	bots = get_required_bots()
+	bots = await run_db(get_required_bots)
 	total_bots = len(bots)
 	
-	links = get_custom_links()
+	links = await run_db(get_custom_links)
 	total_links = len(links)
 	
 	inline_keyboard = InlineKeyboardMarkup(
@@ -419,6 +438,8 @@ async def admin_stats_callback(callback: CallbackQuery):
 	await callback.message.edit_text(
 		f"📊 Statistika:\n\n"
 		f"👥 Jami foydalanuvchilar: {total_users}\n"
+		f"✅ Faol foydalanuvchilar: {active_users}\n"
+		f"🔕 Nofaol foydalanuvchilar: {inactive_users}\n"
 		f"📱 Telefon raqamli foydalanuvchilar: {users_with_phone}\n"
 		f"🚫 Bloklangan foydalanuvchilar: {blocked_users}\n"
 		f"💰 Jami balans: {total_balance:,.0f} UZS\n"
@@ -426,7 +447,8 @@ async def admin_stats_callback(callback: CallbackQuery):
 		f"💳 Jami to'lov usullari: {total_payment_methods}\n"
 		f"📢 Jami majburiy kanallar: {total_channels}\n"
 		f"🤖 Jami majburiy botlar: {total_bots}\n"
-		f"🔗 Jami linklar: {total_links}",
+		f"🔗 Jami linklar: {total_links}\n\n"
+		f"{format_cache_stats()}",
 		reply_markup=inline_keyboard
 	)
 	await callback.answer()
@@ -437,26 +459,30 @@ async def refresh_stats_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	users = get_all_users()
-	total_users = len(users)
+	# YANGI: hisoblagichlar jadvalidan o'qiladi - foydalanuvchilar soniga bog'liq emas
+	stats = await run_db(get_stats_counters)
+	total_users = stats.get("users_total", 0)
 	
-	total_balance = sum(user[4] for user in users if user[4])
-	blocked_users = sum(1 for user in users if user[10] == 1)
-	users_with_phone = sum(1 for user in users if user[8])
+	total_balance = stats.get("balance_total", 0)
+	blocked_users = stats.get("users_blocked", 0)
+	users_with_phone = stats.get("users_with_phone", 0)
+	# YANGI: xabar yetkazib bo'lmaydigan (botni bloklagan/o'chirilgan) foydalanuvchilar faol hisoblanmaydi
+	inactive_users = stats.get("users_unreachable", 0)
+	active_users = stats.get("users_active", 0)
 	
-	wallets = get_all_wallets()
+	wallets = await run_db(get_all_wallets)
 	total_wallets = len(wallets)
 	
-	payment_methods = get_all_payment_methods()
+	payment_methods = await run_db(get_all_payment_methods)
 	total_payment_methods = len(payment_methods)
 	
-	channels = get_required_channels()
+	channels = await run_db(get_required_channels)
 	total_channels = len(channels)
 	
-	bots = get_required_bots()
+	bots = await run_db(get_required_bots)
 	total_bots = len(bots)
 	
-	links = get_custom_links()
+	links = await run_db(get_custom_links)
 	total_links = len(links)
 	
 	inline_keyboard = InlineKeyboardMarkup(
@@ -473,6 +499,8 @@ async def refresh_stats_callback(callback: CallbackQuery):
 	await callback.message.edit_text(
 		f"📊 Statistika:\n\n"
 		f"👥 Jami foydalanuvchilar: {total_users}\n"
+		f"✅ Faol foydalanuvchilar: {active_users}\n"
+		f"🔕 Nofaol foydalanuvchilar: {inactive_users}\n"
 		f"📱 Telefon raqamli foydalanuvchilar: {users_with_phone}\n"
 		f"🚫 Bloklangan foydalanuvchilar: {blocked_users}\n"
 		f"💰 Jami balans: {total_balance:,.0f} UZS\n"
@@ -480,7 +508,8 @@ async def refresh_stats_callback(callback: CallbackQuery):
 		f"💳 Jami to'lov usullari: {total_payment_methods}\n"
 		f"📢 Jami majburiy kanallar: {total_channels}\n"
 		f"🤖 Jami majburiy botlar: {total_bots}\n"
-		f"🔗 Jami linklar: {total_links}",
+		f"🔗 Jami linklar: {total_links}\n\n"
+		f"{format_cache_stats()}",
 		reply_markup=inline_keyboard
 	)
 	await callback.answer("✅ Statistika yangilandi!")
@@ -491,7 +520,7 @@ async def admin_wallets_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	wallets = get_all_wallets()
+	wallets = await run_db(get_all_wallets)
 	
 	inline_keyboard = []
 	
@@ -534,7 +563,7 @@ async def admin_payments_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	payments = get_all_payment_methods()
+	payments = await run_db(get_all_payment_methods)
 	
 	inline_keyboard = []
 	
@@ -631,7 +660,7 @@ async def process_user_id_search(message: Message, state: FSMContext):
 	
 	try:
 		user_id = int(message.text.strip())
-		user = search_user_by_id(user_id)
+		user = await run_db(search_user_by_id, user_id)
 		
 		await state.clear()
 		
@@ -683,7 +712,7 @@ async def process_bot_id_search(message: Message, state: FSMContext):
 		return
 	
 	bot_id = message.text.strip()
-	user = search_user_by_bot_id(bot_id)
+	user = await run_db(search_user_by_bot_id, bot_id)
 	
 	await state.clear()
 	
@@ -760,17 +789,17 @@ async def block_user_callback(callback: CallbackQuery):
 		return
 	
 	user_id = int(callback.data.split("_")[2])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("❌ Foydalanuvchi topilmadi.")
 		return
 	
-	success = block_user(user_id)
+	success = await run_write(block_user, user_id)
 	
 	if success:
 		await callback.answer("✅ Foydalanuvchi bloklandi.")
-		user = get_user(user_id)
+		user = await run_db(get_user, user_id)
 		await show_user_info_callback(callback, user)
 	else:
 		await callback.answer("❌ Foydalanuvchini bloklashda xatolik yuz berdi.")
@@ -782,17 +811,17 @@ async def unblock_user_callback(callback: CallbackQuery):
 		return
 	
 	user_id = int(callback.data.split("_")[2])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("❌ Foydalanuvchi topilmadi.")
 		return
 	
-	success = unblock_user(user_id)
+	success = await run_write(unblock_user, user_id)
 	
 	if success:
 		await callback.answer("✅ Foydalanuvchi blokdan chiqarildi.")
-		user = get_user(user_id)
+		user = await run_db(get_user, user_id)
 		await show_user_info_callback(callback, user)
 	else:
 		await callback.answer("❌ Foydalanuvchini blokdan chiqarishda xatolik yuz berdi.")
@@ -853,7 +882,7 @@ async def add_money_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	user_id = int(callback.data.split("_")[2])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("❌ Foydalanuvchi topilmadi.")
@@ -887,7 +916,7 @@ async def subtract_money_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	user_id = int(callback.data.split("_")[2])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("❌ Foydalanuvchi topilmadi.")
@@ -930,28 +959,24 @@ async def process_money_amount(message: Message, state: FSMContext):
 		user_id = state_data.get("target_user_id")
 		action = state_data.get("action")
 		
-		user = get_user(user_id)
+		user = await run_db(get_user, user_id)
 		if not user:
 			await message.answer("❌ Foydalanuvchi topilmadi.")
 			await state.clear()
 			return
 		
+		# Xabar qayta kelsa (Telegram qayta yuborsa) pul ikkinchi marta o'zgarmaydi
+		payment_id = f"admin_{action}_{message.chat.id}_{message.message_id}"
 		if action == "add":
-			success = add_money_to_user(user_id, amount)
+			applied, new_balance = await run_write(add_money_to_user, user_id, amount, payment_id)
 			action_text = "qo'shildi"
-			transaction_type = "admin_add"
 		else:
-			success = subtract_money_from_user(user_id, amount)
+			applied, new_balance = await run_write(subtract_money_from_user, user_id, amount, payment_id)
 			action_text = "ayirildi"
-			transaction_type = "admin_subtract"
 		
 		await state.clear()
 		
-		if success:
-			updated_user = get_user(user_id)
-			
-			add_transaction(user_id, amount, transaction_type, f"admin_{message.from_user.id}")
-			
+		if new_balance is not None:
 			inline_keyboard = InlineKeyboardMarkup(
 				inline_keyboard=[
 					[
@@ -968,7 +993,7 @@ async def process_money_amount(message: Message, state: FSMContext):
 				f"👤 Foydalanuvchi: {user[2]}\n"
 				f"🆔 ID: {user_id}\n"
 				f"💰 Miqdor: {amount:,.0f} UZS\n"
-				f"💵 Yangi balans: {updated_user[4]:,.0f} UZS",
+				f"💵 Yangi balans: {new_balance:,.0f} UZS",
 				reply_markup=inline_keyboard
 			)
 		else:
@@ -984,7 +1009,7 @@ async def cancel_money_operation_callback(callback: CallbackQuery, state: FSMCon
 		return
 	
 	user_id = int(callback.data.split("_")[3])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	await state.clear()
 	
@@ -1011,7 +1036,7 @@ async def view_user_callback(callback: CallbackQuery):
 		return
 	
 	user_id = int(callback.data.split("_")[2])
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if user:
 		await show_user_info_callback(callback, user)
@@ -1024,9 +1049,9 @@ async def list_all_users_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	users = get_all_users()
+	total_users = await run_db(count_users)
 	
-	if not users:
+	if not total_users:
 		await callback.message.edit_text(
 			"👥 Foydalanuvchilar ro'yxati bo'sh.",
 			reply_markup=InlineKeyboardMarkup(
@@ -1040,8 +1065,6 @@ async def list_all_users_callback(callback: CallbackQuery):
 		await callback.answer()
 		return
 	
-	total_users = len(users)
-	
 	await callback.message.edit_text(
 		f"👥 Foydalanuvchilar soni: {total_users}\n\n"
 		f"Foydalanuvchi haqida ma'lumot olish uchun ID orqali qidiring.",
@@ -1077,8 +1100,8 @@ async def admin_referral_settings_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1172,10 +1195,10 @@ async def process_referral_reward(message: Message, state: FSMContext):
 			await state.clear()
 			return
 		
-		update_setting(reward_type, str(new_reward))
+		await run_write(update_setting, reward_type, str(new_reward))
 		
-		reward_uzb = get_setting("referral_reward_uzb", "100")
-		reward_foreign = get_setting("referral_reward_foreign", "80")
+		reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+		reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 		
 		await state.clear()
 		
@@ -1215,8 +1238,8 @@ async def cancel_change_reward_callback(callback: CallbackQuery, state: FSMConte
 	
 	await state.clear()
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1279,39 +1302,6 @@ async def back_to_admin_callback(callback: CallbackQuery):
 	)
 	await callback.answer()
 
-def create_bot_status_table():
-	conn = create_connection()
-	if not conn:
-		return False
-	
-	cursor = conn.cursor()
-	
-	try:
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bot_status (
-            id INTEGER PRIMARY KEY,
-            is_active INTEGER DEFAULT 1,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_by INTEGER
-        )
-        ''')
-		
-		cursor.execute("SELECT COUNT(*) FROM bot_status")
-		count = cursor.fetchone()[0]
-		
-		if count == 0:
-			cursor.execute(
-				"INSERT INTO bot_status (id, is_active) VALUES (1, 1)"
-			)
-		
-		conn.commit()
-		return True
-	except Exception as e:
-		logging.error(f"Error creating bot status table: {e}")
-		return False
-	finally:
-		conn.close()
-
 def get_bot_status():
 	conn = create_connection()
 	if not conn:
@@ -1351,6 +1341,8 @@ def set_bot_status(is_active, updated_by):
 		)
 		
 		conn.commit()
+		_bot_status["is_active"] = bool(is_active)
+		_bot_status["loaded_at"] = time.monotonic()
 		return True
 	except Exception as e:
 		logging.error(f"Error setting bot status: {e}")
@@ -1358,6 +1350,18 @@ def set_bot_status(is_active, updated_by):
 	finally:
 		conn.close()
 
+async def get_cached_bot_status():
+	"""Keshdagi bot holati; BOT_STATUS_REFRESH_INTERVAL o'tgach bazadan qayta o'qiladi"""
+	now = time.monotonic()
+	is_stale = BOT_STATUS_REFRESH_INTERVAL > 0 and now - _bot_status["loaded_at"] >= BOT_STATUS_REFRESH_INTERVAL
+	
+	if _bot_status["is_active"] is None or is_stale:
+		# Boshqa parallel yangilanishlar shu vaqtda eski qiymatdan foydalanadi
+		_bot_status["loaded_at"] = now
+		_bot_status["is_active"] = await run_db(get_bot_status)
+	
+	return _bot_status["is_active"]
+
 class BotStatusMiddleware(BaseMiddleware):
 	async def __call__(self, handler, event, data):
 		if hasattr(event, 'from_user') and event.from_user and event.from_user.id in ADMINS:
@@ -1366,7 +1370,7 @@ class BotStatusMiddleware(BaseMiddleware):
 		if isinstance(event, CallbackQuery) and event.data == "check_subscription":
 			return await handler(event, data)
 		
-		is_active = get_bot_status()
+		is_active = await get_cached_bot_status()
 		
 		if not is_active:
 			if isinstance(event, Message):
@@ -1380,6 +1384,8 @@ class BotStatusMiddleware(BaseMiddleware):
 					"🔧 Botda texnik ishlar olib borilmoqda. Iltimos, keyinroq qayta urinib ko'ring.",
 					show_alert=True
 				)
+			elif isinstance(event, InlineQuery):
+				await event.answer([], cache_time=5, is_personal=True)
 			return None
 		
 		return await handler(event, data)
@@ -1390,7 +1396,7 @@ async def bot_status_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	is_active = get_bot_status()
+	is_active = await run_db(get_bot_status)
 	
 	status_text = "✅ Yoqilgan" if is_active else "❌ O'chirilgan"
 	toggle_text = "❌ O'chirish" if is_active else "✅ Yoqish"
@@ -1427,7 +1433,7 @@ async def toggle_bot_status_callback(callback: CallbackQuery):
 	action = callback.data.split("_")[2]
 	is_active = action == "on"
 	
-	success = set_bot_status(is_active, callback.from_user.id)
+	success = await run_write(set_bot_status, is_active, callback.from_user.id)
 	
 	if not success:
 		await callback.answer("❌ Bot holatini o'zgartirishda xatolik yuz berdi.")
@@ -1467,7 +1473,7 @@ async def wallet_info_callback(callback: CallbackQuery):
 		return
 	
 	wallet_id = int(callback.data.split("_")[2])
-	wallet = get_wallet(wallet_id)
+	wallet = await run_db(get_wallet, wallet_id)
 	
 	if not wallet:
 		await callback.answer("⚠️ Hamyon topilmadi.")
@@ -1507,7 +1513,7 @@ async def payment_method_info_callback(callback: CallbackQuery):
 		return
 	
 	method_id = int(callback.data.split("_")[3])
-	method = get_payment_method(method_id)
+	method = await run_db(get_payment_method, method_id)
 	
 	if not method:
 		await callback.answer("⚠️ To'lov usuli topilmadi.")
@@ -1549,7 +1555,7 @@ async def delete_payment_callback(callback: CallbackQuery):
 		return
 	
 	payment_id = int(callback.data.split("_")[2])
-	payment = get_payment_method(payment_id)
+	payment = await run_db(get_payment_method, payment_id)
 	
 	if not payment:
 		await callback.answer("⚠️ To'lov usuli topilmadi.")
@@ -1557,7 +1563,7 @@ async def delete_payment_callback(callback: CallbackQuery):
 	
 	payment_name = payment[1]
 	
-	success = delete_payment_method(payment_id)
+	success = await run_write(delete_payment_method, payment_id)
 	
 	if success:
 		await callback.answer(f"✅ \"{payment_name}\" to'lov usuli o'chirildi.")
@@ -1665,7 +1671,7 @@ async def process_payment_image(message: Message, state: FSMContext):
 	payment_name = state_data.get("payment_name")
 	payment_token = state_data.get("payment_token")
 	
-	success, payment_id = add_payment_method(payment_name, payment_token, payment_image)
+	success, payment_id = await run_write(add_payment_method, payment_name, payment_token, payment_image)
 	
 	if success:
 		await message.answer(
@@ -1726,7 +1732,7 @@ async def delete_wallet_callback(callback: CallbackQuery):
 		return
 	
 	wallet_id = int(callback.data.split("_")[2])
-	wallet = get_wallet(wallet_id)
+	wallet = await run_db(get_wallet, wallet_id)
 	
 	if not wallet:
 		await callback.answer("⚠️ Hamyon topilmadi.")
@@ -1734,7 +1740,7 @@ async def delete_wallet_callback(callback: CallbackQuery):
 	
 	wallet_name = wallet[1]
 	
-	success = delete_wallet(wallet_id)
+	success = await run_write(delete_wallet, wallet_id)
 	
 	if success:
 		await callback.answer(f"✅ \"{wallet_name}\" hamyoni o'chirildi.")
@@ -1843,7 +1849,7 @@ async def process_card_owner(message: Message, state: FSMContext):
 	wallet_name = state_data.get("wallet_name")
 	card_number = state_data.get("card_number")
 	
-	success, wallet_id = add_wallet(wallet_name, card_number, card_owner)
+	success, wallet_id = await run_write(add_wallet, wallet_name, card_number, card_owner)
 	
 	if success:
 		inline_keyboard = InlineKeyboardMarkup(
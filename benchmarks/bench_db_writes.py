@@ -0,0 +1,74 @@
+"""
+Yozish tezligi: eski yo'l (har bir yozuv uchun sqlite3.connect + commit) va
+WAL + yagona writer thread (database.run_write) solishtiriladi.
+
+    python benchmarks/bench_db_writes.py [--writes 3000]
+"""
+import time
+import sqlite3
+import asyncio
+import argparse
+
+from common import use_temp_database
+from database import DB_PATH, create_connection, run_write, start_db_writer, close_db_pool
+from migrations import run_migrations
+
+LEGACY_DB = "legacy.db"
+INSERT_SQL = "INSERT INTO transactions (user_id, amount, transaction_type, payment_id) VALUES (?, ?, ?, ?)"
+
+def legacy_write(i):
+	# Avvalgi create_connection(): har safar yangi ulanish, rollback jurnali
+	conn = sqlite3.connect(LEGACY_DB)
+	try:
+		conn.execute(INSERT_SQL, (i, 1, "bench", f"legacy_{i}"))
+		conn.commit()
+	finally:
+		conn.close()
+
+def pooled_write(i):
+	conn = create_connection()
+	try:
+		conn.execute(INSERT_SQL, (i, 1, "bench", f"writer_{i}"))
+		conn.commit()
+		return True
+	finally:
+		conn.close()
+
+def count_rows(path):
+	conn = sqlite3.connect(path)
+	try:
+		return conn.execute("SELECT COUNT(*) FROM transactions WHERE transaction_type = 'bench'").fetchone()[0]
+	finally:
+		conn.close()
+
+async def measure_writer(writes):
+	start_db_writer()
+	try:
+		started = time.perf_counter()
+		await asyncio.gather(*(run_write(pooled_write, i) for i in range(writes)))
+		return time.perf_counter() - started
+	finally:
+		close_db_pool()
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--writes", type=int, default=3000)
+	args = parser.parse_args()
+	
+	use_temp_database()
+	if not run_migrations(LEGACY_DB):
+		raise SystemExit("Migratsiyalar bajarilmadi")
+	
+	started = time.perf_counter()
+	for i in range(args.writes):
+		legacy_write(i)
+	legacy_elapsed = time.perf_counter() - started
+	
+	writer_elapsed = asyncio.run(measure_writer(args.writes))
+	
+	print(f"{args.writes} ta tranzaksiya yozuvi:")
+	print(f"  sqlite3.connect + commit:  {args.writes / legacy_elapsed:8.0f} writes/s ({count_rows(LEGACY_DB)} qator)")
+	print(f"  WAL + writer (run_write):  {args.writes / writer_elapsed:8.0f} writes/s ({count_rows(DB_PATH)} qator)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,76 @@
+"""
+Bot API chaqiruvlari: har bir so'rov uchun yangi ClientSession (eski yo'l) va
+channels.get_http_session() umumiy sessiyasi. Mahalliy aiohttp stub server
+ishlatiladi (oddiy HTTP - TLS handshake vaqti hisobga kirmaydi, real farq bundan katta).
+
+    python benchmarks/bench_http_session.py [--requests 2000] [--concurrency 50]
+"""
+import time
+import asyncio
+import logging
+import argparse
+
+import aiohttp
+from aiohttp import web
+
+from common import percentile
+# channels va admin bir-birini import qiladi - bot.py dagi tartibda yuklanadi
+import admin  # noqa: F401
+from channels import get_http_session, close_http_session
+
+async def get_chat(request):
+	return web.json_response({"ok": True, "result": {"id": int(request.query.get("chat_id", 0)), "type": "private"}})
+
+async def per_call_session(url):
+	async with aiohttp.ClientSession() as session:
+		async with session.get(url, params={"chat_id": 1}) as response:
+			await response.json()
+
+async def shared_session(url):
+	async with get_http_session().get(url, params={"chat_id": 1}) as response:
+		await response.json()
+
+async def measure(call, url, requests, concurrency):
+	semaphore = asyncio.Semaphore(concurrency)
+	latencies = []
+	
+	async def one():
+		async with semaphore:
+			started = time.perf_counter()
+			await call(url)
+			latencies.append(time.perf_counter() - started)
+	
+	started = time.perf_counter()
+	await asyncio.gather(*(one() for _ in range(requests)))
+	return requests / (time.perf_counter() - started), latencies
+
+async def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--requests", type=int, default=2000)
+	parser.add_argument("--concurrency", type=int, default=50)
+	args = parser.parse_args()
+	
+	app = web.Application()
+	app.router.add_get("/bot{token}/getChat", get_chat)
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	site = web.TCPSite(runner, "127.0.0.1", 0)
+	await site.start()
+	port = site._server.sockets[0].getsockname()[1]
+	url = f"http://127.0.0.1:{port}/bot123:abc/getChat"
+	
+	try:
+		print(f"{args.requests} ta getChat, bir vaqtda {args.concurrency} ta:")
+		for label, call in (("har safar yangi sessiya", per_call_session), ("umumiy sessiya", shared_session)):
+			rate, latencies = await measure(call, url, args.requests, args.concurrency)
+			print(
+				f"  {label:24} {rate:6.0f} req/s, p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+				f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms"
+			)
+	finally:
+		await close_http_session()
+		await runner.cleanup()
+
+if __name__ == "__main__":
+	logging.disable(logging.WARNING)
+	asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Mahsulot qidiruvi: eski '%q%' LIKE so'rovlari va products_fts (FTS5) orqali
+tovar.search_products / get_all_products(search_query=...) solishtiriladi.
+
+    python benchmarks/bench_product_search.py [--products 100000] [--repeat 5]
+"""
+import time
+import random
+import argparse
+
+from common import use_temp_database
+import admin  # noqa: F401 - tovar <-> channels aylanma importi uchun avval admin
+from database import create_connection
+from tovar import PRODUCT_COLUMNS, Product, search_products, get_all_products
+
+WORDS = [
+	"telefon", "noutbuk", "quloqchin", "soat", "planshet", "kamera", "zaryadlovchi", "kabel",
+	"smartfon", "smartwatch", "o'zbek", "oshxona", "kiyim", "poyabzal", "sumka", "televizor",
+	"телефон", "наушники", "часы", "ноутбук", "Café", "qora", "oq", "yangi", "arzon"
+]
+SYLLABLES = ["ka", "lo", "mi", "ra", "to", "su", "ne", "vo", "di", "ba", "ze", "qu"]
+BRANDS = ["Samsung", "Xiaomi", "Apple", "Artel", "Huawei", "Lenovo", "Sony", "LG"]
+CATEGORIES = ["Elektronika", "Maishiy texnika", "Kiyim", "Umumiy"]
+
+QUERIES = [
+	("umumiy so'z", "telefon"),
+	("prefiks", "smart"),
+	("kirill so'zi", "наушники"),
+	("ikki so'z", "qora telefon"),
+	("kam uchraydigan so'z", "zumrad"),
+	("topilmaydi", "mavjudemas"),
+]
+
+def legacy_search_products(query, limit=20):
+	# Avvalgi tovar.search_products()
+	conn = create_connection()
+	try:
+		search_query = f"%{query}%"
+		rows = conn.execute(f'''
+            SELECT {PRODUCT_COLUMNS} FROM products
+            WHERE is_active = 1 AND (
+                name LIKE ? OR
+                description LIKE ? OR
+                tags LIKE ? OR
+                brand LIKE ? OR
+                category LIKE ?
+            )
+            ORDER BY
+                CASE WHEN name LIKE ? THEN 1 ELSE 2 END,
+                sales_count DESC
+            LIMIT ?
+        ''', (search_query, search_query, search_query, search_query, search_query, search_query, limit)).fetchall()
+		return [Product(*row) for row in rows]
+	finally:
+		conn.close()
+
+def legacy_get_all_products(search_query, limit=20):
+	# Avvalgi get_all_products(search_query=...) - standart saralash bilan
+	conn = create_connection()
+	try:
+		search_param = f"%{search_query}%"
+		rows = conn.execute(
+			f"""SELECT {PRODUCT_COLUMNS} FROM products WHERE 1=1
+			AND (name LIKE ? OR description LIKE ? OR tags LIKE ? OR brand LIKE ?)
+			ORDER BY created_at DESC LIMIT {limit}""",
+			(search_param, search_param, search_param, search_param)
+		).fetchall()
+		return [Product(*row) for row in rows]
+	finally:
+		conn.close()
+
+def fill_products(count):
+	rng = random.Random(42)
+	# Har bir so'z taxminan 9% mahsulotda uchrashi uchun lug'at to'ldiruvchi so'zlar bilan kengaytiriladi
+	vocabulary = WORDS + ["".join(rng.sample(SYLLABLES, 3)) for _ in range(100)]
+	rows = []
+	for i in range(count):
+		words = rng.sample(vocabulary, 3)
+		if i % 5000 == 0:
+			words.append("zumrad")
+		rows.append((
+			f"P{i}", " ".join(words).capitalize(), " ".join(rng.sample(vocabulary, 8)), rng.randint(10, 5000) * 1000,
+			"simple", 1, rng.choice(CATEGORIES), ",".join(rng.sample(vocabulary, 2)), rng.choice(BRANDS),
+			int(i % 10 != 0), rng.randint(0, 500)
+		))
+	
+	conn = create_connection()
+	try:
+		conn.executemany(
+			"""INSERT INTO products (product_id, name, description, price, product_type, created_by, category, tags,
+			brand, is_active, sales_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+			rows
+		)
+		conn.commit()
+	finally:
+		conn.close()
+
+def per_query_ms(func, query, repeat):
+	func(query)
+	started = time.perf_counter()
+	for _ in range(repeat):
+		func(query)
+	return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--products", type=int, default=100000)
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+	
+	use_temp_database()
+	started = time.perf_counter()
+	fill_products(args.products)
+	print(f"{args.products} ta mahsulot {time.perf_counter() - started:.1f}s da yozildi (FTS triggerlari bilan)")
+	
+	print(f"{'so`rov':24} {'search_products, ms':>24} {'get_all_products, ms':>24}")
+	for label, query in QUERIES:
+		search = (per_query_ms(legacy_search_products, query, args.repeat),
+		          per_query_ms(search_products, query, args.repeat))
+		listing = (per_query_ms(legacy_get_all_products, query, args.repeat),
+		           per_query_ms(lambda q: get_all_products(search_query=q, limit=20), query, args.repeat))
+		print(f"{label:24} {search[0]:11.1f} -> {search[1]:8.1f} {listing[0]:11.1f} -> {listing[1]:8.1f}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,156 @@
+"""
+Sotuvni yozish: eski record_sale (har chaqiruvda PRAGMA table_info, ustunlar logi,
+ikki alohida UPDATE) va tovar.record_sale (INSERT ... ON CONFLICT + bitta UPDATE).
+Ikkalasi ham writer thread ichida, production'dagidek INFO logi bilan o'lchanadi.
+
+    python benchmarks/bench_record_sale.py [--sales 3000] [--products 100]
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+
+from common import use_temp_database, percentile
+import admin  # noqa: F401 - tovar <-> channels aylanma importi uchun avval admin
+from database import create_connection, run_write, start_db_writer, close_db_pool
+from tovar import add_product, record_sale, FIXED_PAYMENT_AMOUNT
+
+logger = logging.getLogger("tovar")
+
+def legacy_record_sale(product_id, user_id, product_price, payment_method, customer_name=None, customer_phone=None,
+                       customer_location=None, **kwargs):
+	# Avvalgi tovar.record_sale()
+	conn = create_connection()
+	cursor = conn.cursor()
+	
+	try:
+		paid_amount = kwargs.get('paid_amount', FIXED_PAYMENT_AMOUNT)
+		remaining_amount = product_price - paid_amount
+		quantity = kwargs.get('quantity', 1)
+		unit_price = product_price / quantity if quantity > 0 else product_price
+		
+		cursor.execute("PRAGMA table_info(product_sales)")
+		columns = [column[1] for column in cursor.fetchall()]
+		logger.info(f"Product_sales table columns: {columns}")
+		
+		required_columns = [
+			('status', 'TEXT DEFAULT "completed"'),
+			('product_price', 'REAL DEFAULT 0'),
+			('paid_amount', 'REAL DEFAULT 0'),
+			('remaining_amount', 'REAL DEFAULT 0'),
+			('quantity', 'INTEGER DEFAULT 1'),
+			('unit_price', 'REAL DEFAULT 0')
+		]
+		
+		for column_name, column_type in required_columns:
+			if column_name not in columns:
+				cursor.execute(f'ALTER TABLE product_sales ADD COLUMN {column_name} {column_type}')
+				conn.commit()
+		
+		cursor.execute('''
+            INSERT INTO product_sales (
+                product_id, user_id, product_price, paid_amount, remaining_amount,
+                payment_method, customer_name, customer_phone, customer_location,
+                status, quantity, unit_price
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (product_id, user_id, product_price, paid_amount, remaining_amount,
+		      payment_method, customer_name, customer_phone, customer_location,
+		      'completed', quantity, unit_price))
+		
+		cursor.execute('''
+            UPDATE products
+            SET sales_count = sales_count + ?,
+                total_revenue = total_revenue + ?,
+                last_sold = CURRENT_TIMESTAMP
+            WHERE product_id = ?
+        ''', (quantity, paid_amount, product_id))
+
+		cursor.execute('''
+            UPDATE products
+            SET stock_quantity = CASE
+                WHEN stock_quantity > 0 THEN stock_quantity - ?
+                ELSE stock_quantity
+            END
+            WHERE product_id = ? AND stock_quantity > 0
+        ''', (quantity, product_id))
+
+		conn.commit()
+		logger.info(f"Sale recorded successfully: product_id={product_id}, user_id={user_id}, amount={paid_amount}")
+		return True
+	except Exception as e:
+		logger.error(f"Error recording sale: {e}")
+		conn.rollback()
+		return False
+	finally:
+		conn.close()
+
+def timed(func, timings, *args, **kwargs):
+	# Writer thread ichida faqat funksiyaning o'z vaqti
+	started = time.perf_counter()
+	result = func(*args, **kwargs)
+	timings.append(time.perf_counter() - started)
+	return result
+
+def product_totals(product_id):
+	conn = create_connection()
+	try:
+		return conn.execute(
+			"SELECT sales_count, (SELECT COUNT(*) FROM product_sales WHERE product_id = ?) FROM products WHERE product_id = ?",
+			(product_id, product_id)
+		).fetchone()
+	finally:
+		conn.close()
+
+async def measure(func, sales, products):
+	timings = []
+	started = time.perf_counter()
+	await asyncio.gather(*(
+		run_write(timed, func, timings, f"P{i % products}", 1000 + i, 50000, "card", payment_key=f"{func.__name__}_{i}")
+		for i in range(sales)
+	))
+	elapsed = time.perf_counter() - started
+	return timings, sales / elapsed
+
+async def run(sales, products):
+	start_db_writer()
+	try:
+		for i in range(products):
+			await run_write(add_product, f"P{i}", f"Mahsulot {i}", "Tavsif", 50000, None, None, None, "simple", 1,
+			                stock_quantity=1000000)
+		
+		results = {}
+		for func in (legacy_record_sale, record_sale):
+			results[func.__name__] = await measure(func, sales, products)
+		
+		before = product_totals("P0")
+		recorded = await asyncio.gather(*(
+			run_write(record_sale, "P0", 1, 50000, "card", payment_key="duplicate_charge") for _ in range(50)
+		))
+		after = product_totals("P0")
+		return results, recorded.count(True), (after[0] - before[0], after[1] - before[1])
+	finally:
+		close_db_pool()
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--sales", type=int, default=3000)
+	parser.add_argument("--products", type=int, default=100)
+	args = parser.parse_args()
+	
+	use_temp_database()
+	logging.disable(logging.NOTSET)
+	logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), force=True)
+	
+	results, recorded, (sales_delta, rows_delta) = asyncio.run(run(args.sales, args.products))
+	
+	print(f"{args.sales} ta sotuv, {args.products} ta mahsulot:")
+	for name, (timings, rate) in results.items():
+		print(f"  {name:20} p50 {percentile(timings, 0.5) * 1e6:6.0f} us, p95 {percentile(timings, 0.95) * 1e6:6.0f} us,"
+		      f" run_write orqali {rate:7.0f} sales/s")
+	print(f"  bir xil payment_key bilan 50 chaqiruv: {recorded} ta yozildi, sales_count +{sales_delta},"
+	      f" product_sales +{rows_delta}")
+
+if __name__ == "__main__":
+	main()
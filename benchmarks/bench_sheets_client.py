@@ -0,0 +1,128 @@
+"""
+Google Sheets ulanishi: har chaqiruvda avtorizatsiya + open_by_key + worksheet (eski yo'l)
+va google_sheets.sheets_manager keshlangan obyektlari. OAuth token endpointi va Sheets v4
+API mahalliy soxta server bilan almashtiriladi (haqiqiy JWT imzoli service account oqimi,
+har bir so'rovga --latency soniya kechikish).
+
+    python benchmarks/bench_sheets_client.py [--calls 50] [--latency 0.02]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import common  # noqa: F401
+import gspread
+import gspread.urls
+import gspread.client
+import gspread.worksheet
+import gspread.spreadsheet
+from google.oauth2.service_account import Credentials
+
+import google_sheets
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+SPREADSHEET_ID = "BENCH"
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+	latency = 0.02
+	counts = {}
+	
+	def log_message(self, *args):
+		pass
+	
+	def _count(self, name):
+		self.counts[name] = self.counts.get(name, 0) + 1
+	
+	def _reply(self, body):
+		time.sleep(self.latency)
+		payload = json.dumps(body).encode()
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(payload)))
+		self.end_headers()
+		self.wfile.write(payload)
+	
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get("Content-Length") or 0))
+		if self.path.startswith("/token"):
+			self._count("token")
+			self._reply({"access_token": "token", "expires_in": 3600, "token_type": "Bearer"})
+		else:
+			self._count("append")
+			self._reply({"updates": {"updatedRange": "Orders!A2:L2"}})
+	
+	def do_GET(self):
+		self._count("metadata")
+		self._reply({
+			"spreadsheetId": SPREADSHEET_ID,
+			"properties": {"title": "Bench"},
+			"sheets": [{"properties": {
+				"title": google_sheets.WORKSHEET_NAME, "sheetId": 0, "index": 0,
+				"gridProperties": {"rowCount": 1000, "columnCount": 20}
+			}}]
+		})
+
+def redirect_sheets_api(base_url):
+	for module in (gspread.urls, gspread.client, gspread.spreadsheet, gspread.worksheet):
+		for name in dir(module):
+			value = getattr(module, name)
+			if isinstance(value, str) and value.startswith(SHEETS_API):
+				setattr(module, name, value.replace(SHEETS_API, base_url))
+
+def write_service_account(token_uri):
+	key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+		serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+	).decode()
+	with open(google_sheets.GOOGLE_SHEETS_CREDENTIALS_FILE, "w") as file:
+		json.dump({
+			"type": "service_account", "project_id": "bench", "private_key_id": "bench", "private_key": key,
+			"client_email": "bench@bench.iam.gserviceaccount.com", "client_id": "1", "token_uri": token_uri
+		}, file)
+
+def legacy_get_worksheet():
+	# Avvalgi get_worksheet(): har chaqiruvda yangi credentials, authorize va metadata o'qish
+	credentials = Credentials.from_service_account_file(
+		google_sheets.GOOGLE_SHEETS_CREDENTIALS_FILE, scopes=google_sheets.SCOPES
+	)
+	return gspread.authorize(credentials).open_by_key(SPREADSHEET_ID).worksheet(google_sheets.WORKSHEET_NAME)
+
+def measure(get_worksheet, calls):
+	FakeGoogleHandler.counts.clear()
+	started = time.perf_counter()
+	for _ in range(calls):
+		get_worksheet().append_row(["x"] * len(google_sheets.WORKSHEET_HEADERS))
+	return (time.perf_counter() - started) / calls, dict(FakeGoogleHandler.counts)
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--calls", type=int, default=50)
+	parser.add_argument("--latency", type=float, default=0.02)
+	args = parser.parse_args()
+	
+	FakeGoogleHandler.latency = args.latency
+	server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGoogleHandler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	base_url = f"http://127.0.0.1:{server.server_address[1]}"
+	
+	os.chdir(tempfile.mkdtemp(prefix="naxtbot-bench-"))
+	redirect_sheets_api(f"{base_url}/v4/spreadsheets")
+	write_service_account(f"{base_url}/token")
+	google_sheets.SPREADSHEET_ID = SPREADSHEET_ID
+	
+	print(f"{args.calls} ta get_worksheet() + append_row, so'rov kechikishi {args.latency * 1000:.0f}ms:")
+	for label, get_worksheet in (("har safar avtorizatsiya", legacy_get_worksheet),
+	                             ("sheets_manager", google_sheets.get_worksheet)):
+		elapsed, counts = measure(get_worksheet, args.calls)
+		print(f"  {label:24} {elapsed * 1000:6.1f} ms/chaqiruv, so'rovlar: {counts}")
+	
+	server.shutdown()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,70 @@
+"""
+Foydalanuvchilarni o'qish xotirasi: eski get_all_users() (SELECT * + fetchall) va
+count_users / iter_users / iter_user_batches keyset bo'laklari (tracemalloc cho'qqisi).
+
+    python benchmarks/bench_user_batches.py [--users 500000]
+"""
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+from common import use_temp_database
+from database import create_connection, count_users, iter_users, iter_user_batches
+
+def legacy_get_all_users():
+	# Avvalgi database.get_all_users()
+	conn = create_connection()
+	try:
+		return conn.execute("SELECT * FROM users").fetchall()
+	finally:
+		conn.close()
+
+def fill_users(count):
+	conn = create_connection()
+	try:
+		conn.executemany(
+			"""INSERT INTO users (id, username, full_name, bot_id, balance, phone_number, is_blocked, bot_blocked,
+			last_delivery_error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+			[(
+				i, f"user{i}", "Full Name Of User", f"{i:07d}", i * 10.0,
+				"+998901234567" if i % 3 else None, int(i % 50 == 0), int(i % 40 == 0),
+				"Forbidden: bot was blocked by the user" if i % 40 == 0 else None
+			) for i in range(1, count + 1)]
+		)
+		conn.commit()
+	finally:
+		conn.close()
+
+async def count_broadcast_recipients():
+	count = 0
+	async for rows in iter_user_batches(("id",), ("reachable",), 100):
+		count += len(rows)
+	return count
+
+def measure(label, func):
+	tracemalloc.start()
+	started = time.perf_counter()
+	result = func()
+	elapsed = time.perf_counter() - started
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	print(f"  {label:44} {peak / 2 ** 20:8.1f} MiB {elapsed:6.2f}s -> {result}")
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--users", type=int, default=500000)
+	args = parser.parse_args()
+	
+	use_temp_database()
+	fill_users(args.users)
+	
+	print(f"{args.users} ta foydalanuvchi (tracemalloc cho'qqisi, vaqt, natija):")
+	measure("get_all_users + len", lambda: len(legacy_get_all_users()))
+	measure("count_users()", count_users)
+	measure("get_all_users, reachable Python'da", lambda: sum(1 for user in legacy_get_all_users() if not user[11]))
+	measure("iter_users(('id',), ('reachable',))", lambda: sum(1 for _ in iter_users(("id",), ("reachable",))))
+	measure("iter_user_batches, 100 tadan (broadcast)", lambda: asyncio.run(count_broadcast_recipients()))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,27 @@
+import os
+import sys
+import logging
+import tempfile
+
+# Skriptlar benchmarks/ ichidan ishga tushiriladi - bot modullari yuqori papkada
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+	sys.path.insert(0, ROOT)
+
+def use_temp_database():
+	"""
+	database.DB_PATH nisbiy yo'l - skript vaqtinchalik papkaga o'tadi, shu yerda
+	sxemani migratsiya qiladi va ishlayotgan botning bazasiga tegmaydi.
+	"""
+	workdir = tempfile.mkdtemp(prefix="naxtbot-bench-")
+	os.chdir(workdir)
+	logging.disable(logging.WARNING)
+	
+	import migrations
+	if not migrations.run_migrations():
+		raise SystemExit("Migratsiyalar bajarilmadi")
+	return workdir
+
+def percentile(values, fraction):
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
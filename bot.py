@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import re
+from aiohttp import web
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
 	Message, LabeledPrice, PreCheckoutQuery, ContentType,
@@ -9,37 +10,48 @@ from aiogram.types import (
 	Contact, Location
 )
 from aiogram.filters import Command, CommandStart
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from datetime import datetime
 from tovar import router as tovar_router, show_product_with_payment_buttons, FIXED_PAYMENT_AMOUNT, get_product, \
-	save_order_to_google_sheets, record_sale
-from config import BOT_TOKEN, PAYMENT_TOKEN, ADMINS, ORDER_CHANNEL, TASDIQID, HELPER_ID
+	record_sale, preload_product_cache
+from config import BOT_TOKEN, PAYMENT_TOKEN, ADMINS, ORDER_CHANNEL, TASDIQID, HELPER_ID, WEBHOOK_URL, \
+	WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
 from database import (
-	create_tables, add_user, get_user, update_balance,
-	add_transaction, get_next_bot_id, get_user_transactions,
+	add_user, get_user, apply_balance_change, get_next_bot_id, get_user_transactions,
 	add_pending_payment, get_pending_payment, update_payment_status,
 	get_all_wallets, get_wallet, get_payment_method, get_all_payment_methods,
-	get_user_by_bot_id, get_user_referral_count, is_user_blocked, get_setting
+	get_user_by_bot_id, get_user_referral_count, is_user_blocked, get_setting,
+	run_db, run_write, start_db_writer, close_db_pool, reset_delivery_failures, get_delivery_status,
+	reconcile_stats_counters, reconcile_ledger, run_stats_reconcile_loop
 )
+from migrations import run_migrations, check_query_plans
 import admin
 from admin import BotStatusMiddleware  # YANGI: Middleware import qilish
 import referral
 import channels
 from channels import register_channels_handlers, show_subscription_keyboard_if_needed
 import post
+import inline_catalog
+from broadcast import resume_broadcasts
+from delivery import send_to_user
+from fsm_storage import SQLiteStorage
+from sheets_outbox import start_sheets_worker, queue_order_for_sheets
+from message_outbox import start_message_outbox, wake_message_outbox
 from utils import create_wallet_keyboard
+from scheduler import job_handler, schedule_job, cancel_job, invoice_job_key, start_scheduler
 
 logging.basicConfig(level=logging.INFO)
 
 bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+storage = SQLiteStorage()
 dp = Dispatcher(storage=storage)
 
 # YANGI: BotStatusMiddleware ni qo'shish
 dp.message.middleware(BotStatusMiddleware())
 dp.callback_query.middleware(BotStatusMiddleware())
+dp.inline_query.middleware(BotStatusMiddleware())
 
 router = Router()
 dp.include_router(router)
@@ -47,6 +59,7 @@ dp.include_router(tovar_router)
 dp.include_router(admin.router)
 dp.include_router(referral.router)
 dp.include_router(post.router)
+dp.include_router(inline_catalog.router)
 register_channels_handlers(dp)
 
 class TolovHolati(StatesGroup):
@@ -133,7 +146,7 @@ async def start_handler(message: Message, state: FSMContext):
 	username = message.from_user.username
 	full_name = message.from_user.full_name
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
@@ -143,36 +156,45 @@ async def start_handler(message: Message, state: FSMContext):
 	
 	args = message.text.split()[1:] if len(message.text.split()) > 1 else []
 	
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
-		bot_id = get_next_bot_id()
+		bot_id = await run_write(get_next_bot_id)
 		
 		referrer_id = None
 		if args and args[0].startswith("ref_"):
 			try:
 				referrer_id = int(args[0].split("_")[1])
-				referrer = get_user(referrer_id)
+				referrer = await run_db(get_user, referrer_id)
 				if not referrer or referrer_id == user_id:
 					referrer_id = None
 			except (ValueError, IndexError):
 				referrer_id = None
 		
-		success = await add_user(user_id, username, full_name, bot_id, message.bot, None, "UZ", referrer_id)
+		success = await add_user(user_id, username, full_name, bot_id, None, "UZ", referrer_id)
 		
 		if not success:
 			await message.answer("⚠️ Ro'yxatdan o'tishda xatolik yuz berdi. Iltimos, qaytadan urinib ko'ring.")
 			return
 		
-		user = get_user(user_id)
+		if referrer_id:
+			# Referal bildirishnomasi navbatda - yuborilishini kutmaymiz
+			wake_message_outbox()
+		
+		user = await run_db(get_user, user_id)
+	else:
+		# YANGI: /start bosgan foydalanuvchi yana xabar qabul qila oladi - qayta faollashtirish
+		delivery_status = await run_db(get_delivery_status, user_id)
+		if delivery_status and any(delivery_status):
+			await run_write(reset_delivery_failures, [user_id])
 	
 	# PRODUCT START HANDLER - YANGILANGAN
 	if args and args[0].startswith("product_"):
 		product_id = args[0].replace("product_", "")
 		
-		product = get_product(product_id)
+		product = await run_db(get_product, product_id)
 		
-		if not product or not product[9]:  # product[9] - is_active
+		if not product or not product.is_active:
 			await message.answer("❌ Bu tovar mavjud emas yoki faol emas.")
 			return
 		
@@ -184,7 +206,7 @@ async def start_handler(message: Message, state: FSMContext):
 		try:
 			referrer_id = int(args[0].split("_")[1])
 			
-			referrer = get_user(referrer_id)
+			referrer = await run_db(get_user, referrer_id)
 			if referrer and referrer_id != user_id:
 				await show_main_menu(message, user)
 				return
@@ -271,12 +293,13 @@ async def back_to_product_callback(callback: CallbackQuery, state: FSMContext):
 	# State ni tozalash
 	await state.clear()
 
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 
-	if not product or not product[9]:  # product[9] - is_active
+	if not product or not product.is_active:
 		await callback.answer("❌ Bu tovar mavjud emas yoki faol emas.")
 		return
 
+	await cancel_job(invoice_job_key(callback.message.chat.id, callback.message.message_id))
 	try:
 		await callback.message.delete()  # Xabarni o‘chirish
 	except Exception:
@@ -308,6 +331,7 @@ async def cancel_product_order_callback(callback: CallbackQuery, state: FSMConte
 		resize_keyboard=True
 	)
 	
+	await cancel_job(invoice_job_key(callback.message.chat.id, callback.message.message_id))
 	try:
 		await callback.message.delete()
 	except Exception:
@@ -334,19 +358,19 @@ async def auto_payment_product_callback(callback: CallbackQuery, state: FSMConte
 	
 	logging.info(f"Auto payment callback: method_id={method_id}, product_id={product_id}")
 	
-	method = get_payment_method(method_id)
+	method = await run_db(get_payment_method, method_id)
 	if not method:
 		await callback.answer("⚠️ To'lov usuli topilmadi.")
 		return
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -414,15 +438,12 @@ async def auto_payment_product_callback(callback: CallbackQuery, state: FSMConte
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
 		# YANGILANGAN: Product ID ni ham yuborish
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				callback.bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				method_name,
-				product_id  # YANGI: Product ID qo'shildi
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			method_name,
+			product_id  # YANGI: Product ID qo'shildi
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -439,14 +460,14 @@ async def uzcard_payment_product_callback(callback: CallbackQuery, state: FSMCon
 	"""Handle UzCard payment for product - 50,000 UZS"""
 	product_id = callback.data.split("_")[3]
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -508,15 +529,12 @@ async def uzcard_payment_product_callback(callback: CallbackQuery, state: FSMCon
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
 		# YANGILANGAN: Product ID ni ham yuborish
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"UzCard",
-				product_id  # YANGI: Product ID qo'shildi
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"UzCard",
+			product_id  # YANGI: Product ID qo'shildi
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -532,14 +550,14 @@ async def humo_payment_product_callback(callback: CallbackQuery, state: FSMConte
 	"""Handle HumoCard payment for product - 50,000 UZS"""
 	product_id = callback.data.split("_")[3]
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -601,15 +619,12 @@ async def humo_payment_product_callback(callback: CallbackQuery, state: FSMConte
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
 		# YANGILANGAN: Product ID ni ham yuborish
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"HumoCard",
-				product_id  # YANGI: Product ID qo'shildi
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"HumoCard",
+			product_id  # YANGI: Product ID qo'shildi
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -625,14 +640,14 @@ async def click_payment_product_callback(callback: CallbackQuery, state: FSMCont
 	"""Handle CLICK payment for product - 50,000 UZS"""
 	product_id = callback.data.split("_")[3]
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -694,15 +709,12 @@ async def click_payment_product_callback(callback: CallbackQuery, state: FSMCont
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
 		# YANGILANGAN: Product ID ni ham yuborish
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"CLICK",
-				product_id  # YANGI: Product ID qo'shildi
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"CLICK",
+			product_id  # YANGI: Product ID qo'shildi
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -727,19 +739,19 @@ async def wallet_payment_product_callback(callback: CallbackQuery, state: FSMCon
 	
 	logging.info(f"Wallet payment callback: wallet_id={wallet_id}, product_id={product_id}")
 	
-	wallet = get_wallet(wallet_id)
+	wallet = await run_db(get_wallet, wallet_id)
 	if not wallet:
 		await callback.answer("⚠️ Hamyon topilmadi.")
 		return
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	# State ga ma'lumotlarni saqlash
 	await state.update_data(
@@ -956,15 +968,15 @@ async def confirm_wallet_payment_callback(callback: CallbackQuery):
 		return
 	
 	# Foydalanuvchi va tovar ma'lumotlarini olish
-	user = get_user(user_id)
-	product = get_product(product_id)
+	user = await run_db(get_user, user_id)
+	product = await run_db(get_product, product_id)
 	
 	if not user or not product:
 		await callback.answer("❌ Foydalanuvchi yoki tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	username = user[1] or "Yo'q"
 	
 	# Admin xabarini yangilash
@@ -1023,7 +1035,9 @@ async def confirm_wallet_payment_callback(callback: CallbackQuery):
 			product_price=product_price,
 			payment_amount=FIXED_PAYMENT_AMOUNT,
 			payment_method="WALLET",
-			remaining_debt=remaining_debt
+			remaining_debt=remaining_debt,
+			# Tasdiqlash xabari har bir to'lov uchun bitta
+			payment_key=f"wallet_{callback.message.chat.id}_{callback.message.message_id}"
 		)
 		await user_state.set_state(TolovHolati.mijoz_ismi_kutilmoqda)
 	
@@ -1062,16 +1076,14 @@ async def cancel_wallet_payment_callback(callback: CallbackQuery):
 		pass
 	
 	# Foydalanuvchiga xabar yuborish
-	try:
-		await callback.bot.send_message(
-			chat_id=user_id,
-			text="❌ <b>To'lov bekor qilindi</b>\n\n"
-			     "Sizning to'lov chekingiz tasdiqlash uchun javobgar shaxs tomonidan bekor qilindi.\n"
-			     "Iltimos, to'g'ri summa to'lang yoki admin bilan bog'laning.",
-			parse_mode="HTML"
-		)
-	except Exception as e:
-		logging.error(f"Error sending cancellation to user: {e}")
+	await send_to_user(
+		callback.bot,
+		user_id,
+		text="❌ <b>To'lov bekor qilindi</b>\n\n"
+		     "Sizning to'lov chekingiz tasdiqlash uchun javobgar shaxs tomonidan bekor qilindi.\n"
+		     "Iltimos, to'g'ri summa to'lang yoki admin bilan bog'laning.",
+		parse_mode="HTML"
+	)
 	
 	await callback.answer("❌ To'lov bekor qilindi!")
 
@@ -1174,13 +1186,13 @@ async def tasdiqid_custom_amount_input_handler(message: Message, state: FSMConte
 	user_id = data['user_id']
 	
 	# Product ma'lumotlarini olish
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	if not product:
 		await message.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	# Custom amount ni saqlash - TUZATILGAN
 	tasdiqid_custom_data[message.from_user.id]['custom_amount'] = custom_amount
@@ -1240,15 +1252,15 @@ async def tasdiqid_confirm_custom_callback(callback: CallbackQuery, state: FSMCo
 	logging.info(f"TASDIQID confirming custom amount: {custom_amount} for user {user_id}")
 	
 	# Foydalanuvchi va tovar ma'lumotlarini olish
-	user = get_user(user_id)
-	product = get_product(product_id)
+	user = await run_db(get_user, user_id)
+	product = await run_db(get_product, product_id)
 	
 	if not user or not product:
 		await callback.answer("❌ Foydalanuvchi yoki tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	username = user[1] or "Yo'q"
 	
 	# TASDIQID xabarini yangilash
@@ -1325,7 +1337,8 @@ async def tasdiqid_confirm_custom_callback(callback: CallbackQuery, state: FSMCo
 			product_price=product_price,
 			payment_amount=custom_amount,
 			payment_method="WALLET_CUSTOM",
-			remaining_debt=remaining_debt
+			remaining_debt=remaining_debt,
+			payment_key=f"wallet_{callback.message.chat.id}_{callback.message.message_id}"
 		)
 		await user_state.set_state(TolovHolati.mijoz_ismi_kutilmoqda)
 	
@@ -1553,15 +1566,19 @@ async def finalize_customer_order(message: Message, state: FSMContext):
 	payment_method = state_data.get('payment_method', 'WALLET')
 	remaining_debt = state_data.get('remaining_debt', 0)
 	
-	# Sotishni qayd qilish
-	success = record_sale(
+	# Sotishni qayd qilish - bir xil payment_key bilan ikkinchi chaqiruv (takroriy to'lov xabari,
+	# tasdiqlash tugmasini ikki marta bosish) sotuvni qayta sanamaydi va False qaytaradi
+	success = await run_write(
+		record_sale,
 		product_id=product_id,
 		user_id=message.from_user.id,
 		product_price=product_price,
 		payment_method=payment_method,
 		customer_name=customer_name,
 		customer_phone=customer_phone,
-		customer_location=customer_location
+		customer_location=customer_location,
+		payment_key=state_data.get('payment_key'),
+		paid_amount=payment_amount if payment_amount is not None else FIXED_PAYMENT_AMOUNT
 	)
 	
 	if success:
@@ -1580,7 +1597,8 @@ async def finalize_customer_order(message: Message, state: FSMContext):
 			'user_id': str(message.from_user.id)
 		}
 		
-		sheets_success = save_order_to_google_sheets(order_data)
+		# YANGI: Google Sheets ga fon ishchisi yozadi - mijoz javobi kutilmaydi
+		sheets_success = await queue_order_for_sheets(order_data)
 		
 		# Adminlarga to'liq ma'lumot yuborish - YANGILANGAN TASDIQLASH TUGMASI BILAN
 		admin_text = (
@@ -1596,7 +1614,7 @@ async def finalize_customer_order(message: Message, state: FSMContext):
 			f"• Manzil: {customer_location}\n"
 			f"• Username: @{message.from_user.username or 'Yo\'q'}\n"
 			f"• User ID: {message.from_user.id}\n\n"
-			f"📊 Google Sheets: {'✅ Saqlandi' if sheets_success else '❌ Xatolik'}"
+			f"📊 Google Sheets: {'⏳ Navbatga qo\'yildi' if sheets_success else '❌ Xatolik'}"
 		)
 		
 		# YANGI: Tasdiqlash tugmasi - faqat HELPER_ID uchun
@@ -1613,14 +1631,12 @@ async def finalize_customer_order(message: Message, state: FSMContext):
 		
 		# Adminlarga yuborish
 		for admin_id in ADMINS:
-			try:
-				await message.bot.send_message(
-					chat_id=admin_id,
-					text=admin_text,
-					parse_mode="HTML"
-				)
-			except Exception as e:
-				logging.error(f"Error sending to admin {admin_id}: {e}")
+			await send_to_user(
+				message.bot,
+				admin_id,
+				text=admin_text,
+				parse_mode="HTML"
+			)
 		
 		# ORDER_CHANNEL ga yuborish - TASDIQLASH TUGMASI BILAN
 		if ORDER_CHANNEL:
@@ -1702,23 +1718,42 @@ async def confirm_order_callback(callback: CallbackQuery):
 		pass
 	
 	# Mijozga tasdiqlash xabari yuborish
-	try:
-		await callback.bot.send_message(
-			chat_id=user_id,
-			text="🎉 <b>Buyurtmangiz tasdiqlandi!</b>\n\n"
-			     "✅ Sizning buyurtmangiz qabul qilindi va tez orada yetkazib beriladi.\n"
-			     "📞 Agar savollaringiz bo'lsa, admin bilan bog'laning.",
-			parse_mode="HTML"
-		)
-	except Exception as e:
-		logging.error(f"Error sending confirmation to user {user_id}: {e}")
+	await send_to_user(
+		callback.bot,
+		user_id,
+		text="🎉 <b>Buyurtmangiz tasdiqlandi!</b>\n\n"
+		     "✅ Sizning buyurtmangiz qabul qilindi va tez orada yetkazib beriladi.\n"
+		     "📞 Agar savollaringiz bo'lsa, admin bilan bog'laning.",
+		parse_mode="HTML"
+	)
 	
 	await callback.answer("✅ Buyurtma tasdiqlandi!")
 
 # INVOICE TIMEOUT HANDLER - YANGILANGAN PRODUCT QAYTARISH BILAN
-async def delete_invoice_after_timeout(bot, chat_id, message_id, user_id, payment_method, product_id=None, timeout=300):
+# YANGI: har bir invoice uchun uxlab turgan task o'rniga scheduled_jobs jadvali (scheduler.py) -
+# qayta ishga tushganda ham muddati o'tgan invoice'lar o'chiriladi, to'lovda bekor qilinadi
+async def schedule_invoice_timeout(chat_id, message_id, user_id, payment_method, product_id=None, timeout=300):
+	await schedule_job(
+		"product_invoice_timeout",
+		invoice_job_key(chat_id, message_id),
+		{
+			"chat_id": chat_id,
+			"message_id": message_id,
+			"user_id": user_id,
+			"payment_method": payment_method,
+			"product_id": product_id
+		},
+		timeout
+	)
+
+@job_handler("product_invoice_timeout")
+async def delete_invoice_after_timeout(bot, job):
 	"""5 daqiqadan keyin invoice ni o'chirish va product qaytarish"""
-	await asyncio.sleep(timeout)
+	chat_id = job["chat_id"]
+	message_id = job["message_id"]
+	user_id = job["user_id"]
+	payment_method = job["payment_method"]
+	product_id = job.get("product_id")
 	
 	try:
 		await bot.delete_message(chat_id=chat_id, message_id=message_id)
@@ -1726,8 +1761,8 @@ async def delete_invoice_after_timeout(bot, chat_id, message_id, user_id, paymen
 		
 		# YANGI: Product ID mavjud bo'lsa, tovarni qaytadan ko'rsatish
 		if product_id:
-			product = get_product(product_id)
-			if product and product[9]:  # product faol bo'lsa
+			product = await run_db(get_product, product_id)
+			if product and product.is_active:  # product faol bo'lsa
 				await bot.send_message(
 					chat_id=chat_id,
 					text=f"⏰ {payment_method} to'lov vaqti tugadi.\n"
@@ -1794,6 +1829,11 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 	
 	logging.info(f"Successful payment from user {user_id}: {payment.total_amount / 100} UZS")
 	
+	# YANGI: to'langan invoice muddati tugaganda o'chirilmaydi
+	invoice_message_id = (await state.get_data()).get('invoice_message_id')
+	if invoice_message_id:
+		await cancel_job(invoice_job_key(message.chat.id, invoice_message_id))
+	
 	# Payload dan ma'lumotlarni olish
 	payload_parts = payment.invoice_payload.split("_")
 	
@@ -1803,15 +1843,15 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 		amount = int(payload_parts[3])
 		payment_method = payload_parts[4] if len(payload_parts) > 4 else "telegram"
 		
-		product = get_product(product_id)
-		user = get_user(user_id)
+		product = await run_db(get_product, product_id)
+		user = await run_db(get_user, user_id)
 		
 		if not product or not user:
 			await message.answer("❌ Xatolik yuz berdi. Admin bilan bog'laning.")
 			return
 		
-		product_name = product[2]
-		product_price = product[4]
+		product_name = product.name
+		product_price = product.price
 		username = user[1] or "Yo'q"
 		
 		# Foydalanuvchiga muvaffaqiyat xabari - YANGILANGAN
@@ -1847,7 +1887,8 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 			product_price=product_price,
 			payment_amount=amount,
 			payment_method=payment_method.upper(),
-			remaining_debt=remaining_debt
+			remaining_debt=remaining_debt,
+			payment_key=f"telegram_{payment.telegram_payment_charge_id}"
 		)
 		await state.set_state(TolovHolati.mijoz_ismi_kutilmoqda)
 	
@@ -1855,15 +1896,15 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 		# Boshqa to'lovlar (hisobni to'ldirish)
 		amount = payment.total_amount // 100
 		
-		user = get_user(user_id)
+		user = await run_db(get_user, user_id)
 		if user:
-			old_balance = user[4]  # TUZATILGAN: balance index
-			new_balance = old_balance + amount
-			
-			success = update_balance(user_id, new_balance)
+			# YANGI: balans daftar orqali o'zgaradi - bir to'lov (charge id) faqat bir marta yoziladi
+			applied, new_balance = await run_write(
+				apply_balance_change, user_id, amount, "deposit", f"telegram_{payment.telegram_payment_charge_id}"
+			)
 			
-			if success:
-				add_transaction(user_id, amount, "deposit", f"Telegram to'lov: {amount:,} UZS")
+			if applied:
+				old_balance = new_balance - amount
 				
 				await message.answer(
 					f"✅ <b>To'lov muvaffaqiyatli!</b>\n\n"
@@ -1884,14 +1925,14 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 				)
 				
 				for admin_id in ADMINS:
-					try:
-						await message.bot.send_message(
-							chat_id=admin_id,
-							text=admin_text,
-							parse_mode="HTML"
-						)
-					except Exception as e:
-						logging.error(f"Error sending to admin {admin_id}: {e}")
+					await send_to_user(
+						message.bot,
+						admin_id,
+						text=admin_text,
+						parse_mode="HTML"
+					)
+			elif new_balance is not None:
+				logging.info(f"To'lov {payment.telegram_payment_charge_id} allaqachon yozilgan, qayta hisoblanmadi")
 			else:
 				await message.answer("❌ Balansni yangilashda xatolik yuz berdi.")
 		else:
@@ -1905,7 +1946,7 @@ async def successful_payment_handler(message: Message, state: FSMContext):
 async def balance_refill_handler(message: Message, state: FSMContext):
 	user_id = message.from_user.id
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
@@ -1913,7 +1954,7 @@ async def balance_refill_handler(message: Message, state: FSMContext):
 	if not is_subscribed:
 		return
 	
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	if not user:
 		await message.answer("⚠️ Foydalanuvchi ma'lumotlari topilmadi.")
 		return
@@ -1948,7 +1989,7 @@ async def balance_refill_handler(message: Message, state: FSMContext):
 async def my_account_handler(message: Message):
 	user_id = message.from_user.id
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
@@ -1956,14 +1997,14 @@ async def my_account_handler(message: Message):
 	if not is_subscribed:
 		return
 	
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	if not user:
 		await message.answer("⚠️ Foydalanuvchi ma'lumotlari topilmadi.")
 		return
 	
 	bot_id = user[3]  # TUZATILGAN: bot_id index
 	balance = user[4]  # TUZATILGAN: balance index
-	referral_count = get_user_referral_count(user_id)
+	referral_count = await run_db(get_user_referral_count, user_id)
 	
 	keyboard = ReplyKeyboardMarkup(
 		keyboard=[
@@ -1988,15 +2029,23 @@ async def my_account_handler(message: Message):
 		parse_mode="HTML"
 	)
 
+TRANSACTION_LABELS = {
+	"deposit": "Hisobni to'ldirish",
+	"referral": "Referal mukofoti",
+	"admin_add": "Admin tomonidan qo'shildi",
+	"admin_subtract": "Admin tomonidan ayirildi",
+	"opening_balance": "Boshlang'ich balans"
+}
+
 @router.message(F.text == TOLOVLAR_TARIXI)
 async def payment_history_handler(message: Message):
 	user_id = message.from_user.id
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
-	transactions = get_user_transactions(user_id)
+	transactions = await run_db(get_user_transactions, user_id)
 	
 	if not transactions:
 		await message.answer(
@@ -2009,8 +2058,9 @@ async def payment_history_handler(message: Message):
 	text = "📊 <b>To'lovlar tarixi</b>\n\n"
 	
 	for transaction in transactions[-10:]:  # Oxirgi 10 ta tranzaksiya
-		trans_type = "➕" if transaction[3] == "deposit" else "➖"
-		text += f"{trans_type} <b>{transaction[2]:,} UZS</b> - {transaction[4]}\n"
+		trans_type = "➕" if transaction[2] >= 0 else "➖"
+		label = TRANSACTION_LABELS.get(transaction[3], transaction[4])
+		text += f"{trans_type} <b>{abs(transaction[2]):,} UZS</b> - {label}\n"
 		text += f"📅 {transaction[5][:16]}\n\n"
 	
 	if len(transactions) > 10:
@@ -2021,7 +2071,7 @@ async def payment_history_handler(message: Message):
 @router.message(F.text == BOSH_MENYU)
 async def main_menu_handler(message: Message):
 	user_id = message.from_user.id
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await message.answer("⚠️ Foydalanuvchi ma'lumotlari topilmadi. /start buyrug'ini yuboring.")
@@ -2033,7 +2083,7 @@ async def main_menu_handler(message: Message):
 async def services_handler(message: Message):
 	user_id = message.from_user.id
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
@@ -2053,7 +2103,7 @@ async def services_handler(message: Message):
 async def payment_method_handler(message: Message, state: FSMContext):
 	user_id = message.from_user.id
 	
-	if is_user_blocked(user_id):
+	if await run_db(is_user_blocked, user_id):
 		await message.answer("⚠️ Siz bloklangansiz. Admin bilan bog'laning.")
 		return
 	
@@ -2234,26 +2284,83 @@ async def cancel_payment_callback(callback: CallbackQuery, state: FSMContext):
 	await state.clear()
 	
 	user_id = callback.from_user.id
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if user:
 		await show_main_menu(callback.message, user)
 	
 	await callback.answer("To'lov bekor qilindi")
 
+async def run_webhook():
+	"""Webhook rejimi: yangilanishlar aiohttp server orqali qabul qilinadi"""
+	await bot.set_webhook(
+		url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+		secret_token=WEBHOOK_SECRET,
+		allowed_updates=dp.resolve_used_update_types(),
+		drop_pending_updates=False
+	)
+	
+	app = web.Application()
+	# handle_in_background: Telegramga darhol 200 qaytariladi, yangilanish alohida taskda ishlanadi
+	SimpleRequestHandler(
+		dispatcher=dp,
+		bot=bot,
+		handle_in_background=True,
+		secret_token=WEBHOOK_SECRET
+	).register(app, path=WEBHOOK_PATH)
+	setup_application(app, dp, bot=bot)
+	
+	runner = web.AppRunner(app)
+	await runner.setup()
+	site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+	await site.start()
+	logging.info(f"Webhook server started on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+	
+	try:
+		await asyncio.Event().wait()
+	finally:
+		await runner.cleanup()
+
+async def run_polling():
+	"""Polling rejimi (WEBHOOK_URL berilmaganda)"""
+	# Avval o'rnatilgan webhook bo'lsa getUpdates ishlamaydi
+	await bot.delete_webhook(drop_pending_updates=False)
+	await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+
 async def main():
 	"""Bot ishga tushirish"""
 	try:
-		create_tables()
-		logging.info("Database tables created successfully")
+		# YANGI: butun sxema migrations.py orqali yaratiladi va yangilanadi
+		if not run_migrations():
+			logging.error("Database migrations failed, bot is not started")
+			return
+		check_query_plans()
 		
-		# YANGI: Admin jadvallarini yaratish
-		admin.create_bot_status_table()
+		start_db_writer()
+		reconcile_stats_counters()
+		await run_db(reconcile_ledger)
+		await run_db(preload_product_cache)
+		# YANGI: inline qidiruv (@bot so'rov) xotiradagi katalog nusxasidan javob beradi
+		await inline_catalog.refresh_catalog_snapshot()
+		asyncio.create_task(inline_catalog.run_catalog_snapshot_loop())
 		
-		await dp.start_polling(bot)
+		# YANGI: Qayta ishga tushganda to'xtab qolgan post yuborishlarni davom ettirish
+		await resume_broadcasts(bot)
+		start_sheets_worker()
+		start_message_outbox(bot)
+		start_scheduler(bot)
+		asyncio.create_task(run_stats_reconcile_loop())
+		
+		if WEBHOOK_URL:
+			await run_webhook()
+		else:
+			await run_polling()
 	except Exception as e:
 		
 		logging.exception(f"Error starting bot: {e}")
+	finally:
+		await channels.close_http_session()
+		close_db_pool()
 
 if __name__ == "__main__":
 	asyncio.run(main())
@@ -0,0 +1,387 @@
+import logging
+import asyncio
+import json
+import time
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from database import create_connection, run_db, run_write, count_unreachable_users, iter_user_batches
+from delivery import classify_send_error, report_delivery_failures, report_delivery_success
+
+# Telegram cheklovlari: umumiy ~30 xabar/s, bitta chatga ~1 xabar/s
+GLOBAL_RATE_LIMIT = 30
+PER_CHAT_INTERVAL = 1.0
+SENDER_COUNT = 8
+RECIPIENT_CHUNK_SIZE = 100
+MAX_SEND_ATTEMPTS = 3
+PROGRESS_UPDATE_INTERVAL = 5
+
+ERROR_TYPES = ("blocked", "chat_not_found", "flood_wait", "other")
+
+_active_jobs = {}
+
+class TokenBucket:
+	def __init__(self, rate, capacity=None):
+		self.rate = rate
+		self.capacity = capacity or rate
+		self._tokens = self.capacity
+		self._updated = time.monotonic()
+		self._paused_until = 0
+		self._lock = asyncio.Lock()
+	
+	def pause(self, seconds):
+		# RetryAfter kelganda chaqiriladi - barcha yuboruvchilar flood wait tugashini kutadi
+		self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+	
+	async def acquire(self):
+		async with self._lock:
+			while True:
+				now = time.monotonic()
+				if now < self._paused_until:
+					await asyncio.sleep(self._paused_until - now)
+					continue
+				
+				self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+				self._updated = now
+				
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return
+				
+				await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ChatThrottle:
+	def __init__(self, interval):
+		self.interval = interval
+		self._last_sent = {}
+	
+	async def wait(self, chat_id):
+		now = time.monotonic()
+		last_sent = self._last_sent.get(chat_id)
+		if last_sent is not None and now - last_sent < self.interval:
+			await asyncio.sleep(self.interval - (now - last_sent))
+		self._last_sent[chat_id] = time.monotonic()
+		
+		if len(self._last_sent) > 10000:
+			cutoff = time.monotonic() - self.interval
+			self._last_sent = {key: value for key, value in self._last_sent.items() if value > cutoff}
+
+global_bucket = TokenBucket(GLOBAL_RATE_LIMIT)
+chat_throttle = ChatThrottle(PER_CHAT_INTERVAL)
+
+def create_broadcast_job(created_by, post_type, post_text, file_id, buttons, total_count, status_chat_id,
+                         status_message_id):
+	conn = create_connection()
+	if not conn:
+		return None
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"""INSERT INTO broadcast_jobs (created_by, post_type, post_text, file_id, buttons, total_count,
+			status_chat_id, status_message_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+			(created_by, post_type, post_text, file_id, json.dumps(buttons), total_count, status_chat_id,
+			 status_message_id)
+		)
+		conn.commit()
+		return cursor.lastrowid
+	except Exception as e:
+		logging.error(f"Post yuborish vazifasini yaratishda xatolik: {e}")
+		return None
+	finally:
+		conn.close()
+
+def get_broadcast_job(job_id):
+	conn = create_connection()
+	if not conn:
+		return None
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+		return cursor.fetchone()
+	except Exception as e:
+		logging.error(f"Post yuborish vazifasini olishda xatolik: {e}")
+		return None
+	finally:
+		conn.close()
+
+RUNNING_BROADCASTS_SQL = "SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id"
+
+def get_unfinished_broadcast_jobs():
+	conn = create_connection()
+	if not conn:
+		return []
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(RUNNING_BROADCASTS_SQL)
+		return [row[0] for row in cursor.fetchall()]
+	except Exception as e:
+		logging.error(f"Tugallanmagan post yuborish vazifalarini olishda xatolik: {e}")
+		return []
+	finally:
+		conn.close()
+
+def save_broadcast_progress(job_id, last_user_id, sent_count, error_count, error_stats, status="running"):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"""UPDATE broadcast_jobs SET last_user_id = ?, sent_count = ?, error_count = ?, error_stats = ?,
+			status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?""",
+			(last_user_id, sent_count, error_count, json.dumps(error_stats), status, job_id)
+		)
+		conn.commit()
+		return True
+	except Exception as e:
+		logging.error(f"Post yuborish holatini saqlashda xatolik: {e}")
+		return False
+	finally:
+		conn.close()
+
+
+def build_post_markup(buttons):
+	inline_keyboard = []
+	row = []
+	for i, btn in enumerate(buttons):
+		row.append(InlineKeyboardButton(text=btn["text"], url=btn["url"]))
+		
+		# Har 2 ta tugmadan keyin yangi qator
+		if (i + 1) % 2 == 0 or i == len(buttons) - 1:
+			inline_keyboard.append(row)
+			row = []
+	
+	return InlineKeyboardMarkup(inline_keyboard=inline_keyboard) if inline_keyboard else None
+
+async def send_post_to_chat(bot, chat_id, post):
+	if post["type"] == "image" and post["file_id"]:
+		await bot.send_photo(
+			chat_id=chat_id,
+			photo=post["file_id"],
+			caption=post["text"],
+			reply_markup=post["markup"],
+			parse_mode="HTML"
+		)
+	elif post["type"] == "video" and post["file_id"]:
+		await bot.send_video(
+			chat_id=chat_id,
+			video=post["file_id"],
+			caption=post["text"],
+			reply_markup=post["markup"],
+			parse_mode="HTML"
+		)
+	else:
+		await bot.send_message(
+			chat_id=chat_id,
+			text=post["text"],
+			reply_markup=post["markup"],
+			parse_mode="HTML"
+		)
+
+async def deliver_post(bot, chat_id, post, stats):
+	for attempt in range(MAX_SEND_ATTEMPTS):
+		await global_bucket.acquire()
+		await chat_throttle.wait(chat_id)
+		try:
+			await send_post_to_chat(bot, chat_id, post)
+			return "sent"
+		except TelegramRetryAfter as e:
+			logging.warning(f"Foydalanuvchi {chat_id} ga post yuborishda flood limit, {e.retry_after}s dan keyin qayta urinish")
+			stats["errors"]["flood_wait"] += 1
+			global_bucket.pause(e.retry_after)
+		except Exception as e:
+			logging.error(f"Foydalanuvchi {chat_id} ga post yuborishda xatolik: {e}")
+			return classify_send_error(e)
+	
+	return "flood_wait"
+
+
+async def send_chunk(bot, chat_ids, post, stats):
+	queue = asyncio.Queue()
+	for chat_id in chat_ids:
+		queue.put_nowait(chat_id)
+	
+	sent_ids = []
+	failures = []
+	
+	async def sender():
+		while True:
+			try:
+				chat_id = queue.get_nowait()
+			except asyncio.QueueEmpty:
+				return
+			
+			result = await deliver_post(bot, chat_id, post, stats)
+			if result == "sent":
+				stats["sent"] += 1
+				sent_ids.append(chat_id)
+			else:
+				stats["failed"] += 1
+				# Flood wait'lar deliver_post ichida har biri alohida sanaladi
+				if result != "flood_wait":
+					stats["errors"][result] += 1
+				failures.append((chat_id, result))
+	
+	await asyncio.gather(*(sender() for _ in range(min(SENDER_COUNT, len(chat_ids)))))
+	return sent_ids, failures
+
+def format_duration(seconds):
+	seconds = int(seconds)
+	if seconds >= 3600:
+		return f"{seconds // 3600} soat {seconds % 3600 // 60} daq"
+	if seconds >= 60:
+		return f"{seconds // 60} daq {seconds % 60} s"
+	return f"{seconds} s"
+
+def format_broadcast_status(stats, total_count, finished=False):
+	processed = stats["sent"] + stats["failed"]
+	remaining = max(total_count - processed, 0)
+	elapsed = max(time.monotonic() - stats["started_at"], 0.001)
+	speed = (processed - stats["processed_at_start"]) / elapsed
+	errors = stats["errors"]
+	
+	if finished:
+		text = "✅ Post yuborish yakunlandi!\n\n"
+	else:
+		text = "📤 Post yuborilmoqda...\n\n"
+	
+	text += f"✅ Yuborildi: {stats['sent']} ta\n"
+	text += f"❌ Xatoliklar: {stats['failed']} ta\n"
+	
+	if not finished:
+		text += f"⏳ Qoldi: {remaining} ta\n"
+		text += f"⚡ Tezlik: {speed:.1f} xabar/s\n"
+		if speed > 0:
+			text += f"🕒 Taxminiy vaqt: {format_duration(remaining / speed)}\n"
+	else:
+		text += f"🕒 Sarflangan vaqt: {format_duration(elapsed)}\n"
+	
+	if stats["skipped"]:
+		text += f"🔕 Nofaol (o'tkazib yuborildi): {stats['skipped']} ta\n"
+	
+	if stats["failed"] or errors["flood_wait"]:
+		text += "\n📋 Xatolik turlari:\n"
+		text += f"🚫 Botni bloklagan: {errors['blocked']} ta\n"
+		text += f"❓ Chat topilmadi: {errors['chat_not_found']} ta\n"
+		text += f"⏱ Flood wait: {errors['flood_wait']} marta\n"
+		text += f"⚠️ Boshqa: {errors['other']} ta\n"
+	
+	return text
+
+async def update_status_message(bot, chat_id, message_id, text, reply_markup=None):
+	try:
+		await bot.edit_message_text(
+			chat_id=chat_id,
+			message_id=message_id,
+			text=text,
+			reply_markup=reply_markup
+		)
+	except TelegramRetryAfter as e:
+		global_bucket.pause(e.retry_after)
+	except Exception as e:
+		logging.error(f"Post yuborish holati xabarini yangilashda xatolik: {e}")
+
+async def report_progress(bot, chat_id, message_id, stats, total_count):
+	last_text = None
+	while True:
+		await asyncio.sleep(PROGRESS_UPDATE_INTERVAL)
+		text = format_broadcast_status(stats, total_count)
+		# Matn o'zgarmagan tahrirni Telegram rad etadi
+		if text != last_text:
+			await update_status_message(bot, chat_id, message_id, text)
+			last_text = text
+
+async def run_broadcast(bot, job_id):
+	job = await run_db(get_broadcast_job, job_id)
+	if not job:
+		return
+	
+	post = {
+		"type": job[2],
+		"text": job[3],
+		"file_id": job[4],
+		"markup": build_post_markup(json.loads(job[5] or "[]"))
+	}
+	last_user_id = job[7]
+	total_count = job[8]
+	status_chat_id = job[11]
+	status_message_id = job[12]
+	
+	errors = dict.fromkeys(ERROR_TYPES, 0)
+	errors.update(json.loads(job[15] or "{}"))
+	stats = {
+		"sent": job[9],
+		"failed": job[10],
+		"errors": errors,
+		"skipped": await run_db(count_unreachable_users),
+		"started_at": time.monotonic(),
+		"processed_at_start": job[9] + job[10]
+	}
+	
+	reporter = asyncio.create_task(report_progress(bot, status_chat_id, status_message_id, stats, total_count))
+	
+	try:
+		# Holat har bir bo'lakdan keyin saqlanadi - qayta ishga tushgan vazifa ko'pi bilan bitta bo'lakni qayta yuboradi
+		async for rows in iter_user_batches(("id",), ("reachable",), RECIPIENT_CHUNK_SIZE, last_user_id):
+			chat_ids = [row[0] for row in rows]
+			sent_ids, failures = await send_chunk(bot, chat_ids, post, stats)
+			last_user_id = chat_ids[-1]
+			
+			await report_delivery_failures(failures)
+			await report_delivery_success(sent_ids)
+			
+			await run_write(
+				save_broadcast_progress, job_id, last_user_id, stats["sent"], stats["failed"], stats["errors"]
+			)
+		
+		await run_write(
+			save_broadcast_progress, job_id, last_user_id, stats["sent"], stats["failed"], stats["errors"], "done"
+		)
+	except asyncio.CancelledError:
+		# Vazifa 'running' holatida qoladi va keyingi ishga tushishda davom ettiriladi
+		raise
+	except Exception as e:
+		logging.exception(f"Post yuborish vazifasi {job_id} da xatolik: {e}")
+		await run_write(
+			save_broadcast_progress, job_id, last_user_id, stats["sent"], stats["failed"], stats["errors"], "failed"
+		)
+		return
+	finally:
+		reporter.cancel()
+		_active_jobs.pop(job_id, None)
+	
+	await update_status_message(
+		bot,
+		status_chat_id,
+		status_message_id,
+		format_broadcast_status(stats, total_count, finished=True),
+		InlineKeyboardMarkup(
+			inline_keyboard=[
+				[
+					InlineKeyboardButton(text="🔙 Admin paneli", callback_data="back_to_admin")
+				]
+			]
+		)
+	)
+
+def start_broadcast(bot, job_id):
+	if job_id in _active_jobs:
+		return _active_jobs[job_id]
+	
+	task = asyncio.create_task(run_broadcast(bot, job_id))
+	_active_jobs[job_id] = task
+	return task
+
+async def resume_broadcasts(bot):
+	job_ids = await run_db(get_unfinished_broadcast_jobs)
+	for job_id in job_ids:
+		logging.info(f"Post yuborish vazifasi {job_id} davom ettirilmoqda")
+		start_broadcast(bot, job_id)
@@ -0,0 +1,102 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+	"""
+	Hajmi cheklangan TTL + LRU kesh.
+	owner bo'yicha ikkilamchi indeks bitta foydalanuvchining barcha yozuvlarini
+	butun keshni aylanib chiqmasdan o'chirish imkonini beradi.
+	"""
+	
+	def __init__(self, maxsize, ttl, name=""):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.name = name
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._data = OrderedDict()
+		self._owners = {}
+		self._lock = threading.RLock()
+	
+	def get(self, key, default=None):
+		with self._lock:
+			item = self._data.get(key)
+			if item is None:
+				self.misses += 1
+				return default
+			
+			expires_at, value, owner = item
+			if expires_at <= time.monotonic():
+				self._remove(key)
+				self.misses += 1
+				return default
+			
+			self._data.move_to_end(key)
+			self.hits += 1
+			return value
+	
+	def set(self, key, value, owner=None, ttl=None):
+		with self._lock:
+			if key in self._data:
+				self._remove(key)
+			
+			expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+			self._data[key] = (expires_at, value, owner)
+			if owner is not None:
+				self._owners.setdefault(owner, set()).add(key)
+			
+			while len(self._data) > self.maxsize:
+				oldest_key = next(iter(self._data))
+				self._remove(oldest_key)
+				self.evictions += 1
+	
+	def pop(self, key, default=None):
+		with self._lock:
+			item = self._data.get(key)
+			if item is None:
+				return default
+			self._remove(key)
+			return item[1]
+	
+	def invalidate_owner(self, owner):
+		with self._lock:
+			keys = self._owners.pop(owner, ())
+			for key in keys:
+				self._data.pop(key, None)
+			return len(keys)
+	
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self._owners.clear()
+	
+	def stats(self):
+		total = self.hits + self.misses
+		return {
+			"name": self.name,
+			"size": len(self._data),
+			"maxsize": self.maxsize,
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"hit_rate": self.hits / total * 100 if total else 0.0
+		}
+	
+	def _remove(self, key):
+		expires_at, value, owner = self._data.pop(key)
+		if owner is not None:
+			keys = self._owners.get(owner)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self._owners[owner]
+	
+	def __contains__(self, key):
+		with self._lock:
+			item = self._data.get(key)
+			return item is not None and item[0] > time.monotonic()
+	
+	def __len__(self):
+		return len(self._data)
@@ -20,17 +20,61 @@ from database import create_connection
 from typing import Any, Awaitable, Callable, Dict
 import admin
 import re
-from database import get_setting
+from database import get_setting, run_db, run_write
+from cache import TTLCache
 
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 channels_router = Router()
 
-subscription_cache = {}
 CACHE_TIMEOUT = 300
+SUBSCRIPTION_CACHE_SIZE = 100000
+JOIN_REQUEST_CACHE_SIZE = 100000
+JOIN_REQUEST_TIMEOUT = 86400
 
-join_request_users = {}
+# YANGI: hajmi cheklangan TTL+LRU kesh - yozuvlar foydalanuvchi ID si bo'yicha indekslanadi
+subscription_cache = TTLCache(SUBSCRIPTION_CACHE_SIZE, CACHE_TIMEOUT, "subscription")
+
+# YANGI: kanal ma'lumotlari va bot huquqlari keshi (barcha foydalanuvchilar uchun umumiy)
+channel_metadata_cache = {}
+CHANNEL_METADATA_TIMEOUT = 3600
+CHANNEL_METADATA_RETRY = 60
+
+_metadata_requests = {}
+_subscription_requests = {}
+
+join_request_users = TTLCache(JOIN_REQUEST_CACHE_SIZE, JOIN_REQUEST_TIMEOUT, "join_requests")
+
+# YANGI: majburiy botlarni tekshirish uchun umumiy HTTP sessiya (keep-alive ulanishlar qayta ishlatiladi)
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 30
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_TOTAL_TIMEOUT = 10
+HTTP_CONNECT_TIMEOUT = 5
+
+_http_session = None
+
+def get_http_session():
+	"""Umumiy aiohttp sessiyasini qaytaradi (kerak bo'lsa yaratadi)"""
+	global _http_session
+	if _http_session is None or _http_session.closed:
+		connector = aiohttp.TCPConnector(
+			limit=HTTP_CONNECTION_LIMIT,
+			limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+			keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+			ttl_dns_cache=300
+		)
+		timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+		_http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+	return _http_session
+
+async def close_http_session():
+	"""Bot to'xtaganda umumiy HTTP sessiyani yopadi"""
+	global _http_session
+	if _http_session is not None and not _http_session.closed:
+		await _http_session.close()
+	_http_session = None
 
 class ChannelState(StatesGroup):
 	waiting_for_channel_forward = State()
@@ -66,7 +110,7 @@ class BotStatusMiddleware(BaseMiddleware):
 				return await handler(event, data)
 			
 			# Bot statusini tekshirish
-			bot_status = admin.get_bot_status()
+			bot_status = await run_db(admin.get_bot_status)
 			
 			# Agar bot active bo'lmasa (ya'ni ta'mirlash rejimida bo'lsa)
 			if bot_status != "active":
@@ -98,85 +142,6 @@ class BotStatusMiddleware(BaseMiddleware):
 		# Agar bot active bo'lsa yoki admin bo'lsa, normal davom etish
 		return await handler(event, data)
 
-async def init_channels_tables():
-	conn = create_connection()
-	if not conn:
-		return False
-	
-	cursor = conn.cursor()
-	
-	try:
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS required_channels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            channel_id TEXT NOT NULL,
-            channel_name TEXT NOT NULL,
-            invite_link TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS required_bots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            bot_token TEXT NOT NULL,
-            bot_username TEXT NOT NULL,
-            bot_name TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channel_join_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            channel_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS custom_links (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            url TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		# Also create bot_status table
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bot_status (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            is_active INTEGER NOT NULL DEFAULT 1,
-            updated_by INTEGER,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		# Check if there are any records in bot_status
-		cursor.execute("SELECT COUNT(*) FROM bot_status")
-		count = cursor.fetchone()[0]
-		
-		# If no records, insert default active status
-		if count == 0:
-			cursor.execute(
-				"INSERT INTO bot_status (is_active, updated_by) VALUES (?, ?)",
-				(1, None)
-			)
-		
-		conn.commit()
-		logging.info("Channel tables initialized successfully")
-		return True
-	except sqlite3.Error as e:
-		logging.error(f"Error creating channels tables: {e}")
-		return False
-	finally:
-		conn.close()
-
 def add_required_channel(channel_id, channel_name, invite_link, added_by):
 	conn = create_connection()
 	if not conn:
@@ -400,31 +365,12 @@ def save_join_request(user_id, channel_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channel_join_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            channel_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
+		# (user_id, channel_id) unikal indeksi migrations.py da - takroriy so'rov faqat vaqtni yangilaydi
 		cursor.execute(
-			"SELECT id FROM channel_join_requests WHERE user_id = ? AND channel_id = ?",
+			"""INSERT INTO channel_join_requests (user_id, channel_id) VALUES (?, ?)
+			ON CONFLICT (user_id, channel_id) DO UPDATE SET created_at = CURRENT_TIMESTAMP""",
 			(user_id, channel_id)
 		)
-		existing = cursor.fetchone()
-		
-		if existing:
-			cursor.execute(
-				"UPDATE channel_join_requests SET created_at = CURRENT_TIMESTAMP WHERE id = ?",
-				(existing[0],)
-			)
-		else:
-			cursor.execute(
-				"INSERT INTO channel_join_requests (user_id, channel_id) VALUES (?, ?)",
-				(user_id, channel_id)
-			)
 		
 		conn.commit()
 		return True
@@ -434,6 +380,12 @@ def save_join_request(user_id, channel_id):
 	finally:
 		conn.close()
 
+JOIN_REQUEST_SQL = """
+			SELECT id FROM channel_join_requests
+			WHERE user_id = ? AND channel_id = ?
+			AND datetime(created_at) > datetime('now', '-1 day')
+			"""
+
 def check_join_request_in_db(user_id, channel_id):
 	"""
 	Foydalanuvchi qo'shilish so'rovini ma'lumotlar bazasidan tekshirish
@@ -445,23 +397,7 @@ def check_join_request_in_db(user_id, channel_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channel_join_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            channel_id TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute(
-			"""
-			SELECT id FROM channel_join_requests
-			WHERE user_id = ? AND channel_id = ?
-			AND datetime(created_at) > datetime('now', '-1 day')
-			""",
-			(user_id, channel_id)
-		)
+		cursor.execute(JOIN_REQUEST_SQL, (user_id, channel_id))
 		
 		result = cursor.fetchone()
 		return result is not None
@@ -472,13 +408,7 @@ def check_join_request_in_db(user_id, channel_id):
 		conn.close()
 
 def clear_subscription_cache_for_user(user_id):
-	keys_to_remove = []
-	for key in subscription_cache.keys():
-		if key.startswith(f"sub_{user_id}_") or key.startswith(f"bot_start_{user_id}_"):
-			keys_to_remove.append(key)
-	
-	for key in keys_to_remove:
-		subscription_cache.pop(key, None)
+	subscription_cache.invalidate_owner(user_id)
 	
 	logging.info(f"Cleared subscription and bot start cache for user {user_id}")
 
@@ -509,44 +439,107 @@ async def check_bot_permissions(bot, channel_id):
 		logging.error(f"Error checking bot permissions: {e}")
 		return False
 
+async def fetch_channel_metadata(bot, channel_id):
+	"""
+	Kanal ma'lumotlari va bot huquqlarini Telegramdan olish
+	"""
+	resolved_channel_id = channel_id
+	try:
+		chat = await bot.get_chat(chat_id=channel_id)
+		logging.debug(f"Successfully got chat info for {channel_id}: {chat.title}")
+	except Exception as chat_error:
+		logging.error(f"Error getting chat info for channel {channel_id}: {chat_error}")
+		
+		if not str(channel_id).startswith('@') and not str(channel_id).startswith('-100'):
+			try:
+				if str(channel_id).startswith('-'):
+					formatted_channel_id = channel_id
+				else:
+					formatted_channel_id = f"@{channel_id}"
+				
+				logging.debug(f"Trying with formatted channel ID: {formatted_channel_id}")
+				chat = await bot.get_chat(chat_id=formatted_channel_id)
+				resolved_channel_id = formatted_channel_id
+				logging.debug(f"Successfully got chat info with formatted ID: {chat.title}")
+			except Exception as format_error:
+				logging.error(f"Error with formatted channel ID: {format_error}")
+				return None
+		else:
+			return None
+	
+	has_permissions = await check_bot_permissions(bot, resolved_channel_id)
+	if not has_permissions:
+		logging.warning(f"Bot does not have required permissions in channel {resolved_channel_id}")
+	
+	return {
+		"chat_id": resolved_channel_id,
+		"title": chat.title,
+		"has_permissions": has_permissions
+	}
+
+async def get_channel_metadata(bot, channel_id):
+	"""
+	Kanal ma'lumotlari barcha foydalanuvchilar uchun bir xil - bir marta olinib,
+	CHANNEL_METADATA_TIMEOUT da yangilanadi
+	"""
+	cache_key = str(channel_id)
+	cached = channel_metadata_cache.get(cache_key)
+	if cached:
+		timeout = CHANNEL_METADATA_TIMEOUT if cached["metadata"] else CHANNEL_METADATA_RETRY
+		if time.time() - cached["timestamp"] < timeout:
+			return cached["metadata"]
+	
+	task = _metadata_requests.get(cache_key)
+	if task is None:
+		task = asyncio.create_task(fetch_channel_metadata(bot, channel_id))
+		_metadata_requests[cache_key] = task
+		try:
+			metadata = await asyncio.shield(task)
+			channel_metadata_cache[cache_key] = {
+				"timestamp": time.time(),
+				"metadata": metadata
+			}
+			return metadata
+		finally:
+			_metadata_requests.pop(cache_key, None)
+	
+	return await asyncio.shield(task)
+
+def clear_channel_metadata_cache(channel_id=None):
+	if channel_id is None:
+		channel_metadata_cache.clear()
+	else:
+		channel_metadata_cache.pop(str(channel_id), None)
+
 async def check_user_subscribed_to_channel(bot, user_id, channel_id, bypass_cache=False):
+	cache_key = ("sub", user_id, str(channel_id))
+	if not bypass_cache:
+		is_subscribed = subscription_cache.get(cache_key)
+		if is_subscribed is not None:
+			logging.debug(
+				f"Using cached subscription status for user {user_id} in channel {channel_id}: {is_subscribed}")
+			return is_subscribed
+	
+	# Bir xil (user, kanal) uchun parallel so'rovlar bitta API chaqiruvini kutadi
+	task = _subscription_requests.get(cache_key)
+	if task is None:
+		task = asyncio.create_task(fetch_user_subscription(bot, user_id, channel_id, cache_key))
+		_subscription_requests[cache_key] = task
+		try:
+			return await asyncio.shield(task)
+		finally:
+			_subscription_requests.pop(cache_key, None)
+	
+	return await asyncio.shield(task)
+
+async def fetch_user_subscription(bot, user_id, channel_id, cache_key):
 	try:
-		cache_key = f"sub_{user_id}_{channel_id}"
-		if not bypass_cache and cache_key in subscription_cache:
-			cache_data = subscription_cache[cache_key]
-			if time.time() - cache_data["timestamp"] < CACHE_TIMEOUT:
-				logging.debug(
-					f"Using cached subscription status for user {user_id} in channel {channel_id}: {cache_data['is_subscribed']}")
-				return cache_data["is_subscribed"]
-		
 		logging.debug(f"Performing fresh check of subscription status for user {user_id} in channel {channel_id}")
 		
-		try:
-			chat = await bot.get_chat(chat_id=channel_id)
-			logging.debug(f"Successfully got chat info for {channel_id}: {chat.title}")
-		except Exception as chat_error:
-			logging.error(f"Error getting chat info for channel {channel_id}: {chat_error}")
-			
-			if not str(channel_id).startswith('@') and not str(channel_id).startswith('-100'):
-				try:
-					if str(channel_id).startswith('-'):
-						formatted_channel_id = channel_id
-					else:
-						formatted_channel_id = f"@{channel_id}"
-					
-					logging.debug(f"Trying with formatted channel ID: {formatted_channel_id}")
-					chat = await bot.get_chat(chat_id=formatted_channel_id)
-					channel_id = formatted_channel_id
-					logging.debug(f"Successfully got chat info with formatted ID: {chat.title}")
-				except Exception as format_error:
-					logging.error(f"Error with formatted channel ID: {format_error}")
-					return False
-			else:
-				return False
-		
-		has_permissions = await check_bot_permissions(bot, channel_id)
-		if not has_permissions:
-			logging.warning(f"Bot does not have required permissions in channel {channel_id}")
+		metadata = await get_channel_metadata(bot, channel_id)
+		if not metadata:
+			return False
+		channel_id = metadata["chat_id"]
 		
 		chat_member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
 		status = chat_member.status
@@ -569,15 +562,12 @@ async def check_user_subscribed_to_channel(bot, user_id, channel_id, bypass_cach
 					logging.info(f"User {user_id} has pending join request for channel {channel_id} (from cache)")
 			
 			if not is_subscribed:
-				has_request_in_db = check_join_request_in_db(user_id, channel_id)
+				has_request_in_db = await run_db(check_join_request_in_db, user_id, channel_id)
 				if has_request_in_db:
 					is_subscribed = True
 					logging.info(f"User {user_id} has pending join request for channel {channel_id} (from database)")
 		
-		subscription_cache[cache_key] = {
-			"timestamp": time.time(),
-			"is_subscribed": is_subscribed
-		}
+		subscription_cache.set(cache_key, is_subscribed, owner=user_id)
 		
 		logging.info(f"Final subscription status for user {user_id} in channel {channel_id}: {is_subscribed}")
 		return is_subscribed
@@ -595,23 +585,17 @@ async def check_user_subscribed_to_channel(bot, user_id, channel_id, bypass_cach
 					logging.info(
 						f"User {user_id} has pending join request for channel {channel_id} (from cache fallback)")
 					
-					subscription_cache[cache_key] = {
-						"timestamp": time.time(),
-						"is_subscribed": is_subscribed
-					}
+					subscription_cache.set(cache_key, is_subscribed, owner=user_id)
 					
 					return is_subscribed
 			
-			has_request_in_db = check_join_request_in_db(user_id, channel_id)
+			has_request_in_db = await run_db(check_join_request_in_db, user_id, channel_id)
 			if has_request_in_db:
 				is_subscribed = True
 				logging.info(
 					f"User {user_id} has pending join request for channel {channel_id} (from database fallback)")
 				
-				subscription_cache[cache_key] = {
-					"timestamp": time.time(),
-					"is_subscribed": is_subscribed
-				}
+				subscription_cache.set(cache_key, is_subscribed, owner=user_id)
 				
 				return is_subscribed
 		except Exception as req_error:
@@ -666,7 +650,7 @@ async def test_channel_subscription(bot, user_id, channel_id):
 		
 		logging.info("Test 4: Checking join requests in database...")
 		try:
-			has_request_in_db = check_join_request_in_db(user_id, channel_id)
+			has_request_in_db = await run_db(check_join_request_in_db, user_id, channel_id)
 			logging.info(f"User has join request in database: {has_request_in_db}")
 		except Exception as e:
 			logging.error(f"Error checking join requests in database: {e}")
@@ -681,11 +665,11 @@ async def test_channel_subscription(bot, user_id, channel_id):
 
 async def check_user_started_bot(bot_token, user_id, bypass_cache=False):
 	try:
-		cache_key = f"bot_start_{user_id}_{bot_token[:8]}"
-		if not bypass_cache and cache_key in subscription_cache:
-			cache_data = subscription_cache[cache_key]
-			if time.time() - cache_data["timestamp"] < CACHE_TIMEOUT:
-				return cache_data["is_started"]
+		cache_key = ("bot_start", user_id, bot_token[:8])
+		if not bypass_cache:
+			is_started = subscription_cache.get(cache_key)
+			if is_started is not None:
+				return is_started
 		
 		logging.debug(f"Performing fresh check if user {user_id} started bot with token {bot_token[:8]}...")
 		
@@ -694,28 +678,25 @@ async def check_user_started_bot(bot_token, user_id, bypass_cache=False):
 			"chat_id": user_id
 		}
 		
-		async with aiohttp.ClientSession() as session:
-			async with session.get(url, params=params) as response:
-				data = await response.json()
-				
-				is_started = response.status == 200 and data.get('ok')
-				
-				logging.debug(f"User {user_id} started bot with token {bot_token[:8]}: {is_started}")
-				
-				subscription_cache[cache_key] = {
-					"timestamp": time.time(),
-					"is_started": is_started
-				}
-				
-				return is_started
+		session = get_http_session()
+		async with session.get(url, params=params) as response:
+			data = await response.json()
+			
+			is_started = response.status == 200 and data.get('ok')
+			
+			logging.debug(f"User {user_id} started bot with token {bot_token[:8]}: {is_started}")
+			
+			subscription_cache.set(cache_key, is_started, owner=user_id)
+			
+			return is_started
 	
 	except Exception as e:
 		logging.error(f"Error checking bot start: {e}")
 		return False
 
 async def check_subscription_status(bot, user_id, bypass_cache=False):
-	channels = get_required_channels()
-	bots = get_required_bots()
+	channels = await run_db(get_required_channels)
+	bots = await run_db(get_required_bots)
 	
 	channel_tasks = []
 	for channel in channels:
@@ -822,7 +803,7 @@ async def show_subscription_keyboard_if_needed(message, bot, user_id):
 	all_subscribed, channel_status, bot_status = await check_subscription_status(bot, user_id, bypass_cache=True)
 	
 	if not all_subscribed:
-		keyboard = create_subscription_keyboard(channel_status, bot_status)
+		keyboard = await run_db(create_subscription_keyboard, channel_status, bot_status)
 		
 		if keyboard:
 			await message.answer(
@@ -844,17 +825,17 @@ async def handle_join_request(event: ChatJoinRequest, bot: Bot):
 	
 	logging.info(f"User {user.id} ({user.full_name}) sent join request to channel {chat.id} ({chat.title})")
 	
-	success = save_join_request(user.id, chat.id)
+	success = await run_write(save_join_request, user.id, chat.id)
 	
 	if success:
 		logging.info(f"Successfully saved join request for user {user.id} in channel {chat.id}")
 	else:
 		logging.error(f"Failed to save join request for user {user.id} in channel {chat.id}")
 	
-	join_request_users[user.id] = {
+	join_request_users.set(user.id, {
 		"channel_id": chat.id,
 		"timestamp": time.time()
-	}
+	})
 
 @channels_router.callback_query(F.data == "check_subscription")
 async def check_subscription_callback(callback: CallbackQuery):
@@ -873,7 +854,7 @@ async def check_subscription_callback(callback: CallbackQuery):
 		logging.error(f"Error deleting message: {e}")
 	
 	if not all_subscribed and user_id not in ADMINS:
-		keyboard = create_subscription_keyboard(channel_status, bot_status)
+		keyboard = await run_db(create_subscription_keyboard, channel_status, bot_status)
 		
 		not_subscribed_channels = [ch['channel_name'] for ch in channel_status if not ch['is_subscribed']]
 		not_started_bots = [bot['bot_name'] for bot in bot_status if not bot['is_started']]
@@ -904,7 +885,7 @@ async def check_subscription_callback(callback: CallbackQuery):
 		from bot import show_main_menu
 		from database import get_user
 		
-		user = get_user(user_id)
+		user = await run_db(get_user, user_id)
 		
 		if user:
 			await show_main_menu(callback.message, user)
@@ -956,7 +937,7 @@ async def manage_links_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	links = get_custom_links()
+	links = await run_db(get_custom_links)
 	
 	inline_keyboard = [
 		[
@@ -986,7 +967,7 @@ async def view_links_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	links = get_custom_links()
+	links = await run_db(get_custom_links)
 	
 	if not links:
 		await callback.message.edit_text(
@@ -1044,7 +1025,7 @@ async def link_info_callback(callback: CallbackQuery):
 		return
 	
 	link_id = int(callback.data.split("_")[2])
-	links = get_custom_links()
+	links = await run_db(get_custom_links)
 	
 	link = next((l for l in links if l['id'] == link_id), None)
 	
@@ -1085,7 +1066,7 @@ async def delete_link_callback(callback: CallbackQuery):
 	
 	link_id = int(callback.data.split("_")[2])
 	
-	success = delete_custom_link(link_id)
+	success = await run_write(delete_custom_link, link_id)
 	
 	if not success:
 		await callback.answer("❌ Linkni o'chirishda xatolik yuz berdi.")
@@ -1162,7 +1143,7 @@ async def process_link_url(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	link_name = state_data.get("link_name")
 	
-	success = add_custom_link(link_name, link_url, message.from_user.id)
+	success = await run_write(add_custom_link, link_name, link_url, message.from_user.id)
 	
 	if not success:
 		await message.answer(
@@ -1193,7 +1174,7 @@ async def manage_channels_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	channels = get_required_channels()
+	channels = await run_db(get_required_channels)
 	
 	inline_keyboard = [
 		[
@@ -1223,7 +1204,7 @@ async def view_channels_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	channels = get_required_channels()
+	channels = await run_db(get_required_channels)
 	
 	if not channels:
 		await callback.message.edit_text(
@@ -1281,7 +1262,7 @@ async def channel_info_callback(callback: CallbackQuery):
 		return
 	
 	channel_id = int(callback.data.split("_")[2])
-	channels = get_required_channels()
+	channels = await run_db(get_required_channels)
 	
 	channel = next((c for c in channels if c['id'] == channel_id), None)
 	
@@ -1322,7 +1303,7 @@ async def delete_required_channel_callback(callback: CallbackQuery):
 	
 	channel_id = int(callback.data.split("_")[3])
 	
-	success = delete_required_channel(channel_id)
+	success = await run_write(delete_required_channel, channel_id)
 	
 	if not success:
 		await callback.answer("❌ Kanalni o'chirishda xatolik yuz berdi.")
@@ -1412,7 +1393,7 @@ async def process_channel_forward(message: Message, state: FSMContext, bot: Bot)
 				await message.answer("❌ Qo'shilish so'rovi havolasi yaratishda xatolik yuz berdi.")
 				return
 			
-			success = add_required_channel(
+			success = await run_write(add_required_channel,
 				channel_id=str(chat_id),
 				channel_name=chat_title,
 				invite_link=invite_link,
@@ -1426,6 +1407,9 @@ async def process_channel_forward(message: Message, state: FSMContext, bot: Bot)
 				await state.clear()
 				return
 			
+			# Kanal qayta qo'shilgan bo'lsa eski bot huquqlari keshda qolmasin
+			clear_channel_metadata_cache(chat_id)
+			
 			await message.answer(
 				f"✅ <b>Muvaffaqiyatli!</b>\n\n"
 				f"Kanal <b>{chat_title}</b> majburiy obuna ro'yxatiga qo'shildi.\n\n"
@@ -1466,7 +1450,7 @@ async def manage_bots_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	bots = get_required_bots()
+	bots = await run_db(get_required_bots)
 	
 	inline_keyboard = [
 		[
@@ -1496,7 +1480,7 @@ async def view_bots_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	bots = get_required_bots()
+	bots = await run_db(get_required_bots)
 	
 	if not bots:
 		await callback.message.edit_text(
@@ -1554,7 +1538,7 @@ async def bot_info_callback(callback: CallbackQuery):
 		return
 	
 	bot_id = int(callback.data.split("_")[2])
-	bots = get_required_bots()
+	bots = await run_db(get_required_bots)
 	
 	bot_info = next((b for b in bots if b['id'] == bot_id), None)
 	
@@ -1599,7 +1583,7 @@ async def delete_bot_callback(callback: CallbackQuery):
 	
 	bot_id = int(callback.data.split("_")[2])
 	
-	success = delete_required_bot(bot_id)
+	success = await run_write(delete_required_bot, bot_id)
 	
 	if not success:
 		await callback.answer("❌ Botni o'chirishda xatolik yuz berdi.")
@@ -1713,34 +1697,34 @@ async def process_bot_token(message: Message, state: FSMContext):
 	# Verify bot token by making a getMe request
 	try:
 		url = f"{TELEGRAM_API_BASE}{bot_token}/getMe"
-		async with aiohttp.ClientSession() as session:
-			async with session.get(url) as response:
-				data = await response.json()
-				
-				if not response.status == 200 or not data.get('ok'):
-					await message.answer("❌ Bot tokeni noto'g'ri. Iltimos, qaytadan kiriting:")
-					return
-				
-				bot_info = data.get('result', {})
-				actual_username = bot_info.get('username', '')
-				
-				if not actual_username:
-					await message.answer("❌ Bot ma'lumotlarini olishda xatolik. Iltimos, qaytadan urinib ko'ring.")
-					return
-				
-				if actual_username.lower() != bot_username.lower():
-					await message.answer(
-						f"⚠️ Kiritilgan username ({bot_username}) bot haqiqiy username'i ({actual_username}) bilan mos kelmaydi.\n\n"
-						f"Iltimos, to'g'ri username kiriting:"
-					)
-					await state.set_state(ChannelState.waiting_for_bot_username)
-					return
+		session = get_http_session()
+		async with session.get(url) as response:
+			data = await response.json()
+			
+			if not response.status == 200 or not data.get('ok'):
+				await message.answer("❌ Bot tokeni noto'g'ri. Iltimos, qaytadan kiriting:")
+				return
+			
+			bot_info = data.get('result', {})
+			actual_username = bot_info.get('username', '')
+			
+			if not actual_username:
+				await message.answer("❌ Bot ma'lumotlarini olishda xatolik. Iltimos, qaytadan urinib ko'ring.")
+				return
+			
+			if actual_username.lower() != bot_username.lower():
+				await message.answer(
+					f"⚠️ Kiritilgan username ({bot_username}) bot haqiqiy username'i ({actual_username}) bilan mos kelmaydi.\n\n"
+					f"Iltimos, to'g'ri username kiriting:"
+				)
+				await state.set_state(ChannelState.waiting_for_bot_username)
+				return
 	except Exception as e:
 		logging.error(f"Error verifying bot token: {e}")
 		await message.answer("❌ Bot tokenini tekshirishda xatolik yuz berdi. Iltimos, qaytadan urinib ko'ring.")
 		return
 	
-	success = add_required_bot(bot_token, bot_username, bot_name, message.from_user.id)
+	success = await run_write(add_required_bot, bot_token, bot_username, bot_name, message.from_user.id)
 	
 	if not success:
 		await message.answer(
@@ -1770,125 +1754,14 @@ def get_bot_status():
 	"""
 	Bot statusini olish
 	"""
-	conn = create_connection()
-	if not conn:
-		return "active"  # Default is active
-	
-	cursor = conn.cursor()
-	
-	try:
-		# First ensure the table exists
-		cursor.execute('''
-		CREATE TABLE IF NOT EXISTS bot_status (
-			id INTEGER PRIMARY KEY AUTOINCREMENT,
-			is_active INTEGER NOT NULL DEFAULT 1,
-			updated_by INTEGER,
-			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-		)
-		''')
-		conn.commit()
-		
-		# Check if there are any records
-		cursor.execute("SELECT COUNT(*) FROM bot_status")
-		count = cursor.fetchone()[0]
-		
-		# If no records, insert default active status
-		if count == 0:
-			cursor.execute(
-				"INSERT INTO bot_status (is_active, updated_by) VALUES (?, ?)",
-				(1, None)
-			)
-			conn.commit()
-			return "active"
-		
-		# Get the latest status
-		cursor.execute("SELECT is_active FROM bot_status ORDER BY id DESC LIMIT 1")
-		result = cursor.fetchone()
-		
-		if result:
-			return "active" if result[0] else "inactive"
-		else:
-			return "active"  # Default to active if no result
-	except sqlite3.Error as e:
-		logging.error(f"Error getting bot status: {e}")
-		return "active"  # Default to active on error
-	finally:
-		conn.close()
+	# bot_status bitta qatordan iborat (id=1) - admin moduli bilan bir xil manba
+	return "active" if admin.get_bot_status() else "inactive"
 
 def set_bot_status(is_active, updated_by):
 	"""
 	Bot statusini o'zgartirish
 	"""
-	conn = create_connection()
-	if not conn:
-		return False
-	
-	cursor = conn.cursor()
-	
-	try:
-		# First ensure the table exists
-		cursor.execute('''
-		CREATE TABLE IF NOT EXISTS bot_status (
-			id INTEGER PRIMARY KEY AUTOINCREMENT,
-			is_active INTEGER NOT NULL DEFAULT 1,
-			updated_by INTEGER,
-			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-		)
-		''')
-		conn.commit()
-		
-		# Insert new status record
-		cursor.execute(
-			"INSERT INTO bot_status (is_active, updated_by) VALUES (?, ?)",
-			(1 if is_active else 0, updated_by)
-		)
-		
-		conn.commit()
-		return True
-	except sqlite3.Error as e:
-		logging.error(f"Error setting bot status: {e}")
-		return False
-	finally:
-		conn.close()
-
-async def init_bot_status_table():
-	"""Initialize bot_status table"""
-	conn = create_connection()
-	if not conn:
-		return False
-	
-	cursor = conn.cursor()
-	
-	try:
-		# Create bot_status table
-		cursor.execute('''
-		CREATE TABLE IF NOT EXISTS bot_status (
-			id INTEGER PRIMARY KEY AUTOINCREMENT,
-			is_active INTEGER NOT NULL DEFAULT 1,
-			updated_by INTEGER,
-			updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-		)
-		''')
-		
-		# Check if there are any records
-		cursor.execute("SELECT COUNT(*) FROM bot_status")
-		count = cursor.fetchone()[0]
-		
-		# If no records, insert default active status
-		if count == 0:
-			cursor.execute(
-				"INSERT INTO bot_status (is_active, updated_by) VALUES (?, ?)",
-				(1, None)
-			)
-		
-		conn.commit()
-		logging.info("Bot status table initialized successfully")
-		return True
-	except sqlite3.Error as e:
-		logging.error(f"Error initializing bot status table: {e}")
-		return False
-	finally:
-		conn.close()
+	return admin.set_bot_status(is_active, updated_by)
 
 @channels_router.callback_query(F.data == "bot_status")
 async def bot_status_callback(callback: CallbackQuery):
@@ -1896,11 +1769,11 @@ async def bot_status_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	current_status = get_bot_status()
+	current_status = await run_db(get_bot_status)
 	is_active = current_status == "active"
 	
 	new_status = not is_active
-	success = set_bot_status(new_status, callback.from_user.id)
+	success = await run_write(set_bot_status, new_status, callback.from_user.id)
 	
 	if not success:
 		await callback.answer("❌ Bot statusini o'zgartirishda xatolik yuz berdi.")
@@ -1911,8 +1784,8 @@ async def bot_status_callback(callback: CallbackQuery):
 	await callback.answer(f"✅ Bot statusi o'zgartirildi: {new_status_text}")
 	
 	# Update settings menu
-	min_payment_amount = get_setting("min_payment_amount", "1000")
-	referral_reward = get_setting("referral_reward_uzb", "100")
+	min_payment_amount = await run_db(get_setting, "min_payment_amount", "1000")
+	referral_reward = await run_db(get_setting, "referral_reward_uzb", "100")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
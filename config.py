@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,6 +23,9 @@ FIXED_PAYMENT_AMOUNT = 50000
 
 TELEGRAM_API_BASE = "https://api.telegram.org/bot"
 
+# Ketma-ket shuncha marta xabar yetkazilmasa foydalanuvchi nofaol deb belgilanadi
+DELIVERY_FAILURE_LIMIT = int(os.getenv("DELIVERY_FAILURE_LIMIT", "3"))
+
 LOG_LEVEL = "DEBUG"
 DEBUG = True
 
@@ -36,5 +40,23 @@ CHANNELS = [
 GOOGLE_SHEETS_CREDENTIALS_FILE = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE", "credentials.json")
 GOOGLE_SHEETS_URL = os.getenv("GOOGLE_SHEETS_URL", "")
 
+# FSM holatlari: shuncha soniyadan keyin eskiradi. Kesh faqat shu jarayondagi yozuvlarni ko'radi -
+# bot bitta jarayonda ishlasagina yoqing; bir nechta webhook jarayonida 0 qoldiring (0 - keshsiz)
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "172800"))
+FSM_CACHE_TTL = int(os.getenv("FSM_CACHE_TTL", "0"))
+
+# Texnik ishlar bayrog'i jarayon ichida keshlanadi; bir nechta jarayon ishlaganda boshqa jarayondagi
+# o'zgarish shuncha soniyada ko'rinadi (0 - faqat shu jarayondagi set_bot_status orqali yangilanadi)
+BOT_STATUS_REFRESH_INTERVAL = int(os.getenv("BOT_STATUS_REFRESH_INTERVAL", "15"))
+
+# Mahsulotlar keshi: tovar modulidagi o'zgartirish funksiyalari keshni darhol tozalaydi,
+# TTL faqat boshqa jarayon (yoki qo'lda) qilingan o'zgarishlar uchun
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "5000"))
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", "600"))
+
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
 WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Bir nechta nusxa bir xil kalitdan foydalanishi uchun berilmasa tokendan hosil qilinadi
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", hashlib.sha256(BOT_TOKEN.encode()).hexdigest()[:32])
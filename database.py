@@ -1,213 +1,407 @@
 import sqlite3
 import logging
-from datetime import datetime
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 DB_PATH = "bot_database.db"
+DB_POOL_SIZE = 4
+DB_WRITE_BATCH_SIZE = 100
+
+# Har bir ulanish ochilganda bir marta o'rnatiladigan PRAGMA'lar
+DB_PRAGMAS = (
+	("synchronous", "NORMAL"),
+	("cache_size", -16000),
+	("mmap_size", 134217728),
+	("busy_timeout", 5000),
+)
+
+_local = threading.local()
+
+def open_connection(path=DB_PATH):
+	"""Yangi sqlite ulanishini ochish va PRAGMA'larni o'rnatish"""
+	conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+	for name, value in DB_PRAGMAS:
+		conn.execute(f"PRAGMA {name} = {value}")
+	return conn
+
+class PooledConnection:
+	"""Pool'dan olingan ulanish - close() ulanishni yopmaydi, pool'ga qaytaradi"""
+	
+	def __init__(self, pool, conn):
+		self._pool = pool
+		self._conn = conn
+	
+	def __getattr__(self, name):
+		return getattr(self._conn, name)
+	
+	def close(self):
+		if self._conn is None:
+			return
+		conn, self._conn = self._conn, None
+		self._pool.release(conn)
+
+class ConnectionPool:
+	"""Uzoq yashovchi sqlite ulanishlari pool'i"""
+	
+	def __init__(self, path, size):
+		self.path = path
+		self.size = size
+		self._idle = queue.LifoQueue(maxsize=size)
+		self._lock = threading.Lock()
+		self._closed = False
+	
+	def _connect(self):
+		return open_connection(self.path)
+	
+	def acquire(self):
+		try:
+			conn = self._idle.get_nowait()
+		except queue.Empty:
+			# Pool bo'sh bo'lsa kutib qolmaymiz - vaqtinchalik qo'shimcha ulanish ochiladi
+			conn = self._connect()
+		return PooledConnection(self, conn)
+	
+	def release(self, conn):
+		try:
+			if conn.in_transaction:
+				conn.rollback()
+		except sqlite3.Error:
+			conn.close()
+			return
+		
+		if self._closed:
+			conn.close()
+			return
+		
+		try:
+			self._idle.put_nowait(conn)
+		except queue.Full:
+			conn.close()
+	
+	def close_all(self):
+		with self._lock:
+			self._closed = True
+			while True:
+				try:
+					self._idle.get_nowait().close()
+				except queue.Empty:
+					break
+
+class WriterConnection:
+	"""Writer thread ichidagi ulanish - commit() faqat joriy ishni belgilaydi, haqiqiy COMMIT batch oxirida"""
+	
+	def __init__(self, conn):
+		self._conn = conn
+	
+	def __getattr__(self, name):
+		return getattr(self._conn, name)
+	
+	def commit(self):
+		self._conn.execute("RELEASE write_job")
+		self._conn.execute("SAVEPOINT write_job")
+	
+	def rollback(self):
+		self._conn.execute("ROLLBACK TO write_job")
+	
+	def close(self):
+		pass
+
+class DatabaseWriter:
+	"""Barcha yozuvlarni bitta thread orqali ketma-ket bajaradi va commit'larni guruhlaydi"""
+	
+	def __init__(self, path, batch_size):
+		self.path = path
+		self.batch_size = batch_size
+		self._queue = queue.Queue()
+		self._thread = None
+		self._conn = None
+	
+	@property
+	def running(self):
+		return self._thread is not None and self._thread.is_alive()
+	
+	def start(self):
+		if self.running:
+			return
+		
+		self._conn = open_connection(self.path)
+		self._conn.isolation_level = None
+		mode = self._conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+		logging.info(f"Ma'lumotlar bazasi rejimi: {mode}")
+		
+		self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+		self._thread.start()
+	
+	def submit(self, func, *args, **kwargs):
+		future = concurrent.futures.Future()
+		self._queue.put((func, args, kwargs, future))
+		return future
+	
+	def stop(self):
+		if not self.running:
+			return
+		
+		self._queue.put(None)
+		self._thread.join()
+		self._thread = None
+		self._conn.close()
+		self._conn = None
+	
+	def _run(self):
+		_local.writer_conn = WriterConnection(self._conn)
+		stopping = False
+		
+		while not stopping:
+			job = self._queue.get()
+			if job is None:
+				break
+			
+			batch = [job]
+			while len(batch) < self.batch_size:
+				try:
+					job = self._queue.get_nowait()
+				except queue.Empty:
+					break
+				if job is None:
+					stopping = True
+					break
+				batch.append(job)
+			
+			self._execute_batch(batch)
+	
+	def _execute_batch(self, batch):
+		try:
+			results = self._run_jobs(batch)
+		except Exception as e:
+			# Writer thread to'xtamasligi kerak - batch bekor qilinadi, kutayotganlar xatoni oladi
+			logging.error(f"Yozuvlar guruhini bajarishda xatolik: {e}")
+			self._rollback()
+			for _, _, _, future in batch:
+				_fail_future(future, e)
+			return
+		
+		for future, result, error in results:
+			if error:
+				future.set_exception(error)
+			else:
+				future.set_result(result)
+	
+	def _run_jobs(self, batch):
+		results = []
+		# run_after_commit() callback'lari - batch COMMIT bo'lgandan keyin chaqiriladi
+		callbacks = _local.after_commit = []
+		self._conn.execute("BEGIN IMMEDIATE")
+		
+		for func, args, kwargs, future in batch:
+			if not future.set_running_or_notify_cancel():
+				continue
+			
+			self._conn.execute("SAVEPOINT write_job")
+			try:
+				result, error = func(*args, **kwargs), None
+			except Exception as e:
+				result, error = None, e
+			# commit() chaqirilmagan o'zgarishlar avvalgidek bekor qilinadi
+			self._conn.execute("ROLLBACK TO write_job")
+			self._conn.execute("RELEASE write_job")
+			results.append((future, result, error))
+		
+		self._conn.execute("COMMIT")
+		
+		for callback in callbacks:
+			try:
+				callback()
+			except Exception as e:
+				logging.error(f"Commit'dan keyingi callback'da xatolik: {e}")
+		return results
+	
+	def _rollback(self):
+		try:
+			if self._conn.in_transaction:
+				self._conn.execute("ROLLBACK")
+			return
+		except sqlite3.Error as e:
+			logging.error(f"Yozuvlarni bekor qilishda xatolik, ulanish qayta ochiladi: {e}")
+		
+		# Tranzaksiya holati noma'lum - keyingi batch toza ulanishdan boshlanadi
+		try:
+			self._conn.close()
+		except sqlite3.Error:
+			pass
+		try:
+			conn = open_connection(self.path)
+		except sqlite3.Error as e:
+			logging.error(f"Writer ulanishini qayta ochishda xatolik: {e}")
+			return
+		conn.isolation_level = None
+		self._conn = conn
+		_local.writer_conn = WriterConnection(conn)
+
+def _fail_future(future, error):
+	if future.done():
+		return
+	if future.running() or future.set_running_or_notify_cancel():
+		future.set_exception(error)
+
+_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+_writer = DatabaseWriter(DB_PATH, DB_WRITE_BATCH_SIZE)
 
 def create_connection():
+	writer_conn = getattr(_local, "writer_conn", None)
+	if writer_conn:
+		return writer_conn
+	
 	try:
-		conn = sqlite3.connect(DB_PATH)
-		return conn
+		return _pool.acquire()
 	except sqlite3.Error as e:
 		logging.error(f"Database connection error: {e}")
 		return None
 
-def create_tables():
+async def run_db(func, *args, **kwargs):
+	"""Sinxron DB funksiyasini event loopni bloklamasdan alohida thread'da bajarish"""
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(_db_executor, partial(func, *args, **kwargs))
+
+def run_after_commit(callback):
+	"""
+	Writer ichida conn.commit() faqat savepoint'ni yopadi - haqiqiy COMMIT batch oxirida.
+	Kesh tozalash kabi ishlar shu yerda qoldiriladi; writer'dan tashqarida darhol bajariladi.
+	"""
+	callbacks = getattr(_local, "after_commit", None)
+	if callbacks is None:
+		callback()
+	else:
+		callbacks.append(callback)
+
+def run_write_sync(func, *args, **kwargs):
+	"""
+	run_write() ning sinxron varianti - DB thread'lari va asyncio.to_thread ichidagi kod uchun.
+	Natija kutiladi, shuning uchun event loop'dan chaqirilmaydi.
+	"""
+	if not _writer.running or getattr(_local, "writer_conn", None):
+		return func(*args, **kwargs)
+	return _writer.submit(func, *args, **kwargs).result()
+
+async def run_write(func, *args, **kwargs):
+	"""Yozuvchi DB funksiyasini yagona writer thread orqali bajarish"""
+	if not _writer.running:
+		return await run_db(func, *args, **kwargs)
+	return await asyncio.wrap_future(_writer.submit(func, *args, **kwargs))
+
+def start_db_writer():
+	"""WAL rejimini yoqish va writer thread'ni ishga tushirish"""
+	_writer.start()
+
+def close_db_pool():
+	"""Bot to'xtaganda writer, pool va DB thread'larini yopish"""
+	_writer.stop()
+	_db_executor.shutdown(wait=True)
+	_pool.close_all()
+
+# YANGI: statistika hisoblagichlari - admin paneli butun jadvalni o'qimaydi.
+# Har bir hisoblagich ifodasi triggerlarda (NEW/OLD, migrations.py) va tekshiruvda (jadval nomi) bir xil ishlatiladi.
+STATS_RECONCILE_INTERVAL = 3600
+
+USER_STATS_TERMS = {
+	"users_total": "1",
+	"users_with_phone": "({row}.phone_number IS NOT NULL AND {row}.phone_number != '')",
+	"users_blocked": "(COALESCE({row}.is_blocked, 0) = 1)",
+	"users_unreachable": "(COALESCE({row}.bot_blocked, 0) = 1)",
+	"users_active": "(COALESCE({row}.is_blocked, 0) != 1 AND COALESCE({row}.bot_blocked, 0) != 1)",
+	"balance_total": "COALESCE({row}.balance, 0)"
+}
+
+PRODUCT_STATS_TERMS = {
+	"products_total": "1",
+	"products_active": "({row}.is_active = 1)",
+	"products_inactive": "({row}.is_active = 0)",
+	"sales_total": "COALESCE({row}.sales_count, 0)",
+	"revenue_total": "COALESCE({row}.total_revenue, 0)"
+}
+
+# YANGI: mahsulot qidiruvi (products_fts, migrations.py). Ustun -> bm25 vazni
+PRODUCT_SEARCH_COLUMNS = {
+	"name": 10.0,
+	"brand": 5.0,
+	"tags": 4.0,
+	"category": 3.0,
+	"description": 1.0
+}
+
+# O'zbek lotin yozuvidagi tutuq belgilari (o', oʻ, o‘, gʻ) indeksda ham, so'rovda ham olib tashlanadi:
+# "o'zbek", "oʻzbek" va "ozbek" bir xil topiladi
+SEARCH_APOSTROPHES = "'`ʻʼ‘’"
+
+def normalize_search_text(text):
+	text = text or ""
+	for char in SEARCH_APOSTROPHES:
+		if char in text:
+			text = text.replace(char, "")
+	return text
+
+def reconcile_stats_counters():
+	"""Hisoblagichlarni jadvallardan qayta hisoblash; farq bo'lsa logga yoziladi"""
 	conn = create_connection()
 	if not conn:
-		logging.error("Ma'lumotlar bazasiga ulanib bo'lmadi")
 		return False
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT,
-            full_name TEXT,
-            bot_id TEXT UNIQUE,
-            balance REAL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            referrer_id INTEGER,
-            referral_count INTEGER DEFAULT 0,
-            phone_number TEXT,
-            country_code TEXT,
-            is_blocked INTEGER DEFAULT 0
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            transaction_type TEXT,
-            payment_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS counters (
-            name TEXT PRIMARY KEY,
-            value INTEGER
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS wallets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            card_number TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+		actual = {}
+		for table, terms in (("users", USER_STATS_TERMS), ("products", PRODUCT_STATS_TERMS)):
+			columns = ", ".join(f"COALESCE(SUM({term.format(row=table)}), 0)" for term in terms.values())
+			cursor.execute(f"SELECT {columns} FROM {table}")
+			actual.update(zip(terms, cursor.fetchone()))
 		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pending_payments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            wallet_id INTEGER,
-            amount REAL,
-            receipt_photo_id TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (wallet_id) REFERENCES wallets (id)
-        )
-        ''')
+		cursor.execute("SELECT name, value, reconciled_at FROM stats_counters")
+		stored = {name: (value, reconciled_at) for name, value, reconciled_at in cursor.fetchall()}
 		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS payment_methods (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            payment_token TEXT NOT NULL,
-            image_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            name TEXT NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_channel_subscriptions (
-            user_id INTEGER,
-            channel_id INTEGER,
-            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (user_id, channel_id),
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (channel_id) REFERENCES channels (id)
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS required_channels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            channel_id TEXT NOT NULL UNIQUE,
-            channel_name TEXT NOT NULL,
-            invite_link TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS required_bots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            bot_token TEXT NOT NULL,
-            bot_username TEXT NOT NULL,
-            bot_name TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS custom_links (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            url TEXT NOT NULL,
-            added_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bot_status (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            is_active INTEGER NOT NULL DEFAULT 1,
-            updated_by INTEGER,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            price REAL DEFAULT 50000,
-            media_type TEXT CHECK(media_type IN ('photo', 'video')),
-            media_file_id TEXT,
-            is_active INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_by INTEGER NOT NULL,
-            FOREIGN KEY (created_by) REFERENCES users (id)
-        )
-        ''')
-		
-		cursor.execute('''
-        CREATE TABLE IF NOT EXISTS product_orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            product_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            payment_method TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (product_id) REFERENCES products (id)
-        )
-        ''')
-		
-		cursor.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('bot_id', 0)")
-		cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('referral_reward_uzb', '100')")
-		cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('referral_reward_foreign', '80')")
-		cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('min_payment_amount', '1000')")
-		cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('order_channel_id', '')")
-		
-		cursor.execute("SELECT COUNT(*) FROM bot_status")
-		count = cursor.fetchone()[0]
-		if count == 0:
-			cursor.execute("INSERT INTO bot_status (is_active, updated_by) VALUES (1, NULL)")
+		for name, value in actual.items():
+			stored_value, reconciled_at = stored.get(name, (0, None))
+			# Birinchi hisoblash farq emas
+			if reconciled_at and abs((stored_value or 0) - value) > 1e-6:
+				logging.warning(f"Statistika farqi tuzatildi: {name} {stored_value} -> {value}")
 		
+		cursor.executemany(
+			"UPDATE stats_counters SET value = ?, reconciled_at = CURRENT_TIMESTAMP WHERE name = ?",
+			[(value, name) for name, value in actual.items()]
+		)
 		conn.commit()
-		logging.info("Barcha ma'lumotlar bazasi jadvallari muvaffaqiyatli yaratildi")
 		return True
 	except sqlite3.Error as e:
-		logging.error(f"Jadvallarni yaratishda xatolik: {e}")
+		logging.error(f"Statistikani tekshirishda xatolik: {e}")
 		return False
 	finally:
 		conn.close()
 
+def get_stats_counters():
+	conn = create_connection()
+	if not conn:
+		return {}
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute("SELECT name, value FROM stats_counters")
+		return dict(cursor.fetchall())
+	except sqlite3.Error as e:
+		logging.error(f"Statistikani olishda xatolik: {e}")
+		return {}
+	finally:
+		conn.close()
+
+async def run_stats_reconcile_loop():
+	while True:
+		await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+		await run_write(reconcile_stats_counters)
+		await run_db(reconcile_ledger)
+
 def get_next_bot_id():
 	conn = create_connection()
 	if not conn:
@@ -231,11 +425,11 @@ def get_next_bot_id():
 	
 	return str(next_id)
 
-async def add_user(user_id, username, full_name, bot_id, bot=None, phone_number=None, country_code=None,
-                   referrer_id=None):
+def save_user(user_id, username, full_name, bot_id, phone_number=None, country_code=None, referrer_id=None):
+	"""Foydalanuvchini saqlash - referal bo'lsa (mukofot, referer balansi) qaytadi"""
 	conn = create_connection()
 	if not conn:
-		return False
+		return False, None
 	
 	cursor = conn.cursor()
 	
@@ -250,7 +444,9 @@ async def add_user(user_id, username, full_name, bot_id, bot=None, phone_number=
 					(phone_number, country_code, user_id)
 				)
 				conn.commit()
-			return True
+			return True, None
+		
+		referral = None
 		
 		if referrer_id:
 			cursor.execute(
@@ -272,34 +468,16 @@ async def add_user(user_id, username, full_name, bot_id, bot=None, phone_number=
 			reward_row = cursor.fetchone()
 			reward_amount = float(reward_row[0]) if reward_row else 100.0
 			
-			cursor.execute(
-				"UPDATE users SET balance = balance + ? WHERE id = ?",
-				(reward_amount, referrer_id)
-			)
-			
-			cursor.execute(
-				"INSERT INTO transactions (user_id, amount, transaction_type, payment_id) VALUES (?, ?, ?, ?)",
-				(referrer_id, reward_amount, "referral", f"ref_{user_id}")
-			)
-			
-			if bot:
-				try:
-					cursor.execute("SELECT balance FROM users WHERE id = ?", (referrer_id,))
-					referrer_balance = cursor.fetchone()[0]
-					
-					country_name = "O'zbekiston" if country_code == "UZ" else "Boshqa davlat"
-					
-					await bot.send_message(
-						chat_id=referrer_id,
-						text=f"🎉 Tabriklaymiz! Yangi foydalanuvchi sizning referal havolangiz orqali ro'yxatdan o'tdi!\n\n"
-						     f"👤 Foydalanuvchi: {full_name}\n"
-						     f"🌍 Mamlakat: {country_name}\n"
-						     f"💰 Sizga berilgan mukofot: {reward_amount} so'm\n"
-						     f"💵 Yangi balans: {referrer_balance} so'm\n\n"
-						     f"Referal dasturida ishtirok etganingiz uchun rahmat!"
-					)
-				except Exception as e:
-					logging.error(f"Referal bildirishnomasi yuborishda xatolik: {e}")
+			# Bitta foydalanuvchi uchun mukofot bir marta (payment_id = ref_{user_id})
+			entry = _post_ledger_entry(cursor, referrer_id, reward_amount, "referral", f"ref_{user_id}")
+			if entry:
+				referral = (reward_amount, entry[1])
+				# YANGI: bildirishnoma shu tranzaksiyada navbatga yoziladi (message_outbox.py yuboradi) -
+				# mukofot commit bo'lsa xabar yo'qolmaydi, ro'yxatdan o'tish Telegram javobini kutmaydi
+				queue_outbound_message(
+					cursor, referrer_id,
+					format_referral_notification(full_name, country_code, reward_amount, entry[1])
+				)
 		else:
 			cursor.execute(
 				"INSERT OR IGNORE INTO users (id, username, full_name, bot_id, phone_number, country_code) VALUES (?, ?, ?, ?, ?, ?)",
@@ -307,13 +485,38 @@ async def add_user(user_id, username, full_name, bot_id, bot=None, phone_number=
 			)
 		
 		conn.commit()
-		return True
+		return True, referral
 	except sqlite3.Error as e:
 		logging.error(f"Foydalanuvchi qo'shishda xatolik: {e}")
-		return False
+		return False, None
 	finally:
 		conn.close()
 
+def format_referral_notification(full_name, country_code, reward_amount, referrer_balance):
+	country_name = "O'zbekiston" if country_code == "UZ" else "Boshqa davlat"
+	return (
+		f"🎉 Tabriklaymiz! Yangi foydalanuvchi sizning referal havolangiz orqali ro'yxatdan o'tdi!\n\n"
+		f"👤 Foydalanuvchi: {full_name}\n"
+		f"🌍 Mamlakat: {country_name}\n"
+		f"💰 Sizga berilgan mukofot: {reward_amount} so'm\n"
+		f"💵 Yangi balans: {referrer_balance} so'm\n\n"
+		f"Referal dasturida ishtirok etganingiz uchun rahmat!"
+	)
+
+def queue_outbound_message(cursor, chat_id, text, parse_mode=None):
+	"""Chaqiruvchining tranzaksiyasi ichida - xabar yozuv bilan birga commit bo'ladi"""
+	cursor.execute(
+		"INSERT INTO message_outbox (chat_id, text, parse_mode) VALUES (?, ?, ?)",
+		(chat_id, text, parse_mode)
+	)
+
+async def add_user(user_id, username, full_name, bot_id, phone_number=None, country_code=None, referrer_id=None):
+	# Referal bildirishnomasi save_user tranzaksiyasida navbatga yoziladi - bu yerda Telegram kutilmaydi
+	success, _ = await run_write(
+		save_user, user_id, username, full_name, bot_id, phone_number, country_code, referrer_id
+	)
+	return success
+
 def get_user(user_id):
 	conn = create_connection()
 	if not conn:
@@ -331,6 +534,8 @@ def get_user(user_id):
 	finally:
 		conn.close()
 
+USER_BY_BOT_ID_SQL = "SELECT * FROM users WHERE bot_id = ?"
+
 def get_user_by_bot_id(bot_id):
 	conn = create_connection()
 	if not conn:
@@ -339,7 +544,7 @@ def get_user_by_bot_id(bot_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM users WHERE bot_id = ?", (bot_id,))
+		cursor.execute(USER_BY_BOT_ID_SQL, (bot_id,))
 		user = cursor.fetchone()
 		return user
 	except sqlite3.Error as e:
@@ -348,43 +553,98 @@ def get_user_by_bot_id(bot_id):
 	finally:
 		conn.close()
 
-def update_balance(user_id, new_balance):
+# YANGI: balans daftari. users.balance - transactions.amount yig'indisining tayyor qiymati.
+# Har bir o'zgarish bitta tranzaksiyada: daftarga yozuv + balance = balance + ?, Python'da hisoblangan balans yozilmaydi.
+# payment_id noyob (migrations.py) - bir to'lov ikki marta kelsa ham balans bir marta o'zgaradi.
+LEDGER_TOLERANCE = 0.01
+LEDGER_REPORT_LIMIT = 20
+
+def _post_ledger_entry(cursor, user_id, amount, transaction_type, payment_id, floor_at_zero=False):
+	"""(yozilgan summa, yangi balans); payment_id avval ishlatilgan yoki foydalanuvchi yo'q bo'lsa None"""
+	# Ayirishda musbat balans noldan pastga tushmaydi - daftarga haqiqatda ayirilgan summa yoziladi.
+	# Balans allaqachon manfiy bo'lsa chegara qo'llanmaydi: MAX(?, -balance) ayirishni kirimga aylantirardi
+	if floor_at_zero:
+		amount_sql = "CASE WHEN COALESCE(balance, 0) > 0 THEN MAX(?, -balance) ELSE ? END"
+		amount_params = (amount, amount)
+	else:
+		amount_sql = "?"
+		amount_params = (amount,)
+	cursor.execute(
+		f"""INSERT INTO transactions (user_id, amount, transaction_type, payment_id)
+		SELECT id, {amount_sql}, ?, ? FROM users WHERE id = ?
+		ON CONFLICT (payment_id) DO NOTHING
+		RETURNING amount""",
+		(*amount_params, transaction_type, payment_id, user_id)
+	)
+	row = cursor.fetchone()
+	if not row:
+		return None
+	
+	cursor.execute(
+		"UPDATE users SET balance = COALESCE(balance, 0) + ? WHERE id = ? RETURNING balance",
+		(row[0], user_id)
+	)
+	return row[0], cursor.fetchone()[0]
+
+def apply_balance_change(user_id, amount, transaction_type, payment_id, floor_at_zero=False):
+	"""
+	Balansni daftar orqali o'zgartirish (amount manfiy bo'lsa ayiriladi).
+	(True, yangi balans) - yozildi; (False, joriy balans) - bu payment_id allaqachon yozilgan;
+	(False, None) - foydalanuvchi topilmadi yoki xatolik.
+	"""
 	conn = create_connection()
 	if not conn:
-		return False
+		return False, None
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, user_id))
+		entry = _post_ledger_entry(cursor, user_id, amount, transaction_type, payment_id, floor_at_zero)
+		if entry is None:
+			conn.rollback()
+			cursor.execute("SELECT balance FROM users WHERE id = ?", (user_id,))
+			row = cursor.fetchone()
+			return False, row[0] if row else None
+		
 		conn.commit()
-		return True
+		return True, entry[1]
 	except sqlite3.Error as e:
-		logging.error(f"Balansni yangilashda xatolik: {e}")
-		return False
+		logging.error(f"Balansni o'zgartirishda xatolik ({payment_id}): {e}")
+		return False, None
 	finally:
 		conn.close()
 
-def add_transaction(user_id, amount, transaction_type, payment_id):
+def reconcile_ledger():
+	"""users.balance ni transactions yig'indisi bilan solishtirish - farqlar tuzatilmaydi, logga yoziladi"""
 	conn = create_connection()
 	if not conn:
-		return False
+		return None
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute(
-			"INSERT INTO transactions (user_id, amount, transaction_type, payment_id) VALUES (?, ?, ?, ?)",
-			(user_id, amount, transaction_type, payment_id)
-		)
-		conn.commit()
-		return True
+		cursor.execute('''
+            SELECT u.id, COALESCE(u.balance, 0), COALESCE(t.total, 0) FROM users u
+            LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM transactions GROUP BY user_id) t
+            ON t.user_id = u.id
+            WHERE ABS(COALESCE(u.balance, 0) - COALESCE(t.total, 0)) > ?
+        ''', (LEDGER_TOLERANCE,))
+		mismatches = cursor.fetchall()
+		
+		for user_id, balance, total in mismatches[:LEDGER_REPORT_LIMIT]:
+			logging.error(f"Balans daftarga mos emas: foydalanuvchi {user_id}, balans {balance}, daftar {total}")
+		if len(mismatches) > LEDGER_REPORT_LIMIT:
+			logging.error(f"... va yana {len(mismatches) - LEDGER_REPORT_LIMIT} ta foydalanuvchi balansi mos emas")
+		
+		return mismatches
 	except sqlite3.Error as e:
-		logging.error(f"Tranzaksiya qo'shishda xatolik: {e}")
-		return False
+		logging.error(f"Balans daftarini tekshirishda xatolik: {e}")
+		return None
 	finally:
 		conn.close()
 
+USER_TRANSACTIONS_SQL = "SELECT * FROM transactions WHERE user_id = ? ORDER BY created_at DESC"
+
 def get_user_transactions(user_id):
 	conn = create_connection()
 	if not conn:
@@ -393,7 +653,7 @@ def get_user_transactions(user_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM transactions WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
+		cursor.execute(USER_TRANSACTIONS_SQL, (user_id,))
 		transactions = cursor.fetchall()
 		return transactions
 	except sqlite3.Error as e:
@@ -402,20 +662,102 @@ def get_user_transactions(user_id):
 	finally:
 		conn.close()
 
-def get_all_users():
+# YANGI: foydalanuvchilarni id bo'yicha (keyset) bo'laklab o'qish - butun jadval xotiraga yuklanmaydi
+USER_BATCH_SIZE = 1000
+
+USER_COLUMNS = (
+	"id", "username", "full_name", "bot_id", "balance", "created_at", "referrer_id", "referral_count",
+	"phone_number", "country_code", "is_blocked", "bot_blocked", "delivery_failures", "last_delivery_error"
+)
+
+USER_FILTERS = {
+	"active": "COALESCE(is_blocked, 0) != 1 AND COALESCE(bot_blocked, 0) != 1",
+	"not_blocked": "COALESCE(is_blocked, 0) != 1",
+	"blocked": "is_blocked = 1",
+	"reachable": "bot_blocked = 0",
+	"unreachable": "bot_blocked = 1",
+	"has_phone": "phone_number IS NOT NULL AND phone_number != ''"
+}
+
+def _users_where(filters):
+	unknown = [name for name in filters if name not in USER_FILTERS]
+	if unknown:
+		raise ValueError(f"Noma'lum filtr: {', '.join(unknown)}")
+	return [USER_FILTERS[name] for name in filters]
+
+def _users_batch_sql(select_columns, filters):
+	conditions = ["id > ?"] + _users_where(filters)
+	return f"SELECT {', '.join(select_columns)} FROM users WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+
+def _count_users_sql(filters):
+	conditions = _users_where(filters)
+	where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+	return f"SELECT COUNT(*) FROM users{where}"
+
+def fetch_users_batch(columns=("id",), filters=(), after_id=0, limit=USER_BATCH_SIZE):
+	"""id > after_id bo'lgan keyingi bo'lak; qatorlar faqat so'ralgan ustunlardan iborat"""
+	columns = tuple(columns)
+	unknown = [column for column in columns if column not in USER_COLUMNS]
+	if unknown:
+		raise ValueError(f"Noma'lum ustun: {', '.join(unknown)}")
+	
+	# Keyingi bo'lak uchun id kerak - so'ralmagan bo'lsa qo'shib olinadi va keyin olib tashlanadi
+	select_columns = columns if "id" in columns else ("id",) + columns
+	sql = _users_batch_sql(select_columns, filters)
+	
 	conn = create_connection()
 	if not conn:
-		return []
+		return [], None
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM users")
-		users = cursor.fetchall()
-		return users
+		cursor.execute(sql, (after_id, limit))
+		rows = cursor.fetchall()
+		if not rows:
+			return [], None
+		
+		last_id = rows[-1][select_columns.index("id")]
+		if select_columns is not columns:
+			rows = [row[1:] for row in rows]
+		return rows, last_id
 	except sqlite3.Error as e:
-		logging.error(f"Barcha foydalanuvchilarni olishda xatolik: {e}")
-		return []
+		logging.error(f"Foydalanuvchilarni o'qishda xatolik: {e}")
+		return [], None
+	finally:
+		conn.close()
+
+def iter_users(columns=("id",), filters=(), batch_size=USER_BATCH_SIZE, after_id=0):
+	"""Sinxron generator; bo'laklar orasida ulanish ushlab turilmaydi"""
+	while True:
+		rows, after_id = fetch_users_batch(columns, filters, after_id, batch_size)
+		if not rows:
+			return
+		yield from rows
+
+async def iter_user_batches(columns=("id",), filters=(), batch_size=USER_BATCH_SIZE, after_id=0):
+	"""Asinxron generator - har bir bo'lak DB thread pool'da o'qiladi"""
+	while True:
+		rows, after_id = await run_db(fetch_users_batch, columns, filters, after_id, batch_size)
+		if not rows:
+			return
+		yield rows
+
+def count_users(filters=()):
+	sql = _count_users_sql(filters)
+	
+	conn = create_connection()
+	if not conn:
+		return 0
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(sql)
+		return cursor.fetchone()[0]
+	except sqlite3.Error as e:
+		logging.error(f"Foydalanuvchilarni sanashda xatolik: {e}")
+		return 0
 	finally:
 		conn.close()
 
@@ -655,6 +997,10 @@ def update_setting(key, value):
 	finally:
 		conn.close()
 
+TOP_REFERRERS_SQL = "SELECT id, username, full_name, referral_count FROM users ORDER BY referral_count DESC LIMIT ?"
+
+USER_REFERRALS_SQL = "SELECT * FROM users WHERE referrer_id = ?"
+
 def get_top_referrers(limit=10):
 	conn = create_connection()
 	if not conn:
@@ -663,10 +1009,7 @@ def get_top_referrers(limit=10):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute(
-			"SELECT id, username, full_name, referral_count FROM users ORDER BY referral_count DESC LIMIT ?",
-			(limit,)
-		)
+		cursor.execute(TOP_REFERRERS_SQL, (limit,))
 		top_referrers = cursor.fetchall()
 		return top_referrers
 	except sqlite3.Error as e:
@@ -683,10 +1026,7 @@ def get_user_referrals(user_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute(
-			"SELECT * FROM users WHERE referrer_id = ?",
-			(user_id,)
-		)
+		cursor.execute(USER_REFERRALS_SQL, (user_id,))
 		referrals = cursor.fetchall()
 		return referrals
 	except sqlite3.Error as e:
@@ -763,24 +1103,52 @@ def is_user_blocked(user_id):
 	finally:
 		conn.close()
 
-def search_user_by_id(user_id):
+def record_delivery_failures(failures, limit):
+	"""Yetkazilmagan xabarlarni qayd qilish - ketma-ket limit marta bo'lsa foydalanuvchi nofaol bo'ladi"""
 	conn = create_connection()
 	if not conn:
-		return None
+		return False
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-		user = cursor.fetchone()
-		return user
+		cursor.executemany(
+			"""UPDATE users SET delivery_failures = delivery_failures + 1, last_delivery_error = ?,
+			bot_blocked = CASE WHEN delivery_failures + 1 >= ? THEN 1 ELSE bot_blocked END WHERE id = ?""",
+			[(error_type, limit, user_id) for user_id, error_type in failures]
+		)
+		conn.commit()
+		return True
 	except sqlite3.Error as e:
-		logging.error(f"ID orqali foydalanuvchi qidirishda xatolik: {e}")
-		return None
+		logging.error(f"Yetkazish xatoliklarini saqlashda xatolik: {e}")
+		return False
 	finally:
 		conn.close()
 
-def search_user_by_bot_id(bot_id):
+def reset_delivery_failures(user_ids):
+	"""Xabar yetkazilgan yoki qayta faollashgan foydalanuvchilarni faol qilish"""
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.executemany(
+			"""UPDATE users SET delivery_failures = 0, bot_blocked = 0
+			WHERE id = ? AND (delivery_failures > 0 OR bot_blocked = 1)""",
+			[(user_id,) for user_id in user_ids]
+		)
+		conn.commit()
+		return True
+	except sqlite3.Error as e:
+		logging.error(f"Yetkazish holatini tiklashda xatolik: {e}")
+		return False
+	finally:
+		conn.close()
+
+def get_delivery_status(user_id):
+	"""(bot_blocked, delivery_failures) yoki foydalanuvchi bo'lmasa None"""
 	conn = create_connection()
 	if not conn:
 		return None
@@ -788,80 +1156,58 @@ def search_user_by_bot_id(bot_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM users WHERE bot_id = ?", (bot_id,))
-		user = cursor.fetchone()
-		return user
+		cursor.execute("SELECT bot_blocked, delivery_failures FROM users WHERE id = ?", (user_id,))
+		return cursor.fetchone()
 	except sqlite3.Error as e:
-		logging.error(f"Bot ID orqali foydalanuvchi qidirishda xatolik: {e}")
+		logging.error(f"Yetkazish holatini olishda xatolik: {e}")
 		return None
 	finally:
 		conn.close()
 
-def add_money_to_user(user_id, amount):
+def count_unreachable_users():
+	return count_users(("unreachable",))
+
+def search_user_by_id(user_id):
 	conn = create_connection()
 	if not conn:
-		return False
+		return None
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT balance FROM users WHERE id = ?", (user_id,))
-		result = cursor.fetchone()
-		if not result:
-			return False
-		
-		current_balance = result[0]
-		new_balance = current_balance + amount
-		
-		cursor.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, user_id))
-		
-		cursor.execute(
-			"INSERT INTO transactions (user_id, amount, transaction_type, payment_id) VALUES (?, ?, ?, ?)",
-			(user_id, amount, "admin_add", f"admin_add_{datetime.now().timestamp()}")
-		)
-		
-		conn.commit()
-		return True
+		cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+		user = cursor.fetchone()
+		return user
 	except sqlite3.Error as e:
-		logging.error(f"Foydalanuvchiga pul qo'shishda xatolik: {e}")
-		return False
+		logging.error(f"ID orqali foydalanuvchi qidirishda xatolik: {e}")
+		return None
 	finally:
 		conn.close()
 
-def subtract_money_from_user(user_id, amount):
+def search_user_by_bot_id(bot_id):
 	conn = create_connection()
 	if not conn:
-		return False
+		return None
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT balance FROM users WHERE id = ?", (user_id,))
-		result = cursor.fetchone()
-		if not result:
-			return False
-		
-		current_balance = result[0]
-		new_balance = current_balance - amount
-		
-		if new_balance < 0:
-			new_balance = 0
-		
-		cursor.execute("UPDATE users SET balance = ? WHERE id = ?", (new_balance, user_id))
-		
-		cursor.execute(
-			"INSERT INTO transactions (user_id, amount, transaction_type, payment_id) VALUES (?, ?, ?, ?)",
-			(user_id, -amount, "admin_subtract", f"admin_subtract_{datetime.now().timestamp()}")
-		)
-		
-		conn.commit()
-		return True
+		cursor.execute(USER_BY_BOT_ID_SQL, (bot_id,))
+		user = cursor.fetchone()
+		return user
 	except sqlite3.Error as e:
-		logging.error(f"Foydalanuvchidan pul ayirishda xatolik: {e}")
-		return False
+		logging.error(f"Bot ID orqali foydalanuvchi qidirishda xatolik: {e}")
+		return None
 	finally:
 		conn.close()
 
+def add_money_to_user(user_id, amount, payment_id):
+	return apply_balance_change(user_id, amount, "admin_add", payment_id)
+
+def subtract_money_from_user(user_id, amount, payment_id):
+	# Balans noldan pastga tushmaydi
+	return apply_balance_change(user_id, -amount, "admin_subtract", payment_id, floor_at_zero=True)
+
 def get_all_channels():
 	conn = create_connection()
 	if not conn:
@@ -1090,6 +1436,8 @@ def get_user_subscriptions(user_id):
 	finally:
 		conn.close()
 
+CHANNEL_SUBSCRIBERS_COUNT_SQL = "SELECT COUNT(*) FROM user_channel_subscriptions WHERE channel_id = ?"
+
 def get_channel_subscribers_count(channel_id):
 	conn = create_connection()
 	if not conn:
@@ -1098,10 +1446,7 @@ def get_channel_subscribers_count(channel_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute(
-			"SELECT COUNT(*) FROM user_channel_subscriptions WHERE channel_id = ?",
-			(channel_id,)
-		)
+		cursor.execute(CHANNEL_SUBSCRIBERS_COUNT_SQL, (channel_id,))
 		count = cursor.fetchone()[0]
 		return count
 	except sqlite3.Error as e:
@@ -1332,7 +1677,7 @@ def get_bot_status():
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT is_active FROM bot_status ORDER BY id DESC LIMIT 1")
+		cursor.execute("SELECT is_active FROM bot_status WHERE id = 1")
 		result = cursor.fetchone()
 		return bool(result[0]) if result else True
 	except sqlite3.Error as e:
@@ -1350,7 +1695,7 @@ def update_bot_status(is_active, updated_by):
 	
 	try:
 		cursor.execute(
-			"INSERT INTO bot_status (is_active, updated_by) VALUES (?, ?)",
+			"UPDATE bot_status SET is_active = ?, updated_at = CURRENT_TIMESTAMP, updated_by = ? WHERE id = 1",
 			(is_active, updated_by)
 		)
 		conn.commit()
@@ -1535,6 +1880,15 @@ def update_product_order_status(order_id, status):
 	finally:
 		conn.close()
 
+USER_PRODUCT_ORDERS_SQL = """
+            SELECT po.*, p.name as product_name
+            FROM product_orders po
+            JOIN products p ON po.product_id = p.id
+            WHERE po.user_id = ?
+            ORDER BY po.created_at DESC
+            LIMIT ?
+        """
+
 def get_user_product_orders(user_id, limit=10):
 	conn = create_connection()
 	if not conn:
@@ -1543,14 +1897,7 @@ def get_user_product_orders(user_id, limit=10):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("""
-            SELECT po.*, p.name as product_name
-            FROM product_orders po
-            JOIN products p ON po.product_id = p.id
-            WHERE po.user_id = ?
-            ORDER BY po.created_at DESC
-            LIMIT ?
-        """, (user_id, limit))
+		cursor.execute(USER_PRODUCT_ORDERS_SQL, (user_id, limit))
 		orders = cursor.fetchall()
 		return orders
 	except sqlite3.Error as e:
@@ -0,0 +1,44 @@
+import logging
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+
+from config import DELIVERY_FAILURE_LIMIT
+from database import run_db, run_write, record_delivery_failures, reset_delivery_failures, get_delivery_status
+
+# Errors that mean the user can no longer receive messages from the bot
+UNREACHABLE_ERRORS = ("blocked", "chat_not_found")
+
+def classify_send_error(error):
+	description = str(error).lower()
+	if isinstance(error, TelegramForbiddenError) or "blocked" in description or "deactivated" in description:
+		return "blocked"
+	if isinstance(error, TelegramBadRequest) and "chat not found" in description:
+		return "chat_not_found"
+	return "other"
+
+async def report_delivery_failures(failures):
+	failures = [(user_id, error_type) for user_id, error_type in failures if error_type in UNREACHABLE_ERRORS]
+	if failures:
+		await run_write(record_delivery_failures, failures, DELIVERY_FAILURE_LIMIT)
+
+async def report_delivery_success(user_ids):
+	if user_ids:
+		await run_write(reset_delivery_failures, user_ids)
+
+async def send_to_user(bot, chat_id, method="send_message", **kwargs):
+	"""Xabar yuborish va yetkazish holatini qayd qilish - nofaol foydalanuvchilar o'tkazib yuboriladi"""
+	status = await run_db(get_delivery_status, chat_id)
+	if status and status[0]:
+		logging.info(f"Skipping message to unreachable user {chat_id}")
+		return False
+	
+	try:
+		await getattr(bot, method)(chat_id=chat_id, **kwargs)
+	except Exception as e:
+		logging.error(f"Error sending message to user {chat_id}: {e}")
+		if status:
+			await report_delivery_failures([(chat_id, classify_send_error(e))])
+		return False
+	
+	if status and status[1]:
+		await report_delivery_success([chat_id])
+	return True
@@ -0,0 +1,205 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from cache import TTLCache
+from config import FSM_CACHE_TTL, FSM_STATE_TTL
+from database import create_connection, run_db, run_write
+
+FSM_CACHE_SIZE = 50000
+FSM_PURGE_INTERVAL = 600
+
+def _key_columns(key):
+	# thread_id is part of the primary key, so NULL is stored as 0
+	return key.bot_id, key.chat_id, key.user_id, key.thread_id or 0, key.destiny
+
+FSM_LOAD_SQL = """SELECT state, data FROM fsm_states
+			WHERE bot_id = ? AND chat_id = ? AND user_id = ? AND thread_id = ? AND destiny = ? AND expires_at > ?"""
+
+def load_fsm_record(key_columns):
+	conn = create_connection()
+	if not conn:
+		return None, {}
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(FSM_LOAD_SQL, (*key_columns, time.time()))
+		row = cursor.fetchone()
+		if not row:
+			return None, {}
+		return row[0], json.loads(row[1])
+	except Exception as e:
+		logging.error(f"Error loading FSM record {key_columns}: {e}")
+		return None, {}
+	finally:
+		conn.close()
+
+def save_fsm_state(key_columns, state, ttl):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		# An expired row must not leak its old data into the new state
+		cursor.execute(
+			"""INSERT INTO fsm_states (bot_id, chat_id, user_id, thread_id, destiny, state, expires_at)
+			VALUES (?, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT (bot_id, chat_id, user_id, thread_id, destiny) DO UPDATE SET
+			state = excluded.state,
+			data = CASE WHEN fsm_states.expires_at > ? THEN fsm_states.data ELSE '{}' END,
+			expires_at = excluded.expires_at""",
+			(*key_columns, state, time.time() + ttl, time.time())
+		)
+		conn.commit()
+		return True
+	except Exception as e:
+		logging.error(f"Error saving FSM state {key_columns}: {e}")
+		return False
+	finally:
+		conn.close()
+
+def save_fsm_data(key_columns, data, ttl):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"""INSERT INTO fsm_states (bot_id, chat_id, user_id, thread_id, destiny, data, expires_at)
+			VALUES (?, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT (bot_id, chat_id, user_id, thread_id, destiny) DO UPDATE SET
+			state = CASE WHEN fsm_states.expires_at > ? THEN fsm_states.state ELSE NULL END,
+			data = excluded.data,
+			expires_at = excluded.expires_at""",
+			(*key_columns, json.dumps(data, ensure_ascii=False), time.time() + ttl, time.time())
+		)
+		conn.commit()
+		return True
+	except Exception as e:
+		logging.error(f"Error saving FSM data {key_columns}: {e}")
+		return False
+	finally:
+		conn.close()
+
+def purge_fsm_records():
+	conn = create_connection()
+	if not conn:
+		return 0
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"DELETE FROM fsm_states WHERE expires_at <= ? OR (state IS NULL AND data = '{}')",
+			(time.time(),)
+		)
+		conn.commit()
+		return cursor.rowcount
+	except Exception as e:
+		logging.error(f"Error purging FSM records: {e}")
+		return 0
+	finally:
+		conn.close()
+
+class SQLiteStorage(BaseStorage):
+	"""
+	FSM storage kept in the bot's SQLite database, so states survive restarts and
+	can be shared by several bot processes. The in-memory cache (cache_ttl > 0) only
+	sees this process's writes - enable it for a single bot process only.
+	"""
+	
+	def __init__(self, cache_ttl=FSM_CACHE_TTL, state_ttl=FSM_STATE_TTL, cache_size=FSM_CACHE_SIZE):
+		self.state_ttl = state_ttl
+		self._cache = TTLCache(cache_size, cache_ttl, "fsm") if cache_ttl > 0 else None
+		# key -> [write generation, loads in flight]; only kept while a load of the key is running
+		self._generations = {}
+		self._last_purge = time.monotonic()
+		self._purge_task = None
+	
+	async def _get_record(self, key):
+		if self._cache is None:
+			return await run_db(load_fsm_record, _key_columns(key))
+		
+		record = self._cache.get(key)
+		if record is not None:
+			return record
+		
+		entry = self._generations.setdefault(key, [0, 0])
+		generation = entry[0]
+		entry[1] += 1
+		try:
+			record = await run_db(load_fsm_record, _key_columns(key))
+		finally:
+			entry[1] -= 1
+			if not entry[1]:
+				del self._generations[key]
+		
+		# A write that committed while the row was loading may have been missed by the load
+		if entry[0] == generation:
+			self._cache.set(key, record)
+		return record
+	
+	def _bump_generation(self, key):
+		entry = self._generations.get(key)
+		if entry is not None:
+			entry[0] += 1
+	
+	def _update_cache(self, key, index, value):
+		if self._cache is None:
+			return
+		
+		self._bump_generation(key)
+		# Only the changed field is patched; an uncached record is loaded on the next read
+		record = self._cache.pop(key)
+		if record is None:
+			return
+		record = list(record)
+		record[index] = value
+		self._cache.set(key, tuple(record))
+	
+	def _maybe_purge(self):
+		now = time.monotonic()
+		if now - self._last_purge < FSM_PURGE_INTERVAL:
+			return
+		if self._purge_task is not None and not self._purge_task.done():
+			return
+		
+		self._last_purge = now
+		self._purge_task = asyncio.create_task(run_write(purge_fsm_records))
+	
+	async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+		state = state.state if isinstance(state, State) else state
+		self._bump_generation(key)
+		await run_write(save_fsm_state, _key_columns(key), state, self.state_ttl)
+		self._update_cache(key, 0, state)
+		self._maybe_purge()
+	
+	async def get_state(self, key: StorageKey) -> Optional[str]:
+		record = await self._get_record(key)
+		return record[0]
+	
+	async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+		self._bump_generation(key)
+		await run_write(save_fsm_data, _key_columns(key), data, self.state_ttl)
+		self._update_cache(key, 1, data.copy())
+		self._maybe_purge()
+	
+	async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+		record = await self._get_record(key)
+		return record[1].copy()
+	
+	async def close(self) -> None:
+		if self._purge_task is not None:
+			await asyncio.gather(self._purge_task, return_exceptions=True)
+		if self._cache is not None:
+			self._cache.clear()
@@ -1,10 +1,17 @@
 import gspread
+from gspread.utils import numericise_all
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
+import re
+import time
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 import json
 import os
 
+from database import create_connection, run_write_sync
+
 SCOPES = [
 	'https://www.googleapis.com/auth/spreadsheets',
 	'https://www.googleapis.com/auth/drive'
@@ -13,47 +20,277 @@ SCOPES = [
 GOOGLE_SHEETS_CREDENTIALS_FILE = "credentials.json"
 SPREADSHEET_ID = "your_spreadsheet_id_here"
 WORKSHEET_NAME = "Orders"
+WORKSHEET_HEADERS = [
+	"Sana", "Ism", "Telefon", "Manzil", "Tovar",
+	"Summa", "To'lov Usuli", "Username", "User ID",
+	"Tovar ID", "Status", "Izoh"
+]
+
+class SheetsClientManager:
+	"""
+	gspread client bir marta avtorizatsiya qilinadi, Spreadsheet va Worksheet
+	obyektlari keshlanadi. Token faqat muddati tugaganda yangilanadi.
+	Bir nechta ishchi oqimdan chaqirish xavfsiz.
+	"""
+	
+	def __init__(self, credentials_factory, scopes=SCOPES):
+		self._credentials_factory = credentials_factory
+		self._scopes = scopes
+		self._lock = threading.RLock()
+		self._credentials = None
+		self._client = None
+		self._spreadsheets = {}
+		self._worksheets = {}
+	
+	def get_client(self):
+		with self._lock:
+			if self._client is None:
+				self._credentials = self._credentials_factory(self._scopes)
+				self._client = gspread.authorize(self._credentials)
+			elif not self._credentials.valid:
+				# Bir vaqtda bir nechta oqim tokenni yangilamasligi uchun lock ostida
+				self._credentials.refresh(Request())
+			return self._client
+	
+	def get_spreadsheet(self, key=None, url=None):
+		cache_key = key or url
+		with self._lock:
+			spreadsheet = self._spreadsheets.get(cache_key)
+			if spreadsheet is None:
+				client = self.get_client()
+				spreadsheet = client.open_by_key(key) if key else client.open_by_url(url)
+				self._spreadsheets[cache_key] = spreadsheet
+			else:
+				self.get_client()
+			return spreadsheet
+	
+	def get_worksheet(self, title=None, key=None, url=None, headers=None):
+		"""title berilmasa birinchi varaq; topilmasa headers bilan yaratiladi"""
+		cache_key = (key or url, title)
+		with self._lock:
+			worksheet = self._worksheets.get(cache_key)
+			if worksheet is not None:
+				self.get_client()
+				return worksheet
+			
+			spreadsheet = self.get_spreadsheet(key=key, url=url)
+			if title is None:
+				worksheet = spreadsheet.sheet1
+			else:
+				try:
+					worksheet = spreadsheet.worksheet(title)
+				except gspread.WorksheetNotFound:
+					worksheet = spreadsheet.add_worksheet(title=title, rows=1000, cols=20)
+					if headers:
+						worksheet.append_row(headers)
+			
+			self._worksheets[cache_key] = worksheet
+			return worksheet
+	
+	def invalidate(self):
+		"""Xatolikdan keyin keshlangan obyektlarni tashlab yuborish (client saqlanadi)"""
+		with self._lock:
+			self._spreadsheets.clear()
+			self._worksheets.clear()
+
+def load_service_account_file(scopes):
+	if not os.path.exists(GOOGLE_SHEETS_CREDENTIALS_FILE):
+		raise FileNotFoundError(f"Google Sheets credentials file not found: {GOOGLE_SHEETS_CREDENTIALS_FILE}")
+	return Credentials.from_service_account_file(GOOGLE_SHEETS_CREDENTIALS_FILE, scopes=scopes)
+
+sheets_manager = SheetsClientManager(load_service_account_file)
 
 def get_google_sheets_client():
 	try:
-		if not os.path.exists(GOOGLE_SHEETS_CREDENTIALS_FILE):
-			logging.error(f"Google Sheets credentials file not found: {GOOGLE_SHEETS_CREDENTIALS_FILE}")
-			return None
-		
-		credentials = Credentials.from_service_account_file(
-			GOOGLE_SHEETS_CREDENTIALS_FILE,
-			scopes=SCOPES
-		)
-		client = gspread.authorize(credentials)
-		return client
+		return sheets_manager.get_client()
 	except Exception as e:
 		logging.error(f"Google Sheets client yaratishda xato: {e}")
 		return None
 
 def get_worksheet():
 	try:
-		client = get_google_sheets_client()
-		if not client:
-			return None
-		
-		spreadsheet = client.open_by_key(SPREADSHEET_ID)
-		
-		try:
-			worksheet = spreadsheet.worksheet(WORKSHEET_NAME)
-		except gspread.WorksheetNotFound:
-			worksheet = spreadsheet.add_worksheet(title=WORKSHEET_NAME, rows=1000, cols=20)
-			headers = [
-				"Sana", "Ism", "Telefon", "Manzil", "Tovar",
-				"Summa", "To'lov Usuli", "Username", "User ID",
-				"Tovar ID", "Status", "Izoh"
-			]
-			worksheet.append_row(headers)
-		
-		return worksheet
+		return sheets_manager.get_worksheet(WORKSHEET_NAME, key=SPREADSHEET_ID, headers=WORKSHEET_HEADERS)
 	except Exception as e:
+		sheets_manager.invalidate()
 		logging.error(f"Worksheet olishda xato: {e}")
 		return None
 
+# YANGI: buyurtmalarning mahalliy indeksi - qidiruvlar butun varaqni yuklamaydi.
+# Varaqdagi qator raqami kalit bo'lib xizmat qiladi, yangi qatorlar qator raqami bo'yicha qo'shib boriladi.
+ORDER_INDEX_SYNC_INTERVAL = 60
+# Qo'lda o'zgartirilgan Status/Izoh, o'chirilgan yoki surilgan qatorlar faqat to'liq qayta qurishda olinadi
+ORDER_INDEX_REBUILD_INTERVAL = 3600
+ORDER_INDEX_WRITE_CHUNK = 500
+ORDER_COLUMNS = (
+	"sana", "ism", "telefon", "manzil", "tovar", "summa", "tolov_usuli",
+	"username", "user_id", "tovar_id", "status", "izoh"
+)
+STATUS_COLUMN = "K"
+IZOH_COLUMN = "L"
+
+_index_state = {"ready": False, "synced_at": 0.0, "rebuilt_at": 0.0}
+_index_lock = threading.RLock()
+
+def _phone_key(phone):
+	# Raqamlar teskari tartibda saqlanadi: oxirgi raqamlar bo'yicha qidiruv indeksdan prefiks sifatida o'qiladi
+	return "".join(ch for ch in str(phone) if ch.isdigit())[::-1]
+
+def _parse_order_date(sana):
+	try:
+		return datetime.strptime(str(sana).split()[0], '%d.%m.%Y').strftime('%Y-%m-%d')
+	except (ValueError, IndexError):
+		return None
+
+def _parse_summa(summa):
+	try:
+		return float(str(summa).replace(',', ''))
+	except (ValueError, TypeError):
+		return 0
+
+def _index_row(row_number, values):
+	values = [str(value) for value in values[:len(ORDER_COLUMNS)]]
+	values += [""] * (len(ORDER_COLUMNS) - len(values))
+	sana, telefon, summa = values[0], values[2], values[5]
+	return (row_number, *values, _parse_order_date(sana), _parse_summa(summa), _phone_key(telefon))
+
+def _write_index_rows(rows, stale_rows=(), last_row=None):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.executemany(
+			f"""INSERT OR REPLACE INTO sheet_orders (row_number, {', '.join(ORDER_COLUMNS)}, order_date, summa_value,
+			phone_key) VALUES ({', '.join('?' * (len(ORDER_COLUMNS) + 4))})""",
+			rows
+		)
+		cursor.executemany("DELETE FROM sheet_orders WHERE row_number = ?", [(row,) for row in stale_rows])
+		if last_row is not None:
+			cursor.execute("DELETE FROM sheet_orders WHERE row_number > ?", (last_row,))
+		conn.commit()
+		return True
+	except Exception as e:
+		logging.error(f"Buyurtmalar indeksini yozishda xato: {e}")
+		return False
+	finally:
+		conn.close()
+
+def _store_index_rows(rows, stale_rows=(), last_row=None):
+	"""
+	Writer orqali ORDER_INDEX_WRITE_CHUNK qatordan yoziladi - to'liq qayta qurish boshqa yozuvlarni
+	uzoq to'xtatib qo'ymaydi. Kalit row_number: har bir qator yangilanadi, bo'sh qatorlar (stale_rows)
+	va varaq oxiridan keyingilari (last_row) oxirgi bo'lakda o'chiriladi.
+	"""
+	for start in range(0, len(rows), ORDER_INDEX_WRITE_CHUNK):
+		if not run_write_sync(_write_index_rows, rows[start:start + ORDER_INDEX_WRITE_CHUNK]):
+			return False
+	
+	if stale_rows or last_row is not None:
+		return run_write_sync(_write_index_rows, [], stale_rows, last_row)
+	return True
+
+def _last_indexed_row():
+	conn = create_connection()
+	if not conn:
+		return 1
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute("SELECT MAX(row_number) FROM sheet_orders")
+		result = cursor.fetchone()
+		# 1-qator sarlavha
+		return result[0] if result and result[0] else 1
+	except Exception as e:
+		logging.error(f"Buyurtmalar indeksini o'qishda xato: {e}")
+		return 1
+	finally:
+		conn.close()
+
+def rebuild_order_index():
+	"""Indeksni varaqdan to'liq qayta qurish (varaq qo'lda tahrirlanganda)"""
+	with _index_lock:
+		worksheet = get_worksheet()
+		if not worksheet:
+			return False
+		
+		try:
+			all_values = worksheet.get_all_values()
+		except Exception as e:
+			sheets_manager.invalidate()
+			logging.error(f"Buyurtmalar indeksini qayta qurishda xato: {e}")
+			return False
+		
+		rows = [_index_row(i, values) for i, values in enumerate(all_values[1:], start=2) if any(values)]
+		stale_rows = [i for i, values in enumerate(all_values[1:], start=2) if not any(values)]
+		if not _store_index_rows(rows, stale_rows, last_row=max(len(all_values), 1)):
+			return False
+		
+		_index_state["synced_at"] = _index_state["rebuilt_at"] = time.monotonic()
+		logging.info(f"Buyurtmalar indeksi qayta qurildi: {len(rows)} ta qator")
+		return True
+
+def sync_order_index(force=False):
+	"""
+	Odatda faqat indeksdagi oxirgi qatordan keyingi yangi qatorlarni yuklab oladi.
+	Ishga tushgandan keyin birinchi marta va har ORDER_INDEX_REBUILD_INTERVAL da indeks to'liq qayta quriladi.
+	"""
+	with _index_lock:
+		rebuild = time.monotonic() - _index_state["rebuilt_at"] >= ORDER_INDEX_REBUILD_INTERVAL
+		if not _index_state["ready"]:
+			_index_state["ready"] = True
+			rebuild = True
+		
+		if rebuild:
+			return rebuild_order_index()
+		
+		if not force and time.monotonic() - _index_state["synced_at"] < ORDER_INDEX_SYNC_INTERVAL:
+			return True
+		
+		worksheet = get_worksheet()
+		if not worksheet:
+			return False
+		
+		last_row = _last_indexed_row()
+		try:
+			new_values = worksheet.get(f"A{last_row + 1}:{IZOH_COLUMN}")
+		except Exception as e:
+			sheets_manager.invalidate()
+			logging.error(f"Buyurtmalar indeksini yangilashda xato: {e}")
+			return False
+		
+		rows = [_index_row(i, values) for i, values in enumerate(new_values, start=last_row + 1) if any(values)]
+		if rows and not _store_index_rows(rows):
+			return False
+		
+		_index_state["synced_at"] = time.monotonic()
+		return True
+
+ORDERS_BY_USER = "WHERE user_id = ?"
+ORDERS_BY_PHONE_KEY = "WHERE phone_key >= ? AND phone_key < ?"
+ORDERS_BY_DATE = "WHERE order_date >= ? AND order_date <= ?"
+
+def _orders_sql(where=""):
+	return f"SELECT {', '.join(ORDER_COLUMNS)} FROM sheet_orders {where} ORDER BY row_number"
+
+def _query_orders(where="", params=()):
+	sync_order_index()
+	
+	conn = create_connection()
+	if not conn:
+		return []
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(_orders_sql(where), params)
+		# get_all_records() bilan bir xil ko'rinish: raqamli qiymatlar son sifatida qaytadi
+		return [dict(zip(WORKSHEET_HEADERS, numericise_all(list(row)))) for row in cursor.fetchall()]
+	finally:
+		conn.close()
+
 def save_order_to_sheets(order_data):
 	try:
 		worksheet = get_worksheet()
@@ -80,51 +317,110 @@ def save_order_to_sheets(order_data):
 			tovar_id, status, izoh
 		]
 		
-		worksheet.append_row(row_data)
+		result = worksheet.append_row(row_data)
 		logging.info(f"Buyurtma Google Sheets ga saqlandi: User ID {user_id}")
+		
+		# Yangi qator raqami javobdan olinadi va indeksga darhol yoziladi
+		updated_range = (result or {}).get("updates", {}).get("updatedRange", "")
+		match = re.search(r"(\d+)$", updated_range)
+		if match and _index_state["ready"]:
+			row_number = int(match.group(1))
+			with _index_lock:
+				# Oraliqda boshqa jarayon qator qo'shgan bo'lsa, ular keyingi sinxronlashda olinadi
+				if _last_indexed_row() == row_number - 1:
+					run_write_sync(_write_index_rows, [_index_row(row_number, row_data)])
 		return True
 	
 	except Exception as e:
+		sheets_manager.invalidate()
 		logging.error(f"Google Sheets ga saqlashda xato: {e}")
 		return False
 
+def _order_row_matches(worksheet, row_number, user_id):
+	"""Indeksdagi qator varaqda hali ham shu foydalanuvchining buyurtmasimi"""
+	values = worksheet.get(f"A{row_number}:{IZOH_COLUMN}{row_number}")
+	row = values[0] if values else []
+	user_column = ORDER_COLUMNS.index("user_id")
+	return len(row) > user_column and str(row[user_column]) == str(user_id)
+
 def update_order_status(user_id, new_status, izoh=""):
 	try:
 		worksheet = get_worksheet()
 		if not worksheet:
 			return False
 		
-		all_records = worksheet.get_all_records()
+		for attempt in range(2):
+			orders = _find_order_rows("WHERE user_id = ? ORDER BY row_number LIMIT 1", (str(user_id),))
+			if not orders:
+				logging.warning(f"Buyurtma topilmadi: User ID {user_id}")
+				return False
+			
+			row_number = orders[0]
+			if _order_row_matches(worksheet, row_number, user_id):
+				break
+			
+			# Varaqdagi qatorlar o'chirilgan yoki surilgan - boshqa buyurtmaga yozmaslik uchun indeks qayta quriladi
+			logging.warning(f"Indeksdagi {row_number}-qator boshqa buyurtmaga tegishli: User ID {user_id}")
+			rebuild_order_index()
+		else:
+			logging.error(f"Buyurtma qatori varaqda topilmadi: User ID {user_id}")
+			return False
 		
-		for i, record in enumerate(all_records, start=2):
-			if str(record.get('User ID', '')) == str(user_id):
-				worksheet.update_cell(i, 11, new_status)
-				if izoh:
-					worksheet.update_cell(i, 12, izoh)
-				logging.info(f"Buyurtma statusi yangilandi: User ID {user_id} -> {new_status}")
-				return True
+		updates = [{"range": f"{STATUS_COLUMN}{row_number}", "values": [[new_status]]}]
+		if izoh:
+			updates.append({"range": f"{IZOH_COLUMN}{row_number}", "values": [[izoh]]})
+		worksheet.batch_update(updates)
 		
-		logging.warning(f"Buyurtma topilmadi: User ID {user_id}")
-		return False
+		run_write_sync(_update_index_row, row_number, new_status, izoh)
+		logging.info(f"Buyurtma statusi yangilandi: User ID {user_id} -> {new_status}")
+		return True
 	
 	except Exception as e:
+		sheets_manager.invalidate()
 		logging.error(f"Status yangilashda xato: {e}")
 		return False
 
+def _find_order_rows(where, params):
+	sync_order_index()
+	
+	conn = create_connection()
+	if not conn:
+		return []
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(f"SELECT row_number FROM sheet_orders {where}", params)
+		return [row[0] for row in cursor.fetchall()]
+	finally:
+		conn.close()
+
+def _update_index_row(row_number, status, izoh=""):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		if izoh:
+			cursor.execute(
+				"UPDATE sheet_orders SET status = ?, izoh = ? WHERE row_number = ?",
+				(status, izoh, row_number)
+			)
+		else:
+			cursor.execute("UPDATE sheet_orders SET status = ? WHERE row_number = ?", (status, row_number))
+		conn.commit()
+		return True
+	except Exception as e:
+		logging.error(f"Buyurtmalar indeksini yangilashda xato: {e}")
+		return False
+	finally:
+		conn.close()
+
 def get_user_orders(user_id):
 	try:
-		worksheet = get_worksheet()
-		if not worksheet:
-			return []
-		
-		all_records = worksheet.get_all_records()
-		user_orders = []
-		
-		for record in all_records:
-			if str(record.get('User ID', '')) == str(user_id):
-				user_orders.append(record)
-		
-		return user_orders
+		return _query_orders(ORDERS_BY_USER, (str(user_id),))
 	
 	except Exception as e:
 		logging.error(f"Foydalanuvchi buyurtmalarini olishda xato: {e}")
@@ -132,31 +428,25 @@ def get_user_orders(user_id):
 
 def get_all_orders():
 	try:
-		worksheet = get_worksheet()
-		if not worksheet:
-			return []
-		
-		all_records = worksheet.get_all_records()
-		return all_records
+		return _query_orders()
 	
 	except Exception as e:
 		logging.error(f"Barcha buyurtmalarni olishda xato: {e}")
 		return []
 
 def search_orders_by_phone(phone_number):
+	"""
+	To'liq raqam yoki uning oxirgi raqamlari bo'yicha qidirish. Faqat raqam oxiri mos kelishi kerak -
+	avvalgidek raqamning o'rtasidagi qism bo'yicha endi topilmaydi.
+	"""
 	try:
-		worksheet = get_worksheet()
-		if not worksheet:
+		prefix = _phone_key(phone_number)
+		if not prefix:
 			return []
 		
-		all_records = worksheet.get_all_records()
-		matching_orders = []
-		
-		for record in all_records:
-			if phone_number in str(record.get('Telefon', '')):
-				matching_orders.append(record)
-		
-		return matching_orders
+		# phone_key teskari yozilgan, shuning uchun oxirgi raqamlar indeksdagi prefiks oralig'iga aylanadi
+		upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+		return _query_orders(ORDERS_BY_PHONE_KEY, (prefix, upper))
 	
 	except Exception as e:
 		logging.error(f"Telefon bo'yicha qidirishda xato: {e}")
@@ -164,24 +454,15 @@ def search_orders_by_phone(phone_number):
 
 def get_orders_by_date_range(start_date, end_date):
 	try:
-		worksheet = get_worksheet()
-		if not worksheet:
-			return []
-		
-		all_records = worksheet.get_all_records()
-		filtered_orders = []
+		# Varaqdagi sana kun boshi deb olinadi (avvalgi hisoblash bilan bir xil)
+		start_day = start_date.date()
+		if start_date.time() != datetime.min.time():
+			start_day = start_day + timedelta(days=1)
 		
-		for record in all_records:
-			try:
-				order_date_str = record.get('Sana', '')
-				if order_date_str:
-					order_date = datetime.strptime(order_date_str.split()[0], '%d.%m.%Y')
-					if start_date <= order_date <= end_date:
-						filtered_orders.append(record)
-			except ValueError:
-				continue
-		
-		return filtered_orders
+		return _query_orders(
+			ORDERS_BY_DATE,
+			(start_day.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+		)
 	
 	except Exception as e:
 		logging.error(f"Sana bo'yicha filtrlashda xato: {e}")
@@ -189,29 +470,25 @@ def get_orders_by_date_range(start_date, end_date):
 
 def get_orders_statistics():
 	try:
-		worksheet = get_worksheet()
-		if not worksheet:
-			return {}
+		sync_order_index()
 		
-		all_records = worksheet.get_all_records()
+		conn = create_connection()
+		if not conn:
+			return {}
 		
-		total_orders = len(all_records)
-		total_amount = 0
-		status_count = {}
-		payment_methods = {}
+		cursor = conn.cursor()
 		
-		for record in all_records:
-			try:
-				summa = float(str(record.get('Summa', 0)).replace(',', ''))
-				total_amount += summa
-			except (ValueError, TypeError):
-				pass
+		try:
+			cursor.execute("SELECT COUNT(*), COALESCE(SUM(summa_value), 0) FROM sheet_orders")
+			total_orders, total_amount = cursor.fetchone()
 			
-			status = record.get('Status', 'Noma\'lum')
-			status_count[status] = status_count.get(status, 0) + 1
+			cursor.execute("SELECT status, COUNT(*) FROM sheet_orders GROUP BY status")
+			status_count = dict(cursor.fetchall())
 			
-			payment_method = record.get('To\'lov Usuli', 'Noma\'lum')
-			payment_methods[payment_method] = payment_methods.get(payment_method, 0) + 1
+			cursor.execute("SELECT tolov_usuli, COUNT(*) FROM sheet_orders GROUP BY tolov_usuli")
+			payment_methods = dict(cursor.fetchall())
+		finally:
+			conn.close()
 		
 		return {
 			'total_orders': total_orders,
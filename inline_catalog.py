@@ -0,0 +1,228 @@
+import logging
+import asyncio
+import bisect
+import heapq
+import unicodedata
+from collections import namedtuple
+from aiogram import Router
+from aiogram.types import (
+	InlineQuery, InlineQueryResultArticle, InlineQueryResultCachedPhoto, InlineQueryResultCachedVideo,
+	InputTextMessageContent
+)
+
+from database import create_connection, run_db
+from tovar import build_product_post, get_catalog_version, search_terms
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+INLINE_RESULTS_PER_PAGE = 20
+# Deepest offset served - Telegram users rarely scroll further and it bounds every lookup
+INLINE_MAX_RESULTS = 100
+# Telegram caches an answer for the same query text this long (seconds)
+INLINE_CACHE_TIME = 300
+# Catalog changes reach inline results after at most this many seconds
+INLINE_SNAPSHOT_REFRESH = 60
+# Prefixes up to this length get a precomputed top list, longer ones merge a few postings
+SHORT_PREFIX_LENGTH = 2
+# Candidates checked against the remaining words of a multi-word query
+MULTI_TERM_SCAN_LIMIT = 5000
+# Inline captions are limited to 1024 characters
+INLINE_DESCRIPTION_LIMIT = 500
+
+SNAPSHOT_FIELDS = (
+	'product_id', 'name', 'description', 'price', 'image_file_id', 'video_file_id', 'product_type',
+	'category', 'brand', 'warranty_months', 'tags'
+)
+
+CatalogItem = namedtuple('CatalogItem', SNAPSHOT_FIELDS)
+
+_snapshot = {"current": None}
+
+def fold_text(text):
+	# "café" -> "cafe"; applied to both the snapshot and the query
+	if text.isascii():
+		return text
+	decomposed = unicodedata.normalize("NFKD", text)
+	if decomposed == text:
+		return text
+	return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+class CatalogSnapshot:
+	"""
+	Read-only view of the active products, most sold first.
+	Every word of name/brand/category/tags maps to the sorted positions of the products
+	containing it, so a lookup never depends on the catalog size.
+	"""
+	
+	def __init__(self, products, version):
+		self.version = version
+		self.products = products
+		self.product_terms = []
+		self._results = {}
+		
+		postings = {}
+		for position, product in enumerate(products):
+			text = " ".join(str(value) for value in (product.name, product.brand, product.category, product.tags) if value)
+			terms = set(search_terms(fold_text(text), limit=None))
+			# " word1 word2 " - a word prefix check is a substring search for " prefix"
+			self.product_terms.append(f" {' '.join(terms)} ")
+			for term in terms:
+				postings.setdefault(term, []).append(position)
+		
+		self.terms = sorted(postings)
+		self.postings = [postings[term] for term in self.terms]
+		
+		self.short_prefixes = {}
+		for term in self.terms:
+			for length in range(1, SHORT_PREFIX_LENGTH + 1):
+				prefix = term[:length]
+				if prefix not in self.short_prefixes:
+					self.short_prefixes[prefix] = list(self._merge_postings(prefix, INLINE_MAX_RESULTS))
+	
+	def _merge_postings(self, prefix, limit):
+		start = bisect.bisect_left(self.terms, prefix)
+		end = bisect.bisect_left(self.terms, prefix + "\U0010ffff", start)
+		previous = None
+		count = 0
+		# A product with two words sharing the prefix appears twice in a row
+		for position in heapq.merge(*self.postings[start:end]):
+			if position == previous:
+				continue
+			previous = position
+			yield position
+			count += 1
+			if count >= limit:
+				return
+	
+	def _positions(self, prefix):
+		if len(prefix) <= SHORT_PREFIX_LENGTH:
+			return iter(self.short_prefixes.get(prefix, ()))
+		return self._merge_postings(prefix, INLINE_MAX_RESULTS)
+	
+	def search(self, query, offset=0, limit=INLINE_RESULTS_PER_PAGE):
+		"""Returns (products, has_more)"""
+		wanted = min(offset + limit, INLINE_MAX_RESULTS)
+		terms = sorted(set(search_terms(fold_text(query))), key=len, reverse=True)
+		
+		if not terms:
+			matches = self.products[offset:wanted]
+			return matches, wanted < min(len(self.products), INLINE_MAX_RESULTS)
+		
+		# The longest word is usually the most selective one
+		driver, others = terms[0], [f" {term}" for term in terms[1:]]
+		positions = []
+		for scanned, position in enumerate(self._positions(driver)):
+			if scanned >= MULTI_TERM_SCAN_LIMIT:
+				break
+			product_terms = self.product_terms[position]
+			if all(other in product_terms for other in others):
+				positions.append(position)
+				if len(positions) > wanted:
+					break
+		
+		has_more = len(positions) > wanted and wanted < INLINE_MAX_RESULTS
+		return [self.products[position] for position in positions[offset:wanted]], has_more
+	
+	def inline_result(self, product, bot_username):
+		result = self._results.get(product.product_id)
+		if result is None:
+			result = build_inline_result(product, bot_username)
+			self._results[product.product_id] = result
+		return result
+
+def build_inline_result(product, bot_username):
+	text, markup = build_product_post(product, bot_username)
+	price = f"{product.price:,} UZS"
+	
+	if product.product_type == "image" and product.image_file_id:
+		return InlineQueryResultCachedPhoto(
+			id=product.product_id,
+			photo_file_id=product.image_file_id,
+			title=product.name,
+			description=price,
+			caption=text,
+			parse_mode="HTML",
+			reply_markup=markup
+		)
+	
+	if product.product_type == "video" and product.video_file_id:
+		return InlineQueryResultCachedVideo(
+			id=product.product_id,
+			video_file_id=product.video_file_id,
+			title=product.name,
+			description=price,
+			caption=text,
+			parse_mode="HTML",
+			reply_markup=markup
+		)
+	
+	return InlineQueryResultArticle(
+		id=product.product_id,
+		title=product.name,
+		description=price,
+		input_message_content=InputTextMessageContent(message_text=text, parse_mode="HTML"),
+		reply_markup=markup
+	)
+
+def load_catalog_snapshot():
+	version = get_catalog_version()
+	conn = create_connection()
+	if not conn:
+		return None
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(f'''
+            SELECT {', '.join(SNAPSHOT_FIELDS)} FROM products
+            WHERE is_active = 1
+            ORDER BY sales_count DESC, total_revenue DESC
+        ''')
+		products = []
+		for row in cursor.fetchall():
+			product = CatalogItem(*row)
+			if product.description and len(product.description) > INLINE_DESCRIPTION_LIMIT:
+				product = product._replace(description=product.description[:INLINE_DESCRIPTION_LIMIT] + "…")
+			products.append(product)
+		return CatalogSnapshot(products, version)
+	except Exception as e:
+		logger.error(f"Error loading catalog snapshot: {e}")
+		return None
+	finally:
+		conn.close()
+
+async def refresh_catalog_snapshot():
+	snapshot = await run_db(load_catalog_snapshot)
+	if snapshot is not None:
+		_snapshot["current"] = snapshot
+		logger.info(f"Inline catalog snapshot loaded: {len(snapshot.products)} products")
+	return snapshot
+
+async def run_catalog_snapshot_loop():
+	while True:
+		await asyncio.sleep(INLINE_SNAPSHOT_REFRESH)
+		current = _snapshot["current"]
+		if current is None or current.version != get_catalog_version():
+			await refresh_catalog_snapshot()
+
+@router.inline_query()
+async def inline_product_search(inline_query: InlineQuery):
+	snapshot = _snapshot["current"]
+	if snapshot is None:
+		await inline_query.answer([], cache_time=5, is_personal=False)
+		return
+	
+	offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+	products, has_more = snapshot.search(inline_query.query, offset=offset)
+	
+	bot_username = (await inline_query.bot.me()).username
+	results = [snapshot.inline_result(product, bot_username) for product in products]
+	
+	await inline_query.answer(
+		results,
+		cache_time=INLINE_CACHE_TIME,
+		is_personal=False,
+		next_offset=str(offset + len(products)) if has_more else ""
+	)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from aiogram.exceptions import TelegramRetryAfter
+
+from broadcast import global_bucket, chat_throttle
+from database import run_write
+from delivery import classify_send_error, report_delivery_failures, UNREACHABLE_ERRORS
+from outbox import OutboxWorker, claim_rows, finish_rows, retry_delay
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 30
+OUTBOX_CLAIM_LEASE = 120
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_MAX_BACKOFF = 3600
+OUTBOX_SENDER_COUNT = 4
+OUTBOX_COLUMNS = ("chat_id", "text", "parse_mode")
+
+def claim_outbound_messages(limit):
+	return claim_rows("message_outbox", OUTBOX_COLUMNS, limit, OUTBOX_CLAIM_LEASE)
+
+def finish_outbound_messages(sent_ids, failures):
+	"""Sent rows are deleted; a failure with retry_after None means the chat can't receive messages"""
+	return finish_rows("message_outbox", sent_ids, failures, OUTBOX_MAX_ATTEMPTS)
+
+async def deliver_message(bot, message):
+	"""Returns None when sent, otherwise (error, retry_after, error_type)"""
+	message_id, attempts, chat_id, text, parse_mode = message
+	await global_bucket.acquire()
+	await chat_throttle.wait(chat_id)
+	try:
+		await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+		return None
+	except TelegramRetryAfter as e:
+		logger.warning(f"Flood limit while sending message to user {chat_id}, retrying after {e.retry_after}s")
+		global_bucket.pause(e.retry_after)
+		return str(e), e.retry_after, "flood_wait"
+	except Exception as e:
+		error_type = classify_send_error(e)
+		logger.error(f"Error sending message to user {chat_id}: {e}")
+		if error_type in UNREACHABLE_ERRORS:
+			return str(e), None, error_type
+		return str(e), retry_delay(attempts + 1, OUTBOX_MAX_BACKOFF), error_type
+
+async def send_outbox_batch(bot):
+	messages = await run_write(claim_outbound_messages, OUTBOX_BATCH_SIZE)
+	if not messages:
+		return 0
+	
+	queue = asyncio.Queue()
+	for message in messages:
+		queue.put_nowait(message)
+	
+	sent_ids = []
+	failures = []
+	delivery_failures = []
+	
+	async def sender():
+		while True:
+			try:
+				message = queue.get_nowait()
+			except asyncio.QueueEmpty:
+				return
+			
+			result = await deliver_message(bot, message)
+			if result is None:
+				sent_ids.append(message[0])
+				continue
+			
+			error, retry_after, error_type = result
+			failures.append((message[0], message[1] + 1, error, retry_after))
+			delivery_failures.append((message[2], error_type))
+	
+	await asyncio.gather(*(sender() for _ in range(min(OUTBOX_SENDER_COUNT, len(messages)))))
+	
+	await run_write(finish_outbound_messages, sent_ids, failures)
+	await report_delivery_failures(delivery_failures)
+	return len(messages)
+
+message_worker = OutboxWorker(
+	"Message outbox", send_outbox_batch, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_BACKOFF
+)
+
+def start_message_outbox(bot):
+	return message_worker.start(bot)
+
+def wake_message_outbox():
+	"""Called after a write that queued messages - the worker doesn't wait for the next poll"""
+	message_worker.wake()
@@ -0,0 +1,799 @@
+import sys
+import sqlite3
+import logging
+
+from database import DB_PATH, open_connection, USER_STATS_TERMS, PRODUCT_STATS_TERMS, PRODUCT_SEARCH_COLUMNS, \
+	SEARCH_APOSTROPHES
+
+# YANGI: butun ma'lumotlar bazasi sxemasi shu modulda boshqariladi.
+# Har bir migratsiya bir marta, o'z tranzaksiyasida bajariladi va schema_migrations jadvaliga yoziladi.
+# Qo'llangan migratsiyani o'zgartirmang - sxema o'zgarsa MIGRATIONS oxiriga yangi versiya qo'shing.
+
+def _table_columns(cursor, table):
+	cursor.execute(f"PRAGMA table_info({table})")
+	return {row[1] for row in cursor.fetchall()}
+
+def _add_missing_columns(cursor, table, columns):
+	existing = _table_columns(cursor, table)
+	for column_name, column_type in columns:
+		if column_name not in existing:
+			cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}")
+
+def _migrate_baseline(cursor):
+	"""Migratsiyalardan oldingi barcha create_* funksiyalari yaratgan sxema"""
+	# Eski database.create_tables() products jadvalini boshqa tuzilishda yaratardi (product_id ustunisiz).
+	# Bunday jadval tovar modulida ishlamaydi - ma'lumot yo'qolmasligi uchun nomi o'zgartiriladi
+	product_columns = _table_columns(cursor, "products")
+	if product_columns and "product_id" not in product_columns:
+		cursor.execute("ALTER TABLE products RENAME TO products_legacy")
+		logging.warning("Eski products jadvali products_legacy deb qayta nomlandi")
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        bot_id TEXT UNIQUE,
+        balance REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        referrer_id INTEGER,
+        referral_count INTEGER DEFAULT 0,
+        phone_number TEXT,
+        country_code TEXT,
+        is_blocked INTEGER DEFAULT 0
+    )
+    ''')
+
+	# Xabar yetkazish holati - bot_blocked=1 bo'lsa post yuborishda o'tkazib yuboriladi
+	_add_missing_columns(cursor, "users", [
+		('bot_blocked', 'INTEGER DEFAULT 0'),
+		('delivery_failures', 'INTEGER DEFAULT 0'),
+		('last_delivery_error', 'TEXT')
+	])
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        amount REAL,
+        transaction_type TEXT,
+        payment_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS wallets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        card_number TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pending_payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        wallet_id INTEGER,
+        amount REAL,
+        receipt_photo_id TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (wallet_id) REFERENCES wallets (id)
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS payment_methods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        payment_token TEXT NOT NULL,
+        image_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS channels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        is_active INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_channel_subscriptions (
+        user_id INTEGER,
+        channel_id INTEGER,
+        subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, channel_id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (channel_id) REFERENCES channels (id)
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS required_channels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id TEXT NOT NULL UNIQUE,
+        channel_name TEXT NOT NULL,
+        invite_link TEXT NOT NULL,
+        added_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS required_bots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bot_token TEXT NOT NULL,
+        bot_username TEXT NOT NULL,
+        bot_name TEXT NOT NULL,
+        added_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS channel_join_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        channel_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS custom_links (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        url TEXT NOT NULL,
+        added_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bot_status (
+        id INTEGER PRIMARY KEY,
+        is_active INTEGER DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_by INTEGER
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        price REAL NOT NULL,
+        uzum_link TEXT,
+        image_file_id TEXT,
+        video_file_id TEXT,
+        product_type TEXT NOT NULL,
+        is_active INTEGER DEFAULT 1,
+        created_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sales_count INTEGER DEFAULT 0,
+        total_revenue REAL DEFAULT 0,
+        last_sold TIMESTAMP,
+        category TEXT DEFAULT 'Umumiy',
+        tags TEXT,
+        discount_percent REAL DEFAULT 0,
+        stock_quantity INTEGER DEFAULT -1,
+        min_order_quantity INTEGER DEFAULT 1,
+        max_order_quantity INTEGER DEFAULT -1,
+        weight REAL DEFAULT 0,
+        dimensions TEXT,
+        warranty_months INTEGER DEFAULT 0,
+        brand TEXT,
+        model TEXT,
+        color TEXT,
+        material TEXT,
+        origin_country TEXT DEFAULT 'Uzbekistan',
+        is_featured INTEGER DEFAULT 0,
+        sort_order INTEGER DEFAULT 0,
+        seo_title TEXT,
+        seo_description TEXT,
+        seo_keywords TEXT
+    )
+    ''')
+
+	_add_missing_columns(cursor, "products", [
+		('uzum_link', 'TEXT'),
+		('last_sold', 'TIMESTAMP'),
+		('category', 'TEXT DEFAULT "Umumiy"'),
+		('tags', 'TEXT'),
+		('discount_percent', 'REAL DEFAULT 0'),
+		('stock_quantity', 'INTEGER DEFAULT -1'),
+		('min_order_quantity', 'INTEGER DEFAULT 1'),
+		('max_order_quantity', 'INTEGER DEFAULT -1'),
+		('weight', 'REAL DEFAULT 0'),
+		('dimensions', 'TEXT'),
+		('warranty_months', 'INTEGER DEFAULT 0'),
+		('brand', 'TEXT'),
+		('model', 'TEXT'),
+		('color', 'TEXT'),
+		('material', 'TEXT'),
+		('origin_country', 'TEXT DEFAULT "Uzbekistan"'),
+		('is_featured', 'INTEGER DEFAULT 0'),
+		('sort_order', 'INTEGER DEFAULT 0'),
+		('seo_title', 'TEXT'),
+		('seo_description', 'TEXT'),
+		('seo_keywords', 'TEXT')
+	])
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_sales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        product_price REAL NOT NULL DEFAULT 0,
+        paid_amount REAL NOT NULL DEFAULT 0,
+        remaining_amount REAL NOT NULL DEFAULT 0,
+        payment_method TEXT NOT NULL,
+        sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        customer_name TEXT,
+        customer_phone TEXT,
+        customer_location TEXT,
+        status TEXT DEFAULT 'completed',
+        admin_notes TEXT,
+        quantity INTEGER DEFAULT 1,
+        unit_price REAL DEFAULT 0,
+        discount_amount REAL DEFAULT 0,
+        tax_amount REAL DEFAULT 0,
+        shipping_cost REAL DEFAULT 0,
+        tracking_number TEXT,
+        delivery_date TIMESTAMP,
+        delivery_status TEXT DEFAULT 'pending',
+        rating INTEGER DEFAULT 0,
+        review TEXT,
+        refund_amount REAL DEFAULT 0,
+        refund_reason TEXT,
+        refund_date TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products (product_id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+	_add_missing_columns(cursor, "product_sales", [
+		('product_price', 'REAL DEFAULT 0'),
+		('paid_amount', 'REAL DEFAULT 0'),
+		('remaining_amount', 'REAL DEFAULT 0'),
+		('status', 'TEXT DEFAULT "completed"'),
+		('admin_notes', 'TEXT'),
+		('quantity', 'INTEGER DEFAULT 1'),
+		('unit_price', 'REAL DEFAULT 0'),
+		('discount_amount', 'REAL DEFAULT 0'),
+		('tax_amount', 'REAL DEFAULT 0'),
+		('shipping_cost', 'REAL DEFAULT 0'),
+		('tracking_number', 'TEXT'),
+		('delivery_date', 'TIMESTAMP'),
+		('delivery_status', 'TEXT DEFAULT "pending"'),
+		('rating', 'INTEGER DEFAULT 0'),
+		('review', 'TEXT'),
+		('refund_amount', 'REAL DEFAULT 0'),
+		('refund_reason', 'TEXT'),
+		('refund_date', 'TIMESTAMP')
+	])
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        payment_method TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_by INTEGER,
+        post_type TEXT,
+        post_text TEXT,
+        file_id TEXT,
+        buttons TEXT,
+        status TEXT DEFAULT 'running',
+        last_user_id INTEGER DEFAULT 0,
+        total_count INTEGER DEFAULT 0,
+        sent_count INTEGER DEFAULT 0,
+        error_count INTEGER DEFAULT 0,
+        status_chat_id INTEGER,
+        status_message_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+	_add_missing_columns(cursor, "broadcast_jobs", [('error_stats', 'TEXT')])
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        bot_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        thread_id INTEGER NOT NULL DEFAULT 0,
+        destiny TEXT NOT NULL DEFAULT 'default',
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (bot_id, chat_id, user_id, thread_id, destiny)
+    )
+    ''')
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_expires ON fsm_states (expires_at)")
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sheets_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_data TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    ''')
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_sheets_outbox_pending ON sheets_outbox (status, next_attempt_at)"
+	)
+	
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sheet_orders (
+        row_number INTEGER PRIMARY KEY,
+        sana TEXT,
+        ism TEXT,
+        telefon TEXT,
+        manzil TEXT,
+        tovar TEXT,
+        summa TEXT,
+        tolov_usuli TEXT,
+        username TEXT,
+        user_id TEXT,
+        tovar_id TEXT,
+        status TEXT,
+        izoh TEXT,
+        order_date TEXT,
+        summa_value REAL DEFAULT 0,
+        phone_key TEXT
+    )
+    ''')
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_sheet_orders_user ON sheet_orders (user_id, row_number)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_sheet_orders_phone ON sheet_orders (phone_key)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_sheet_orders_date ON sheet_orders (order_date)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_sheet_orders_status ON sheet_orders (status)")
+	
+	cursor.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('bot_id', 0)")
+	cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('referral_reward_uzb', '100')")
+	cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('referral_reward_foreign', '80')")
+	cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('min_payment_amount', '1000')")
+	cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('order_channel_id', '')")
+
+def _migrate_single_bot_status(cursor):
+	"""bot_status - bitta qator (id=1).
+	Avval channels moduli har o'zgarishda yangi qator qo'shar, admin esa id=1 ni yangilar edi -
+	ikkalasidan eng oxirgi o'zgarish saqlab qolinadi."""
+	cursor.execute(
+		"SELECT is_active, updated_by, updated_at FROM bot_status ORDER BY updated_at DESC, id DESC LIMIT 1"
+	)
+	latest = cursor.fetchone()
+	
+	cursor.execute("DELETE FROM bot_status")
+	if latest:
+		cursor.execute(
+			"INSERT INTO bot_status (id, is_active, updated_by, updated_at) VALUES (1, ?, ?, ?)",
+			latest
+		)
+	else:
+		cursor.execute("INSERT INTO bot_status (id, is_active) VALUES (1, 1)")
+
+def _migrate_unique_join_requests(cursor):
+	"""Har bir (user_id, channel_id) uchun bitta so'rov - saqlash ON CONFLICT orqali bajariladi"""
+	cursor.execute('''
+    DELETE FROM channel_join_requests
+    WHERE id NOT IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id, channel_id ORDER BY created_at DESC, id DESC
+            ) AS rn
+            FROM channel_join_requests
+        )
+        WHERE rn = 1
+    )
+    ''')
+	cursor.execute(
+		"CREATE UNIQUE INDEX IF NOT EXISTS idx_channel_join_requests_user_channel "
+		"ON channel_join_requests (user_id, channel_id)"
+	)
+
+def _migrate_query_indexes(cursor):
+	"""Mavjud so'rovlar uchun indekslar (hot_queries() bilan tekshiriladi)"""
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_referrer ON users (referrer_id)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_bot_blocked ON users (bot_blocked)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, created_at)")
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_user_channel_subscriptions_channel ON user_channel_subscriptions (channel_id)"
+	)
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_products_active_sales ON products (is_active, sales_count, total_revenue)"
+	)
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_products_active_category "
+		"ON products (is_active, category, is_featured, sales_count)"
+	)
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_sales_product ON product_sales (product_id, sale_date)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_sales_user ON product_sales (user_id, sale_date)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_sales_date ON product_sales (sale_date)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_orders_user ON product_orders (user_id, created_at)")
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status)")
+
+def _stats_delta_sql(terms, sign_rows):
+	"""sign_rows: [('+', 'NEW'), ('-', 'OLD')] - bitta UPDATE bilan barcha hisoblagichlar o'zgaradi"""
+	cases = []
+	for name, term in terms.items():
+		delta = " ".join(f"{sign} ({term.format(row=row)})" for sign, row in sign_rows)
+		cases.append(f"WHEN '{name}' THEN {delta}")
+	names = ", ".join(f"'{name}'" for name in terms)
+	return f"UPDATE stats_counters SET value = value + (CASE name {' '.join(cases)} ELSE 0 END) WHERE name IN ({names});"
+
+def _create_stats_triggers(cursor, table, terms, watched_columns):
+	prefix = f"stats_{table}"
+	cursor.execute(f"DROP TRIGGER IF EXISTS {prefix}_insert")
+	cursor.execute(f"DROP TRIGGER IF EXISTS {prefix}_update")
+	cursor.execute(f"DROP TRIGGER IF EXISTS {prefix}_delete")
+	
+	cursor.execute(
+		f"CREATE TRIGGER {prefix}_insert AFTER INSERT ON {table} BEGIN "
+		f"{_stats_delta_sql(terms, [('+', 'NEW')])} END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {prefix}_update AFTER UPDATE OF {', '.join(watched_columns)} ON {table} BEGIN "
+		f"{_stats_delta_sql(terms, [('+', 'NEW'), ('-', 'OLD')])} END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER {prefix}_delete AFTER DELETE ON {table} BEGIN "
+		f"{_stats_delta_sql(terms, [('-', 'OLD')])} END"
+	)
+
+def _migrate_stats_counters(cursor):
+	"""Hisoblagichlar jadvali va ularni shu tranzaksiyaning o'zida yangilaydigan triggerlar.
+	USER_STATS_TERMS/PRODUCT_STATS_TERMS o'zgarsa triggerlarni qayta yaratuvchi yangi migratsiya kerak."""
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        name TEXT PRIMARY KEY,
+        value NUMERIC DEFAULT 0,
+        reconciled_at TIMESTAMP
+    )
+    ''')
+
+	for name in list(USER_STATS_TERMS) + list(PRODUCT_STATS_TERMS):
+		cursor.execute("INSERT OR IGNORE INTO stats_counters (name, value) VALUES (?, 0)", (name,))
+	
+	_create_stats_triggers(cursor, "users", USER_STATS_TERMS,
+	                       ["balance", "is_blocked", "phone_number", "bot_blocked"])
+	_create_stats_triggers(cursor, "products", PRODUCT_STATS_TERMS,
+	                       ["is_active", "sales_count", "total_revenue"])
+
+def _migrate_sale_payment_keys(cursor):
+	"""Bitta to'lov faqat bitta sotuv sifatida yoziladi (tovar.record_sale ON CONFLICT (payment_key)).
+	NULL kalitlar cheklanmaydi - kalitsiz eski sotuvlar o'zgarmaydi."""
+	_add_missing_columns(cursor, "product_sales", [('payment_key', 'TEXT')])
+	cursor.execute(
+		"CREATE UNIQUE INDEX IF NOT EXISTS idx_product_sales_payment_key ON product_sales (payment_key)"
+	)
+
+def _migrate_product_list_order(cursor):
+	"""tovar.get_products_page keyset sahifalari uchun: indeks tartibi PRODUCT_LIST_ORDER bilan bir xil.
+	Kalit ustunlarida NULL bo'lsa taqqoslash qatorni tushirib qoldiradi - eski qatorlar to'ldiriladi."""
+	cursor.execute("UPDATE products SET is_featured = 0 WHERE is_featured IS NULL")
+	cursor.execute("UPDATE products SET sort_order = 0 WHERE sort_order IS NULL")
+	cursor.execute("UPDATE products SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_products_list "
+		"ON products (is_featured DESC, sort_order ASC, created_at DESC, id DESC)"
+	)
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_products_active_list "
+		"ON products (is_active, is_featured DESC, sort_order ASC, created_at DESC, id DESC)"
+	)
+
+def _search_text_sql(expression):
+	"""database.normalize_search_text ning SQL ko'rinishi - trigger indeksga xuddi shu matnni yozadi"""
+	for char in SEARCH_APOSTROPHES:
+		expression = f"REPLACE({expression}, '{char.replace(chr(39), chr(39) * 2)}', '')"
+	return f"COALESCE({expression}, '')"
+
+def _migrate_product_search(cursor):
+	"""products_fts - mahsulot qidiruvi (tovar.search_products, get_all_products(search_query)).
+	unicode61 lotin va kirill harflarini kichik harfga keltiradi, remove_diacritics 2 - diakritikani olib tashlaydi.
+	Jadval o'z nusxasini saqlaydi (content= emas): indeksdagi matn normallashtirilgan va rebuild'ga bog'liq emas."""
+	columns = list(PRODUCT_SEARCH_COLUMNS)
+	column_list = ", ".join(columns)
+	cursor.execute(f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        {column_list},
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''')
+
+	new_values = ", ".join(_search_text_sql(f"NEW.{column}") for column in columns)
+	watched = ", ".join(columns)
+	cursor.execute("DROP TRIGGER IF EXISTS products_fts_insert")
+	cursor.execute("DROP TRIGGER IF EXISTS products_fts_update")
+	cursor.execute("DROP TRIGGER IF EXISTS products_fts_delete")
+	cursor.execute(
+		f"CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN "
+		f"INSERT INTO products_fts (rowid, {column_list}) VALUES (NEW.id, {new_values}); END"
+	)
+	cursor.execute(
+		f"CREATE TRIGGER products_fts_update AFTER UPDATE OF {watched} ON products BEGIN "
+		f"DELETE FROM products_fts WHERE rowid = OLD.id; "
+		f"INSERT INTO products_fts (rowid, {column_list}) VALUES (NEW.id, {new_values}); END"
+	)
+	cursor.execute(
+		"CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN "
+		"DELETE FROM products_fts WHERE rowid = OLD.id; END"
+	)
+	
+	cursor.execute("DELETE FROM products_fts")
+	cursor.execute(
+		f"INSERT INTO products_fts (rowid, {column_list}) "
+		f"SELECT id, {', '.join(_search_text_sql(column) for column in columns)} FROM products"
+	)
+
+def _migrate_scheduled_jobs(cursor):
+	"""scheduler.py - kechiktirilgan vazifalar (invoice muddati va h.k.), qayta ishga tushganda saqlanib qoladi"""
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        job_key TEXT NOT NULL UNIQUE,
+        payload TEXT NOT NULL,
+        run_at REAL NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+	cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_run_at ON scheduled_jobs (run_at)")
+
+def _migrate_transaction_ledger(cursor):
+	"""database.apply_balance_change - payment_id noyob bo'ladi, users.balance = SUM(transactions.amount).
+	Eski takroriy kalitlarga "#id" qo'shiladi; eski farqlar (mutlaq update_balance, admin panelidagi ikkinchi yozuv)
+	bitta opening_balance yozuvi bilan yopiladi, shundan keyin database.reconcile_ledger farq topmasligi kerak."""
+	cursor.execute('''
+    UPDATE transactions SET payment_id = payment_id || '#' || id
+    WHERE payment_id IS NOT NULL
+    AND id NOT IN (SELECT MIN(id) FROM transactions WHERE payment_id IS NOT NULL GROUP BY payment_id)
+    ''')
+	cursor.execute(
+		"CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_payment_id ON transactions (payment_id)"
+	)
+	cursor.execute('''
+    INSERT INTO transactions (user_id, amount, transaction_type, payment_id)
+    SELECT u.id, COALESCE(u.balance, 0) - COALESCE(t.total, 0), 'opening_balance', 'opening_' || u.id
+    FROM users u
+    LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM transactions GROUP BY user_id) t ON t.user_id = u.id
+    WHERE ABS(COALESCE(u.balance, 0) - COALESCE(t.total, 0)) > 0.005
+    ON CONFLICT (payment_id) DO NOTHING
+    ''')
+
+def _migrate_message_outbox(cursor):
+	"""message_outbox.py - Telegram xabarlari navbati (referal bildirishnomalari), tezlik cheklovi va qayta urinish bilan"""
+	cursor.execute('''
+    CREATE TABLE IF NOT EXISTS message_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        parse_mode TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+	cursor.execute(
+		"CREATE INDEX IF NOT EXISTS idx_message_outbox_pending ON message_outbox (status, next_attempt_at)"
+	)
+
+MIGRATIONS = (
+	(1, "baseline", _migrate_baseline),
+	(2, "single_bot_status", _migrate_single_bot_status),
+	(3, "unique_join_requests", _migrate_unique_join_requests),
+	(4, "query_indexes", _migrate_query_indexes),
+	(5, "stats_counters", _migrate_stats_counters),
+	(6, "sale_payment_keys", _migrate_sale_payment_keys),
+	(7, "product_list_order", _migrate_product_list_order),
+	(8, "product_search", _migrate_product_search),
+	(9, "scheduled_jobs", _migrate_scheduled_jobs),
+	(10, "transaction_ledger", _migrate_transaction_ledger),
+	(11, "message_outbox", _migrate_message_outbox),
+)
+
+def get_schema_version(cursor):
+	cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+	return cursor.fetchone()[0]
+
+def run_migrations(path=DB_PATH):
+	"""Qo'llanmagan migratsiyalarni tartib bilan bajarish"""
+	try:
+		conn = open_connection(path)
+	except sqlite3.Error as e:
+		logging.error(f"Ma'lumotlar bazasiga ulanib bo'lmadi: {e}")
+		return False
+	
+	# Tranzaksiyalar qo'lda boshqariladi - DDL ham migratsiya tranzaksiyasi ichida qoladi
+	conn.isolation_level = None
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+		cursor.execute("SELECT version FROM schema_migrations")
+		applied = {row[0] for row in cursor.fetchall()}
+		
+		for version, name, migrate in MIGRATIONS:
+			if version in applied:
+				continue
+			
+			# Bir vaqtda ikkita jarayon ishga tushsa, ikkinchisi qulfdan keyin qayta tekshiradi
+			cursor.execute("BEGIN IMMEDIATE")
+			try:
+				cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+				if not cursor.fetchone():
+					migrate(cursor)
+					cursor.execute(
+						"INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+						(version, name)
+					)
+					logging.info(f"Migratsiya qo'llandi: {version} ({name})")
+				cursor.execute("COMMIT")
+			except sqlite3.Error:
+				cursor.execute("ROLLBACK")
+				raise
+		
+		# Yangi indekslar uchun statistika (faqat kerak bo'lgan jadvallar tahlil qilinadi)
+		cursor.execute("PRAGMA optimize")
+		logging.info(f"Ma'lumotlar bazasi sxemasi versiyasi: {get_schema_version(cursor)}")
+		return True
+	except sqlite3.Error as e:
+		logging.error(f"Migratsiyada xatolik: {e}")
+		return False
+	finally:
+		conn.close()
+
+# Tez-tez bajariladigan so'rovlar - hech biri jadvalni to'liq o'qimasligi kerak.
+# SQL matni ish vaqtidagi konstanta va quruvchilardan olinadi, shuning uchun tekshiruv kod bilan birga o'zgaradi.
+# Birlamchi kalit bo'yicha qidiruvlar (get_user, get_setting, get_product) kiritilmagan.
+def hot_queries():
+	"""[(nomi, sql, params)]. Modullar shu yerda import qilinadi - ular migrations dan keyin yuklanadi"""
+	import database
+	import admin  # noqa: F401 - channels admin orqali import qilinadi
+	import channels
+	import tovar
+	import broadcast
+	import fsm_storage
+	import google_sheets
+	import scheduler
+	import sheets_outbox
+	import message_outbox
+	from outbox import claim_sql
+	
+	queries = [
+		("get_user_by_bot_id", database.USER_BY_BOT_ID_SQL, ("1",)),
+		("get_user_referrals", database.USER_REFERRALS_SQL, (1,)),
+		("get_top_referrers", database.TOP_REFERRERS_SQL, (10,)),
+		("fetch_users_batch", database._users_batch_sql(("id",), ("reachable",)), (0, 1000)),
+		("count_users", database._count_users_sql(("reachable",)), ()),
+		("get_user_transactions", database.USER_TRANSACTIONS_SQL, (1,)),
+		("get_channel_subscribers_count", database.CHANNEL_SUBSCRIBERS_COUNT_SQL, (1,)),
+		("get_user_product_orders", database.USER_PRODUCT_ORDERS_SQL, (1, 10)),
+		("check_join_request_in_db", channels.JOIN_REQUEST_SQL, (1, "1")),
+		("get_top_selling_products", tovar.TOP_SELLING_SQL, (10,)),
+		("get_products_by_category", tovar.PRODUCTS_BY_CATEGORY_SQL, ("Umumiy", 20)),
+		("get_all_categories", tovar.CATEGORIES_SQL, ()),
+		("search_products", tovar.SEARCH_PRODUCTS_SQL, ('"telefon"*', 20)),
+		("get_product_sales_history(product)", *tovar._sales_history_query(product_id="1")),
+		("get_product_sales_history(user)", *tovar._sales_history_query(user_id=1)),
+		("get_product_sales_history", *tovar._sales_history_query()),
+		("resume_broadcasts", broadcast.RUNNING_BROADCASTS_SQL, ()),
+		("load_fsm_record", fsm_storage.FSM_LOAD_SQL, (1, 1, 1, 0, "default", 0)),
+		("claim_sheets_orders", claim_sql("sheets_outbox", sheets_outbox.SHEETS_OUTBOX_COLUMNS), (0, 50)),
+		("claim_outbound_messages", claim_sql("message_outbox", message_outbox.OUTBOX_COLUMNS), (0, 50)),
+		("claim_due_jobs",
+		 claim_sql("scheduled_jobs", scheduler.JOB_COLUMNS, scheduler.JOB_DUE_FILTER, order_by="run_at"), (0, 100)),
+		("get_next_run_at", scheduler.NEXT_RUN_AT_SQL, ()),
+		("get_user_orders", google_sheets._orders_sql(google_sheets.ORDERS_BY_USER), ("1",)),
+		("search_orders_by_phone", google_sheets._orders_sql(google_sheets.ORDERS_BY_PHONE_KEY), ("1", "2")),
+		("get_orders_by_date_range", google_sheets._orders_sql(google_sheets.ORDERS_BY_DATE),
+		 ("2024-01-01", "2024-12-31")),
+	]
+	
+	# Ro'yxat sahifalari: OFFSET va keyset kalitining har bir darajasi ikkala yo'nalishda
+	anchor = (0, 0, "2024-01-01 00:00:00", 1)
+	for view, active_only in (("active", True), ("manage", False)):
+		base_query = tovar._products_list_query(active_only)
+		queries.append((f"get_products_page({view})", tovar._offset_page_sql(base_query), (10, 0)))
+		for depth in range(len(tovar.PRODUCT_LIST_ORDER)):
+			for forward in (True, False):
+				queries.append((
+					f"get_products_page({view}, {'after' if forward else 'before'}, depth {depth})",
+					tovar._keyset_page_sql(base_query, depth, forward),
+					(*anchor[:depth + 1], 10)
+				))
+	return queries
+
+def explain_query_plan(cursor, sql, params=()):
+	cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+	return [row[-1] for row in cursor.fetchall()]
+
+def _is_full_scan(detail, sql):
+	# "SCAN users" - jadval to'liq o'qiladi. "SCAN users USING INDEX ..." faqat LIMIT bilan qabul qilinadi:
+	# indeks tartibida o'qish LIMIT ga yetganda to'xtaydi, aks holda u ham butun indeksni o'qiydi
+	if not detail.startswith("SCAN "):
+		return False
+	# FTS5: "VIRTUAL TABLE INDEX 0:M5" - MATCH indeks orqali, "INDEX 0:" - butun jadval
+	if "VIRTUAL TABLE INDEX" in detail:
+		return ":M" not in detail
+	return "USING" not in detail or "LIMIT" not in sql.upper()
+
+def check_query_plans(path=DB_PATH):
+	"""hot_queries() ichidan jadvalni to'liq o'qiydiganlari: [(nomi, plan qatori), ...]"""
+	conn = open_connection(path)
+	cursor = conn.cursor()
+	
+	try:
+		full_scans = []
+		for name, sql, params in hot_queries():
+			for detail in explain_query_plan(cursor, sql, params):
+				if _is_full_scan(detail, sql):
+					full_scans.append((name, detail))
+		
+		for name, detail in full_scans:
+			logging.warning(f"So'rov jadvalni to'liq o'qiydi: {name}: {detail}")
+		return full_scans
+	finally:
+		conn.close()
+
+if __name__ == "__main__":
+	# python migrations.py [db_path] - sxemani yangilaydi va so'rov rejalarini tekshiradi
+	logging.basicConfig(level=logging.INFO)
+	db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+	if not run_migrations(db_path):
+		sys.exit(1)
+	sys.exit(1 if check_query_plans(db_path) else 0)
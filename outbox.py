@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+
+from database import create_connection
+
+logger = logging.getLogger(__name__)
+
+def retry_delay(attempts, max_backoff):
+	return min(max_backoff, 5 * 2 ** attempts)
+
+DUE_FILTER = "status = 'pending' AND next_attempt_at <= ?"
+
+def claim_sql(table, columns, due_filter=DUE_FILTER, order_by="id"):
+	return f"SELECT id, attempts, {', '.join(columns)} FROM {table} WHERE {due_filter} ORDER BY {order_by} LIMIT ?"
+
+def claim_rows(table, columns, limit, lease, due_filter=DUE_FILTER,
+               lease_column="next_attempt_at", order_by="id", count_attempt=False, now=None):
+	"""
+	Returns [(id, attempts, *columns)]. Due rows are leased by setting lease_column to now + lease,
+	so a second worker process skips them and rows of a crashed worker come back after the lease.
+	"""
+	conn = create_connection()
+	if not conn:
+		return []
+	
+	cursor = conn.cursor()
+	
+	try:
+		now = now or time.time()
+		cursor.execute(claim_sql(table, columns, due_filter, order_by), (now, limit))
+		rows = cursor.fetchall()
+		if rows:
+			attempt_sql = ", attempts = attempts + 1" if count_attempt else ""
+			cursor.executemany(
+				f"UPDATE {table} SET {lease_column} = ?{attempt_sql} WHERE id = ?",
+				[(now + lease, row[0]) for row in rows]
+			)
+		conn.commit()
+		return rows
+	except Exception as e:
+		logger.error(f"Error claiming {table} rows: {e}")
+		return []
+	finally:
+		conn.close()
+
+def finish_rows(table, done_ids, failures=(), max_attempts=1, done_sql=None):
+	"""
+	done_ids are deleted unless done_sql (taking the row id) says otherwise.
+	failures: [(id, attempts, error, retry_after)] - retry_after None, or reaching
+	max_attempts, marks the row failed for good.
+	"""
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.executemany(done_sql or f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in done_ids])
+		
+		# Tables without status/last_error (scheduled_jobs) only ever pass done_ids
+		if failures:
+			now = time.time()
+			updates = []
+			for row_id, attempts, error, retry_after in failures:
+				status = 'failed' if retry_after is None or attempts >= max_attempts else 'pending'
+				updates.append((status, attempts, error[:500], now + (retry_after or 0), row_id))
+			cursor.executemany(
+				f"UPDATE {table} SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+				updates
+			)
+		conn.commit()
+		return True
+	except Exception as e:
+		logger.error(f"Error updating {table} rows: {e}")
+		return False
+	finally:
+		conn.close()
+
+class OutboxWorker:
+	"""
+	One asyncio task per process that calls run_batch(*args) until it returns less than
+	a full batch, then sleeps until wake() or the poll interval. A raising batch backs off.
+	"""
+	
+	def __init__(self, name, run_batch, batch_size, poll_interval, max_backoff=3600, next_timeout=None):
+		self.name = name
+		self.batch_size = batch_size
+		self.poll_interval = poll_interval
+		self.max_backoff = max_backoff
+		self._run_batch = run_batch
+		# Optional async hook returning how long to sleep instead of poll_interval
+		self._next_timeout = next_timeout
+		self._task = None
+		self._wakeup = None
+		self._next_wakeup = 0
+	
+	def start(self, *args):
+		"""Rows left over from before a restart are handled on the first pass"""
+		if self._task is not None and not self._task.done():
+			return self._task
+		
+		self._wakeup = asyncio.Event()
+		self._task = asyncio.create_task(self._run(*args))
+		return self._task
+	
+	def wake(self, due_at=None):
+		"""
+		Called after a write that queued rows - the worker doesn't wait for the next poll.
+		With due_at only a row due before the planned wakeup interrupts the sleep.
+		"""
+		if self._wakeup is None:
+			return
+		if due_at is None or due_at < self._next_wakeup:
+			self._wakeup.set()
+	
+	async def _run(self, *args):
+		failures = 0
+		while True:
+			try:
+				processed = await self._run_batch(*args)
+				failures = 0
+				if processed == self.batch_size:
+					continue
+				timeout = await self._next_timeout() if self._next_timeout else self.poll_interval
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				failures += 1
+				logger.error(f"{self.name} error: {e}")
+				await asyncio.sleep(retry_delay(failures, self.max_backoff))
+				continue
+			
+			self._next_wakeup = time.time() + timeout
+			try:
+				await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+			except asyncio.TimeoutError:
+				pass
+			self._wakeup.clear()
@@ -1,5 +1,4 @@
 import logging
-import asyncio
 from datetime import datetime
 from aiogram import Bot, Router, F
 from aiogram.types import (
@@ -12,11 +11,12 @@ from aiogram.fsm.state import State, StatesGroup
 
 from config import PAYMENT_TOKEN, ADMINS
 from database import (
-	get_user, update_balance, add_transaction, get_wallet,
+	get_user, get_wallet,
 	add_pending_payment, update_payment_status, get_all_payment_methods,
-	get_payment_method, get_all_wallets
+	get_payment_method, get_all_wallets, run_db
 )
 from utils import create_wallet_keyboard
+from scheduler import job_handler, schedule_job, invoice_job_key
 
 router = Router()
 
@@ -113,20 +113,20 @@ async def auto_payment_product_callback(callback: CallbackQuery, state: FSMConte
 	method_id = int(parts[3])
 	product_id = parts[4]
 	
-	method = get_payment_method(method_id)
+	method = await run_db(get_payment_method, method_id)
 	if not method:
 		await callback.answer("⚠️ To'lov usuli topilmadi.")
 		return
 	
 	from tovar import get_product
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -188,14 +188,11 @@ async def auto_payment_product_callback(callback: CallbackQuery, state: FSMConte
 		
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				method_name
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			method_name
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -246,14 +243,14 @@ async def uzcard_payment_product_callback(callback: CallbackQuery, state: FSMCon
 	product_id = callback.data.split("_")[3]
 	
 	from tovar import get_product
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -314,14 +311,11 @@ async def uzcard_payment_product_callback(callback: CallbackQuery, state: FSMCon
 		
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				callback.bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"UzCard"
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"UzCard"
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -339,14 +333,14 @@ async def humo_payment_product_callback(callback: CallbackQuery, state: FSMConte
 	product_id = callback.data.split("_")[3]
 	
 	from tovar import get_product
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -407,14 +401,11 @@ async def humo_payment_product_callback(callback: CallbackQuery, state: FSMConte
 		
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				callback.bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"HumoCard"
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"HumoCard"
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -431,14 +422,14 @@ async def click_payment_product_callback(callback: CallbackQuery, state: FSMCont
 	product_id = callback.data.split("_")[3]
 	
 	from tovar import get_product
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi.")
 		return
 	
-	product_name = product[2]
-	product_price = product[4]
+	product_name = product.name
+	product_price = product.price
 	
 	await state.update_data(
 		product_id=product_id,
@@ -499,14 +490,11 @@ async def click_payment_product_callback(callback: CallbackQuery, state: FSMCont
 		
 		await state.update_data(invoice_message_id=invoice_message.message_id)
 		
-		asyncio.create_task(
-			delete_invoice_after_timeout(
-				callback.bot,
-				callback.message.chat.id,
-				invoice_message.message_id,
-				callback.from_user.id,
-				"CLICK"
-			)
+		await schedule_invoice_timeout(
+			callback.message.chat.id,
+			invoice_message.message_id,
+			callback.from_user.id,
+			"CLICK"
 		)
 	except Exception as e:
 		logging.exception(f"❌ To'lov yuborishda xato: {e}")
@@ -517,9 +505,22 @@ async def click_payment_product_callback(callback: CallbackQuery, state: FSMCont
 	
 	await callback.answer()
 
-async def delete_invoice_after_timeout(bot, chat_id, message_id, user_id, payment_method, timeout=300):
+async def schedule_invoice_timeout(chat_id, message_id, user_id, payment_method, timeout=300):
+	"""The invoice is deleted by the scheduler dispatcher, see scheduler.py"""
+	await schedule_job(
+		"payment_invoice_timeout",
+		invoice_job_key(chat_id, message_id),
+		{"chat_id": chat_id, "message_id": message_id, "user_id": user_id, "payment_method": payment_method},
+		timeout
+	)
+
+@job_handler("payment_invoice_timeout")
+async def delete_invoice_after_timeout(bot, job):
 	"""Delete invoice message after timeout"""
-	await asyncio.sleep(timeout)
+	chat_id = job["chat_id"]
+	message_id = job["message_id"]
+	user_id = job["user_id"]
+	payment_method = job["payment_method"]
 	
 	try:
 		await bot.delete_message(chat_id=chat_id, message_id=message_id)
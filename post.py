@@ -1,5 +1,4 @@
 import logging
-import asyncio
 from aiogram import Router, F
 from aiogram.types import (
 	Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
@@ -11,7 +10,8 @@ from aiogram.fsm.state import State, StatesGroup
 
 # Import ADMINS directly from config.py
 from config import ADMINS
-from database import create_connection
+from database import run_db, run_write, count_users
+from broadcast import create_broadcast_job, start_broadcast
 
 router = Router()
 
@@ -415,87 +415,38 @@ async def send_post_callback(callback: CallbackQuery, state: FSMContext):
 	post_video = state_data.get("post_video")
 	buttons = state_data.get("buttons", [])
 	
-	# Create inline keyboard with user-defined buttons
-	inline_keyboard = []
-	row = []
-	for i, btn in enumerate(buttons):
-		row.append(InlineKeyboardButton(text=btn["text"], url=btn["url"]))
-		
-		# Create a new row after every 2 buttons
-		if (i + 1) % 2 == 0 or i == len(buttons) - 1:
-			inline_keyboard.append(row)
-			row = []
-	
-	markup = InlineKeyboardMarkup(inline_keyboard=inline_keyboard) if inline_keyboard else None
-	
-	# Get all users from database
-	conn = create_connection()
-	if not conn:
-		await callback.answer("⚠️ Ma'lumotlar bazasiga ulanishda xatolik yuz berdi.")
-		return
-	
-	cursor = conn.cursor()
+	file_id = None
+	if post_type == "image":
+		file_id = post_image
+	elif post_type == "video":
+		file_id = post_video
 	
 	try:
-		cursor.execute("SELECT id FROM users")
-		users = cursor.fetchall()
+		total_count = await run_db(count_users, ("reachable",))
 		
 		# Send a new message instead of editing the current one
 		status_message = await callback.message.answer(
 			"📤 Post yuborilmoqda...\n\n"
-			f"Jami foydalanuvchilar: {len(users)} ta"
+			f"Jami foydalanuvchilar: {total_count} ta"
 		)
 		
-		sent_count = 0
-		error_count = 0
-		
-		for user in users:
-			user_id = user[0]
-			try:
-				if post_type == "image" and post_image:
-					await callback.bot.send_photo(
-						chat_id=user_id,
-						photo=post_image,
-						caption=post_text,
-						reply_markup=markup,
-						parse_mode="HTML"
-					)
-				elif post_type == "video" and post_video:
-					await callback.bot.send_video(
-						chat_id=user_id,
-						video=post_video,
-						caption=post_text,
-						reply_markup=markup,
-						parse_mode="HTML"
-					)
-				else:
-					await callback.bot.send_message(
-						chat_id=user_id,
-						text=post_text,
-						reply_markup=markup,
-						parse_mode="HTML"
-					)
-				sent_count += 1
-				
-				# Add delay to avoid flood limits
-				await asyncio.sleep(0.05)
-			except Exception as e:
-				logging.error(f"Error sending post to user {user_id}: {e}")
-				error_count += 1
-		
-		# Update the status message with results
-		await status_message.edit_text(
-			f"✅ Post yuborish yakunlandi!\n\n"
-			f"✅ Yuborildi: {sent_count} ta\n"
-			f"❌ Xatoliklar: {error_count} ta",
-			reply_markup=InlineKeyboardMarkup(
-				inline_keyboard=[
-					[
-						InlineKeyboardButton(text="🔙 Admin paneli", callback_data="back_to_admin")
-					]
-				]
-			)
+		# The job is stored first, so it can be resumed if the bot restarts mid-broadcast
+		job_id = await run_write(
+			create_broadcast_job,
+			callback.from_user.id,
+			post_type,
+			post_text,
+			file_id,
+			buttons,
+			total_count,
+			status_message.chat.id,
+			status_message.message_id
 		)
+		if not job_id:
+			await status_message.edit_text("⚠️ Ma'lumotlar bazasiga ulanishda xatolik yuz berdi.")
+			return
+		
+		start_broadcast(callback.bot, job_id)
 	except Exception as e:
 		logging.exception(f"Error sending post: {e}")
 		# Send a new message with the error
@@ -510,7 +461,6 @@ async def send_post_callback(callback: CallbackQuery, state: FSMContext):
 			)
 		)
 	finally:
-		conn.close()
 		await state.clear()
 	
 	await callback.answer()
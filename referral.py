@@ -10,7 +10,7 @@ from aiogram.fsm.state import State, StatesGroup
 from config import BOT_TOKEN, ADMINS
 from database import (
 	get_user, get_user_referral_count, get_top_referrers,
-	get_setting, update_setting, get_user_referrals
+	get_setting, update_setting, get_user_referrals, run_db, run_write
 )
 
 router = Router()
@@ -31,17 +31,17 @@ REFERRAL_IMAGE_URL = "https://roobotmee.uz/img/hdusafd3sajhjkasd.png"
 @router.message(F.text == REFERRAL_BUTTON)
 async def referral_program_handler(message: Message):
 	user_id = message.from_user.id
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await message.answer("⚠️ Siz ro'yxatdan o'tmagansiz. /start buyrug'ini yuboring.")
 		return
 	
 	bot_id = user[3]
-	referral_count = get_user_referral_count(user_id)
+	referral_count = await run_db(get_user_referral_count, user_id)
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	bot_username = (await message.bot.get_me()).username
 	invite_link = f"https://t.me/{bot_username}?start=ref_{user_id}"
@@ -92,16 +92,16 @@ async def referral_program_handler(message: Message):
 @router.callback_query(F.data == "my_referrals")
 async def my_referrals_callback(callback: CallbackQuery):
 	user_id = callback.from_user.id
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("⚠️ Siz ro'yxatdan o'tmagansiz.")
 		return
 	
-	referral_count = get_user_referral_count(user_id)
-	referrals = get_user_referrals(user_id)
+	referral_count = await run_db(get_user_referral_count, user_id)
+	referrals = await run_db(get_user_referrals, user_id)
 	
-	reward_uzb = float(get_setting("referral_reward_uzb", "100"))
+	reward_uzb = float(await run_db(get_setting, "referral_reward_uzb", "100"))
 	total_earnings = referral_count * reward_uzb
 	
 	message_text = f"👨‍👨‍👦 Mening referallarim\n\n"
@@ -156,7 +156,7 @@ async def my_referrals_callback(callback: CallbackQuery):
 
 @router.callback_query(F.data == "top_referrals")
 async def top_referrals_callback(callback: CallbackQuery):
-	top_referrers = get_top_referrers(10)
+	top_referrers = await run_db(get_top_referrers, 10)
 	
 	if not top_referrers:
 		await callback.message.edit_text(
@@ -220,17 +220,17 @@ async def top_referrals_callback(callback: CallbackQuery):
 @router.callback_query(F.data == "back_to_referral")
 async def back_to_referral_callback(callback: CallbackQuery):
 	user_id = callback.from_user.id
-	user = get_user(user_id)
+	user = await run_db(get_user, user_id)
 	
 	if not user:
 		await callback.answer("⚠️ Siz ro'yxatdan o'tmagansiz.")
 		return
 	
 	bot_id = user[3]
-	referral_count = get_user_referral_count(user_id)
+	referral_count = await run_db(get_user_referral_count, user_id)
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	bot_username = (await callback.bot.get_me()).username
 	invite_link = f"https://t.me/{bot_username}?start=ref_{user_id}"
@@ -294,8 +294,8 @@ async def referral_settings_handler(message: Message):
 	if user_id not in ADMINS:
 		return
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -324,8 +324,8 @@ async def change_referral_reward_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -425,10 +425,10 @@ async def process_new_reward(message: Message, state: FSMContext):
 			await state.clear()
 			return
 		
-		update_setting(reward_type, str(new_reward))
+		await run_write(update_setting, reward_type, str(new_reward))
 		
-		reward_uzb = get_setting("referral_reward_uzb", "100")
-		reward_foreign = get_setting("referral_reward_foreign", "80")
+		reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+		reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 		
 		await state.clear()
 		
@@ -470,8 +470,8 @@ async def cancel_change_reward_callback(callback: CallbackQuery, state: FSMConte
 	
 	await state.clear()
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -501,8 +501,8 @@ async def back_to_referral_settings_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	reward_uzb = get_setting("referral_reward_uzb", "100")
-	reward_foreign = get_setting("referral_reward_foreign", "80")
+	reward_uzb = await run_db(get_setting, "referral_reward_uzb", "100")
+	reward_foreign = await run_db(get_setting, "referral_reward_foreign", "80")
 	
 	inline_keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
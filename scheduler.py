@@ -0,0 +1,198 @@
+import json
+import time
+import asyncio
+import logging
+
+from broadcast import global_bucket
+from database import create_connection, run_db, run_write
+from outbox import OutboxWorker, claim_rows
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_BATCH_SIZE = 100
+SCHEDULER_MAX_SLEEP = 30
+SCHEDULER_CLAIM_LEASE = 120
+SCHEDULER_MAX_ATTEMPTS = 3
+SCHEDULER_CONCURRENCY = 10
+JOB_COLUMNS = ("kind", "job_key", "payload")
+JOB_DUE_FILTER = "run_at <= ?"
+NEXT_RUN_AT_SQL = "SELECT MIN(run_at) FROM scheduled_jobs"
+
+_handlers = {}
+# Handlers share the broadcast Telegram rate limit; at most SCHEDULER_CONCURRENCY run at once
+_job_slots = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+
+def job_handler(kind):
+	"""Registers `async def handler(bot, payload)` for jobs of this kind"""
+	def decorator(handler):
+		_handlers[kind] = handler
+		return handler
+	return decorator
+
+def invoice_job_key(chat_id, message_id):
+	return f"invoice_{chat_id}_{message_id}"
+
+def add_scheduled_job(kind, job_key, payload, run_at):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"""INSERT INTO scheduled_jobs (kind, job_key, payload, run_at) VALUES (?, ?, ?, ?)
+			ON CONFLICT (job_key) DO UPDATE SET
+			kind = excluded.kind, payload = excluded.payload, run_at = excluded.run_at, attempts = 0""",
+			(kind, job_key, json.dumps(payload, ensure_ascii=False), run_at)
+		)
+		conn.commit()
+		return True
+	except Exception as e:
+		logger.error(f"Error scheduling job {job_key}: {e}")
+		return False
+	finally:
+		conn.close()
+
+def delete_scheduled_job(job_key):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute("DELETE FROM scheduled_jobs WHERE job_key = ?", (job_key,))
+		conn.commit()
+		return cursor.rowcount > 0
+	except Exception as e:
+		logger.error(f"Error cancelling job {job_key}: {e}")
+		return False
+	finally:
+		conn.close()
+
+def claim_due_jobs(limit):
+	"""
+	A job whose claim runs out (crashed or failed dispatcher) fires again; attempts counts the claims.
+	The claimed run_at is the claim token - cancel_job() deletes the row and schedule_job() with the
+	same job_key moves run_at, so either one makes the claim stale.
+	"""
+	now = time.time()
+	rows = claim_rows(
+		"scheduled_jobs", JOB_COLUMNS, limit, SCHEDULER_CLAIM_LEASE,
+		due_filter=JOB_DUE_FILTER, lease_column="run_at", order_by="run_at", count_attempt=True, now=now
+	)
+	claimed_until = now + SCHEDULER_CLAIM_LEASE
+	return [(job_id, kind, job_key, json.loads(payload), attempts + 1, claimed_until)
+	        for job_id, attempts, kind, job_key, payload in rows]
+
+def is_job_claimed(job_id, claimed_until):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute("SELECT 1 FROM scheduled_jobs WHERE id = ? AND run_at = ?", (job_id, claimed_until))
+		return cursor.fetchone() is not None
+	except Exception as e:
+		logger.error(f"Error checking scheduled job {job_id}: {e}")
+		return False
+	finally:
+		conn.close()
+
+def delete_jobs(claims):
+	"""claims: [(id, claimed_until)] - a job rescheduled while its handler ran keeps its new row"""
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.executemany("DELETE FROM scheduled_jobs WHERE id = ? AND run_at = ?", claims)
+		conn.commit()
+		return True
+	except Exception as e:
+		logger.error(f"Error deleting scheduled jobs: {e}")
+		return False
+	finally:
+		conn.close()
+
+def get_next_run_at():
+	conn = create_connection()
+	if not conn:
+		return None
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(NEXT_RUN_AT_SQL)
+		return cursor.fetchone()[0]
+	except Exception as e:
+		logger.error(f"Error reading next scheduled job: {e}")
+		return None
+	finally:
+		conn.close()
+
+async def schedule_job(kind, job_key, payload, delay):
+	"""Same job_key replaces the pending job (e.g. an invoice sent twice)"""
+	run_at = time.time() + delay
+	success = await run_write(add_scheduled_job, kind, job_key, payload, run_at)
+	if success:
+		dispatcher.wake(due_at=run_at)
+	return success
+
+async def cancel_job(job_key):
+	return await run_write(delete_scheduled_job, job_key)
+
+async def run_job(bot, job):
+	job_id, kind, job_key, payload, attempts, claimed_until = job
+	handler = _handlers.get(kind)
+	if handler is None:
+		logger.error(f"No handler for scheduled job {job_key} ({kind}), dropping it")
+		return True
+	
+	async with _job_slots:
+		await global_bucket.acquire()
+		# Checked right before the handler - e.g. a paid invoice must not be deleted as timed out
+		if not await run_db(is_job_claimed, job_id, claimed_until):
+			logger.info(f"Scheduled job {job_key} was cancelled or rescheduled, skipping it")
+			return False
+		
+		try:
+			await handler(bot, payload)
+			return True
+		except Exception as e:
+			if attempts >= SCHEDULER_MAX_ATTEMPTS:
+				logger.error(f"Scheduled job {job_key} failed {attempts} times, dropping it: {e}")
+				return True
+			logger.warning(f"Scheduled job {job_key} failed, retrying after the lease: {e}")
+			return False
+
+async def dispatch_due_jobs(bot):
+	jobs = await run_write(claim_due_jobs, SCHEDULER_BATCH_SIZE)
+	if not jobs:
+		return 0
+	
+	results = await asyncio.gather(*(run_job(bot, job) for job in jobs))
+	# Failed jobs keep their row and fire again when the lease runs out
+	done = [(job[0], job[5]) for job, finished in zip(jobs, results) if finished]
+	if done:
+		await run_write(delete_jobs, done)
+	return len(jobs)
+
+async def seconds_until_next_job():
+	"""The dispatcher re-reads the table at least every SCHEDULER_MAX_SLEEP (jobs added by another process)"""
+	next_run_at = await run_db(get_next_run_at)
+	if next_run_at is None:
+		return SCHEDULER_MAX_SLEEP
+	return min(SCHEDULER_MAX_SLEEP, max(0, next_run_at - time.time()))
+
+dispatcher = OutboxWorker(
+	"Scheduler", dispatch_due_jobs, SCHEDULER_BATCH_SIZE, SCHEDULER_MAX_SLEEP, next_timeout=seconds_until_next_job
+)
+
+def start_scheduler(bot):
+	return dispatcher.start(bot)
@@ -0,0 +1,145 @@
+import re
+import json
+import asyncio
+import logging
+
+from google.oauth2.service_account import Credentials
+
+from database import create_connection, get_setting, run_write
+from google_sheets import SheetsClientManager
+from outbox import OutboxWorker, claim_rows, finish_rows, retry_delay
+from tovar import get_google_sheets_credentials, build_order_row, SHEETS_SCOPES, SHEETS_ORDER_HEADERS
+
+logger = logging.getLogger(__name__)
+
+SHEETS_BATCH_SIZE = 50
+SHEETS_POLL_INTERVAL = 30
+SHEETS_CLAIM_LEASE = 120
+SHEETS_MAX_ATTEMPTS = 10
+SHEETS_MAX_BACKOFF = 3600
+SHEETS_SENT_SQL = "UPDATE sheets_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?"
+SHEETS_OUTBOX_COLUMNS = ("order_data",)
+
+sheets_manager = SheetsClientManager(
+	lambda scopes: Credentials.from_service_account_info(get_google_sheets_credentials(), scopes=scopes),
+	scopes=SHEETS_SCOPES
+)
+
+# Worksheet whose headers were checked - only touched from the worker thread
+_sheet_state = {"url": None}
+
+def enqueue_sheets_order(order_data):
+	conn = create_connection()
+	if not conn:
+		return False
+	
+	cursor = conn.cursor()
+	
+	try:
+		cursor.execute(
+			"INSERT INTO sheets_outbox (order_data) VALUES (?)",
+			(json.dumps(order_data, ensure_ascii=False),)
+		)
+		conn.commit()
+		return True
+	except Exception as e:
+		logger.error(f"Error adding order to sheets_outbox: {e}")
+		return False
+	finally:
+		conn.close()
+
+def claim_sheets_orders(limit):
+	rows = claim_rows("sheets_outbox", SHEETS_OUTBOX_COLUMNS, limit, SHEETS_CLAIM_LEASE)
+	return [(order_id, attempts, json.loads(order_data)) for order_id, attempts, order_data in rows]
+
+def finish_sheets_orders(sent_ids, failures):
+	return finish_rows("sheets_outbox", sent_ids, failures, SHEETS_MAX_ATTEMPTS, done_sql=SHEETS_SENT_SQL)
+
+def get_order_worksheet():
+	sheets_url = get_setting("google_sheets_url", "")
+	if not sheets_url:
+		raise RuntimeError("Google Sheets URL not configured")
+	
+	worksheet = sheets_manager.get_worksheet(url=sheets_url)
+	if _sheet_state["url"] == sheets_url:
+		return worksheet
+	
+	headers = worksheet.row_values(1)
+	if not headers or len(headers) < len(SHEETS_ORDER_HEADERS):
+		if headers:
+			worksheet.delete_rows(1)
+		worksheet.insert_row(SHEETS_ORDER_HEADERS, 1)
+		logger.info("Headers updated in Google Sheets")
+	
+	_sheet_state["url"] = sheets_url
+	logger.info(f"Google Sheets worksheet opened: {worksheet.title}")
+	return worksheet
+
+def append_orders_to_sheet(orders):
+	try:
+		worksheet = get_order_worksheet()
+		rows = [build_order_row(order_data, "") for order_id, attempts, order_data in orders]
+		result = worksheet.append_rows(rows, value_input_option="RAW")
+	except Exception:
+		# Reopen the worksheet and re-check the headers on the next attempt
+		sheets_manager.invalidate()
+		_sheet_state["url"] = None
+		raise
+	
+	number_appended_rows(worksheet, result, len(rows))
+
+def number_appended_rows(worksheet, result, count):
+	"""
+	№ is the sheet row minus the header, as before. It is taken from the rows Sheets actually
+	appended to, so concurrent workers or a restart can't hand out the same number twice.
+	"""
+	updated_range = (result or {}).get("updates", {}).get("updatedRange", "")
+	match = re.search(r"(\d+)$", updated_range)
+	if not match:
+		logger.error(f"Appended rows not found in Google Sheets response: {updated_range!r}")
+		return
+	
+	last_row = int(match.group(1))
+	first_row = last_row - count + 1
+	try:
+		worksheet.update(
+			range_name=f"A{first_row}:A{last_row}",
+			values=[[row - 1] for row in range(first_row, last_row + 1)],
+			value_input_option="RAW"
+		)
+	except Exception as e:
+		# The orders are already in the sheet - retrying the batch would append them twice
+		sheets_manager.invalidate()
+		logger.error(f"Failed to number Google Sheets rows {first_row}-{last_row}: {e}")
+
+async def export_sheets_batch():
+	orders = await run_write(claim_sheets_orders, SHEETS_BATCH_SIZE)
+	if not orders:
+		return 0
+	
+	try:
+		await asyncio.to_thread(append_orders_to_sheet, orders)
+	except Exception as e:
+		logger.error(f"Failed to export {len(orders)} orders to Google Sheets: {e}")
+		failures = [
+			(order_id, attempts + 1, str(e), retry_delay(attempts + 1, SHEETS_MAX_BACKOFF))
+			for order_id, attempts, order_data in orders
+		]
+		await run_write(finish_sheets_orders, [], failures)
+		raise
+	
+	await run_write(finish_sheets_orders, [order[0] for order in orders], [])
+	logger.info(f"Exported {len(orders)} orders to Google Sheets")
+	return len(orders)
+
+sheets_worker = OutboxWorker("Sheets worker", export_sheets_batch, SHEETS_BATCH_SIZE, SHEETS_POLL_INTERVAL, SHEETS_MAX_BACKOFF)
+
+def start_sheets_worker():
+	return sheets_worker.start()
+
+async def queue_order_for_sheets(order_data):
+	"""Buyurtmani navbatga qo'yadi - Google Sheets javobini kutmaydi"""
+	success = await run_write(enqueue_sheets_order, order_data)
+	if success:
+		sheets_worker.wake()
+	return success
@@ -0,0 +1,55 @@
+"""apply_balance_change: takroriy payment_id, nolda to'xtash va manfiy boshlang'ich balans"""
+import pytest
+
+import database
+from database import ConnectionPool, apply_balance_change, open_connection
+from migrations import run_migrations
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+	path = str(tmp_path / "bot.db")
+	assert run_migrations(path)
+	
+	# Writer ishlamaydi - create_connection() shu pool'dan oladi
+	pool = ConnectionPool(path, 1)
+	monkeypatch.setattr(database, "_pool", pool)
+	yield path
+	pool.close_all()
+
+def _add_user(path, user_id, balance):
+	conn = open_connection(path)
+	try:
+		conn.execute("INSERT INTO users (id, full_name, bot_id, balance) VALUES (?, 'Test', ?, ?)",
+		             (user_id, str(user_id), balance))
+		conn.commit()
+	finally:
+		conn.close()
+
+def _ledger(path, user_id):
+	conn = open_connection(path)
+	try:
+		return [row[0] for row in conn.execute("SELECT amount FROM transactions WHERE user_id = ?", (user_id,))]
+	finally:
+		conn.close()
+
+def test_replayed_payment_id_is_applied_once(db_path):
+	_add_user(db_path, 1, 100)
+	
+	assert apply_balance_change(1, 50, "deposit", "pay_1") == (True, 150)
+	assert apply_balance_change(1, 50, "deposit", "pay_1") == (False, 150)
+	assert _ledger(db_path, 1) == [50]
+
+def test_debit_is_clamped_at_zero(db_path):
+	_add_user(db_path, 1, 30)
+	
+	assert apply_balance_change(1, -50, "admin_subtract", "sub_1", floor_at_zero=True) == (True, 0)
+	assert _ledger(db_path, 1) == [-30]
+
+def test_debit_from_negative_balance_is_not_a_credit(db_path):
+	_add_user(db_path, 1, -20)
+	
+	assert apply_balance_change(1, -50, "admin_subtract", "sub_1", floor_at_zero=True) == (True, -70)
+	assert _ledger(db_path, 1) == [-50]
+
+def test_unknown_user(db_path):
+	assert apply_balance_change(404, 10, "deposit", "pay_1") == (False, None)
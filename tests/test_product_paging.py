@@ -0,0 +1,65 @@
+"""Keyset sahifalash teng is_featured/sort_order/created_at qiymatlarida qator tashlab ketmasligi va takrorlamasligi kerak"""
+import pytest
+
+pytest.importorskip("aiogram")
+
+import admin  # noqa: F401 - tovar admin orqali import qilinadi
+from database import open_connection
+from migrations import run_migrations
+from tovar import PRODUCT_LIST_ORDER, PRODUCTS_PER_PAGE, _fetch_keyset_page, _list_order_sql, _products_list_query
+
+BASE_QUERY = _products_list_query()
+KEY_COLUMNS = ", ".join(column for column, _ in PRODUCT_LIST_ORDER)
+
+@pytest.fixture(scope="module")
+def cursor(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("db") / "bot.db")
+	assert run_migrations(path)
+	
+	conn = open_connection(path)
+	try:
+		cursor = conn.cursor()
+		# 3 sahifadan ko'p, har bir kalit ustunida ko'p teng qiymatlar
+		cursor.executemany(
+			"INSERT INTO products (product_id, name, description, price, product_type, "
+			"is_featured, sort_order, created_at) VALUES (?, ?, '', 1, 'digital', ?, ?, ?)",
+			[
+				(f"p{i}", f"Tovar {i}", i % 2, i % 3, f"2024-01-0{1 + i // 2 % 2} 00:00:00")
+				for i in range(PRODUCTS_PER_PAGE * 3 + 7)
+			]
+		)
+		conn.commit()
+		yield cursor
+	finally:
+		conn.close()
+
+def _all_ids(cursor):
+	cursor.execute(f"{BASE_QUERY} ORDER BY {_list_order_sql(PRODUCT_LIST_ORDER)}")
+	return [row[0] for row in cursor.fetchall()]
+
+def _anchor(cursor, product_id):
+	cursor.execute(f"SELECT {KEY_COLUMNS} FROM products WHERE id = ?", (product_id,))
+	return cursor.fetchone()
+
+def test_walk_forward(cursor):
+	expected = _all_ids(cursor)
+	seen = expected[:PRODUCTS_PER_PAGE]
+	while len(seen) < len(expected):
+		page = _fetch_keyset_page(cursor, BASE_QUERY, _anchor(cursor, seen[-1]), forward=True)
+		if not page:
+			break
+		seen.extend(item.id for item in page)
+	
+	assert seen == expected
+
+def test_walk_backward(cursor):
+	expected = _all_ids(cursor)
+	seen = expected[-PRODUCTS_PER_PAGE:]
+	while len(seen) < len(expected):
+		page = _fetch_keyset_page(cursor, BASE_QUERY, _anchor(cursor, seen[0]), forward=False)
+		if not page:
+			break
+		assert len(page) <= PRODUCTS_PER_PAGE
+		seen[:0] = [item.id for item in page]
+	
+	assert seen == expected
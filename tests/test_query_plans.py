@@ -0,0 +1,26 @@
+"""hot_queries() dagi so'rovlar migratsiya qilingan bazada jadvalni to'liq o'qimasligi kerak"""
+import pytest
+
+# hot_queries() so'rovlarni ishlatadigan modullarni (aiogram handlerlari bilan) import qiladi
+pytest.importorskip("aiogram")
+
+from database import open_connection
+from migrations import hot_queries, run_migrations, explain_query_plan, _is_full_scan
+
+HOT_QUERIES = hot_queries()
+
+@pytest.fixture(scope="module")
+def cursor(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("db") / "bot.db")
+	assert run_migrations(path)
+	
+	conn = open_connection(path)
+	try:
+		yield conn.cursor()
+	finally:
+		conn.close()
+
+@pytest.mark.parametrize("name, sql, params", HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(cursor, name, sql, params):
+	full_scans = [detail for detail in explain_query_plan(cursor, sql, params) if _is_full_scan(detail, sql)]
+	assert full_scans == [], f"{name}: {full_scans}"
@@ -5,6 +5,8 @@ import time
 import json
 import re
 import math
+import threading
+from collections import namedtuple
 from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import (
@@ -15,10 +17,12 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from config import ADMINS, BOT_TOKEN,  BOT_USERNAME , ORDER_CHANNEL, DEFAULT_PRODUCT_PRICE, PRODUCT_CHANNEL, TASDIQID
-from database import create_connection, get_user, update_balance, add_transaction, get_all_wallets, get_setting, \
-	update_setting, get_wallet, get_all_payment_methods
+from config import ADMINS, BOT_TOKEN,  BOT_USERNAME , ORDER_CHANNEL, DEFAULT_PRODUCT_PRICE, PRODUCT_CHANNEL, TASDIQID, \
+	PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL
+from database import create_connection, get_user, get_all_wallets, get_setting, run_db, run_write, run_after_commit, \
+	update_setting, get_wallet, get_all_payment_methods, get_stats_counters, normalize_search_text, PRODUCT_SEARCH_COLUMNS
 from utils import create_wallet_keyboard
+from cache import TTLCache
 
 import gspread
 from google.oauth2.service_account import Credentials
@@ -34,6 +38,13 @@ router = Router()
 FIXED_PAYMENT_AMOUNT = 50000
 PRODUCTS_PER_PAGE = 10
 
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+SHEETS_ORDER_HEADERS = [
+	"№", "Sana", "Ism", "Telefon", "Manzil", "Tovar", "Kategoriya",
+	"Asosiy Narx", "To'langan", "Qolgan Qarz", "To'lov Usuli",
+	"Username", "User ID", "Miqdor", "Chegirma", "Status", "Izohlar"
+]
+
 def get_google_sheets_credentials():
 	return {
 
@@ -71,152 +82,110 @@ class ProductState(StatesGroup):
 
 payment_data_storage = {}
 
-def create_products_table():
+# YANGI: mahsulot qatorlari nomlangan maydonlar bilan (product.name, product.is_active).
+# Ustunlar aniq sanab o'qiladi - jadvaldagi jismoniy tartib (ALTER bilan qo'shilganlar) ahamiyatsiz
+PRODUCT_FIELDS = (
+	'id', 'product_id', 'name', 'description', 'price', 'uzum_link', 'image_file_id', 'video_file_id',
+	'product_type', 'is_active', 'created_by', 'created_at', 'sales_count', 'total_revenue', 'last_sold',
+	'category', 'tags', 'discount_percent', 'stock_quantity', 'min_order_quantity', 'max_order_quantity',
+	'weight', 'dimensions', 'warranty_months', 'brand', 'model', 'color', 'material', 'origin_country',
+	'is_featured', 'sort_order', 'seo_title', 'seo_description', 'seo_keywords'
+)
+PRODUCT_COLUMNS = ', '.join(PRODUCT_FIELDS)
+
+Product = namedtuple('Product', PRODUCT_FIELDS)
+
+# product_id -> Product. Har bir o'zgarish katalog versiyasini oshiradi: o'zgarishdan oldin
+# boshlangan o'qish eski qatorni keshga yoza olmaydi
+product_cache = TTLCache(PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL, name="products")
+_catalog_state = {"version": 0}
+_catalog_lock = threading.Lock()
+
+# YANGI: ro'yxat sahifalari - faqat ro'yxat uchun kerakli ustunlar
+PRODUCT_LIST_FIELDS = ('id', 'product_id', 'name', 'is_active')
+PRODUCT_LIST_COLUMNS = ', '.join(PRODUCT_LIST_FIELDS)
+
+ProductListItem = namedtuple('ProductListItem', PRODUCT_LIST_FIELDS)
+
+# Ro'yxat tartibi (keyset kaliti). id bir xil created_at li qatorlarni ajratadi.
+# migrations: idx_products_list / idx_products_active_list aynan shu tartibda
+PRODUCT_LIST_ORDER = (('is_featured', 'DESC'), ('sort_order', 'ASC'), ('created_at', 'DESC'), ('id', 'DESC'))
+
+# YANGI: qidiruv products_fts indeksi orqali (migrations: product_search)
+SEARCH_MAX_TERMS = 8
+_search_term_pattern = re.compile(r"\w+")
+
+# bm25 manfiy - kichigi mosroq. Sotuvlar uni 2 martagacha kuchaytiradi, lekin mosligi past tovarni oldinga chiqarmaydi
+SEARCH_RANK_SQL = (
+	f"bm25(products_fts, {', '.join(str(weight) for weight in PRODUCT_SEARCH_COLUMNS.values())}) "
+	"* (1.0 + COALESCE(p.sales_count, 0) / (COALESCE(p.sales_count, 0) + 100.0))"
+)
+
+SEARCH_PRODUCTS_SQL = f'''
+            SELECT {", ".join(f"p.{field}" for field in PRODUCT_FIELDS)} FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ? AND p.is_active = 1
+            ORDER BY {SEARCH_RANK_SQL}
+            LIMIT ?
+        '''
+
+def search_terms(query, limit=SEARCH_MAX_TERMS):
+	"""Matndagi so'zlar: kichik harf, tutuq belgilarisiz (inline_catalog ham shundan foydalanadi)"""
+	return _search_term_pattern.findall(normalize_search_text(query).lower())[:limit]
+
+def build_search_match(query):
+	"""Foydalanuvchi matni -> FTS5 MATCH: har bir so'z prefiks bo'yicha, barchasi AND bilan.
+	So'zlar qo'shtirnoqda - OR, NEAR, * kabi FTS5 operatorlari foydalanuvchidan o'tmaydi"""
+	return " ".join(f'"{term}"*' for term in search_terms(query))
+
+# (ko'rinish, sahifa, kursor) -> (text, markup); joriy katalog versiyasi uchungina saqlanadi
+product_page_cache = TTLCache(256, PRODUCT_CACHE_TTL, name="product_pages")
+
+def get_catalog_version():
+	return _catalog_state["version"]
+
+def invalidate_product(product_id=None):
+	"""
+	product_id=None - butun katalog keshini tozalash. Writer ichida batch COMMIT'idan keyin
+	bajariladi - aks holda oraliqda o'qilgan eski qator yangi versiya bilan keshlanib qoladi.
+	"""
+	run_after_commit(lambda: _drop_cached_product(product_id))
+
+def _drop_cached_product(product_id):
+	with _catalog_lock:
+		_catalog_state["version"] += 1
+	# Sahifalar butun katalogga bog'liq - har qanday o'zgarishda tozalanadi
+	product_page_cache.clear()
+	if product_id is None:
+		product_cache.clear()
+	else:
+		product_cache.pop(product_id)
+
+TOP_SELLING_SQL = f'''
+            SELECT {PRODUCT_COLUMNS} FROM products
+            WHERE is_active = 1
+            ORDER BY sales_count DESC, total_revenue DESC
+            LIMIT ?
+        '''
+
+def preload_product_cache():
+	"""Ishga tushganda faol mahsulotlarni keshga yuklash"""
 	conn = create_connection()
 	if not conn:
-		logger.error("Database connection failed in create_products_table")
-		return False
+		return 0
 	
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                price REAL NOT NULL,
-                uzum_link TEXT,
-                image_file_id TEXT,
-                video_file_id TEXT,
-                product_type TEXT NOT NULL,
-                is_active INTEGER DEFAULT 1,
-                created_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sales_count INTEGER DEFAULT 0,
-                total_revenue REAL DEFAULT 0,
-                last_sold TIMESTAMP,
-                category TEXT DEFAULT 'Umumiy',
-                tags TEXT,
-                discount_percent REAL DEFAULT 0,
-                stock_quantity INTEGER DEFAULT -1,
-                min_order_quantity INTEGER DEFAULT 1,
-                max_order_quantity INTEGER DEFAULT -1,
-                weight REAL DEFAULT 0,
-                dimensions TEXT,
-                warranty_months INTEGER DEFAULT 0,
-                brand TEXT,
-                model TEXT,
-                color TEXT,
-                material TEXT,
-                origin_country TEXT DEFAULT 'Uzbekistan',
-                is_featured INTEGER DEFAULT 0,
-                sort_order INTEGER DEFAULT 0,
-                seo_title TEXT,
-                seo_description TEXT,
-                seo_keywords TEXT
-            )
-        ''')
-		
-		new_columns = [
-			('uzum_link', 'TEXT'),
-			('last_sold', 'TIMESTAMP'),
-			('category', 'TEXT DEFAULT "Umumiy"'),
-			('tags', 'TEXT'),
-			('discount_percent', 'REAL DEFAULT 0'),
-			('stock_quantity', 'INTEGER DEFAULT -1'),
-			('min_order_quantity', 'INTEGER DEFAULT 1'),
-			('max_order_quantity', 'INTEGER DEFAULT -1'),
-			('weight', 'REAL DEFAULT 0'),
-			('dimensions', 'TEXT'),
-			('warranty_months', 'INTEGER DEFAULT 0'),
-			('brand', 'TEXT'),
-			('model', 'TEXT'),
-			('color', 'TEXT'),
-			('material', 'TEXT'),
-			('origin_country', 'TEXT DEFAULT "Uzbekistan"'),
-			('is_featured', 'INTEGER DEFAULT 0'),
-			('sort_order', 'INTEGER DEFAULT 0'),
-			('seo_title', 'TEXT'),
-			('seo_description', 'TEXT'),
-			('seo_keywords', 'TEXT')
-		]
-		
-		for column_name, column_type in new_columns:
-			try:
-				cursor.execute(f'ALTER TABLE products ADD COLUMN {column_name} {column_type}')
-			except Exception:
-				pass
-		
-		cursor.execute('''
-            CREATE TABLE IF NOT EXISTS product_sales (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                product_price REAL NOT NULL DEFAULT 0,
-                paid_amount REAL NOT NULL DEFAULT 0,
-                remaining_amount REAL NOT NULL DEFAULT 0,
-                payment_method TEXT NOT NULL,
-                sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                customer_name TEXT,
-                customer_phone TEXT,
-                customer_location TEXT,
-                status TEXT DEFAULT 'completed',
-                admin_notes TEXT,
-                quantity INTEGER DEFAULT 1,
-                unit_price REAL DEFAULT 0,
-                discount_amount REAL DEFAULT 0,
-                tax_amount REAL DEFAULT 0,
-                shipping_cost REAL DEFAULT 0,
-                tracking_number TEXT,
-                delivery_date TIMESTAMP,
-                delivery_status TEXT DEFAULT 'pending',
-                rating INTEGER DEFAULT 0,
-                review TEXT,
-                refund_amount REAL DEFAULT 0,
-                refund_reason TEXT,
-                refund_date TIMESTAMP,
-                FOREIGN KEY (product_id) REFERENCES products (product_id),
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-		
-		sales_columns = [
-			('product_price', 'REAL DEFAULT 0'),
-			('paid_amount', 'REAL DEFAULT 0'),
-			('remaining_amount', 'REAL DEFAULT 0'),
-			('status', 'TEXT DEFAULT "completed"'),
-			('admin_notes', 'TEXT'),
-			('quantity', 'INTEGER DEFAULT 1'),
-			('unit_price', 'REAL DEFAULT 0'),
-			('discount_amount', 'REAL DEFAULT 0'),
-			('tax_amount', 'REAL DEFAULT 0'),
-			('shipping_cost', 'REAL DEFAULT 0'),
-			('tracking_number', 'TEXT'),
-			('delivery_date', 'TIMESTAMP'),
-			('delivery_status', 'TEXT DEFAULT "pending"'),
-			('rating', 'INTEGER DEFAULT 0'),
-			('review', 'TEXT'),
-			('refund_amount', 'REAL DEFAULT 0'),
-			('refund_reason', 'TEXT'),
-			('refund_date', 'TIMESTAMP')
-		]
-		
-		for column_name, column_type in sales_columns:
-			try:
-				cursor.execute(f'ALTER TABLE product_sales ADD COLUMN {column_name} {column_type}')
-			except Exception:
-				pass
-		
-		conn.commit()
-		logger.info("Products tables created successfully with all enhancements")
-		return True
-	
+		cursor.execute(TOP_SELLING_SQL, (PRODUCT_CACHE_SIZE,))
+		products = [Product(*row) for row in cursor.fetchall()]
+		for product in products:
+			product_cache.set(product.product_id, product)
+		logger.info(f"Product cache preloaded: {len(products)} products")
+		return len(products)
 	except Exception as e:
-		logger.error(f"Error creating products tables: {e}")
-		conn.rollback()
-		return False
+		logger.error(f"Error preloading product cache: {e}")
+		return 0
 	finally:
 		conn.close()
 
@@ -263,6 +232,7 @@ def add_product(product_id, name, description, price, uzum_link, image_file_id,
         ''', all_values)
 		
 		conn.commit()
+		invalidate_product(product_id)
 		logger.info(f"Product added successfully: {product_id}")
 		return True
 	except Exception as e:
@@ -272,6 +242,11 @@ def add_product(product_id, name, description, price, uzum_link, image_file_id,
 		conn.close()
 
 def get_product(product_id):
+	product = product_cache.get(product_id)
+	if product is not None:
+		return product
+	
+	version = get_catalog_version()
 	conn = create_connection()
 	if not conn:
 		return None
@@ -279,8 +254,14 @@ def get_product(product_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
-		product = cursor.fetchone()
+		cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE product_id = ?", (product_id,))
+		row = cursor.fetchone()
+		if not row:
+			return None
+		
+		product = Product(*row)
+		if version == get_catalog_version():
+			product_cache.set(product_id, product)
 		return product
 	except Exception as e:
 		logger.error(f"Error getting product: {e}")
@@ -297,13 +278,15 @@ def get_all_products(search_query=None, status_filter=None, sort_by="created_at"
 	cursor = conn.cursor()
 	
 	try:
-		query = "SELECT * FROM products WHERE 1=1"
+		query = f"SELECT {PRODUCT_COLUMNS} FROM products WHERE 1=1"
 		params = []
 		
 		if search_query:
-			query += " AND (name LIKE ? OR description LIKE ? OR tags LIKE ? OR brand LIKE ?)"
-			search_param = f"%{search_query}%"
-			params.extend([search_param, search_param, search_param, search_param])
+			match = build_search_match(search_query)
+			if not match:
+				return []
+			query += " AND id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)"
+			params.append(match)
 		
 		if status_filter is not None:
 			query += " AND is_active = ?"
@@ -324,7 +307,7 @@ def get_all_products(search_query=None, status_filter=None, sort_by="created_at"
 				query += f" OFFSET {offset}"
 		
 		cursor.execute(query, params)
-		products = cursor.fetchall()
+		products = [Product(*row) for row in cursor.fetchall()]
 		return products
 	except Exception as e:
 		logger.error(f"Error getting products: {e}")
@@ -332,6 +315,93 @@ def get_all_products(search_query=None, status_filter=None, sort_by="created_at"
 	finally:
 		conn.close()
 
+def _list_order_sql(order, forward=True):
+	return ", ".join(
+		f"{column} {direction if forward else ('ASC' if direction == 'DESC' else 'DESC')}"
+		for column, direction in order
+	)
+
+def _products_list_query(active_only=False):
+	query = f"SELECT {PRODUCT_LIST_COLUMNS} FROM products WHERE 1=1"
+	if active_only:
+		query += " AND is_active = 1"
+	return query
+
+def _offset_page_sql(base_query):
+	return f"{base_query} ORDER BY {_list_order_sql(PRODUCT_LIST_ORDER)} LIMIT ? OFFSET ?"
+
+def _keyset_page_sql(base_query, depth, forward=True):
+	"""Kalitning depth-darajasi: oldingi ustunlar anchor ga teng, depth-ustun undan keyin (forward) yoki oldin"""
+	column, direction = PRODUCT_LIST_ORDER[depth]
+	conditions = [f"{equal_column} = ?" for equal_column, _ in PRODUCT_LIST_ORDER[:depth]]
+	conditions.append(f"{column} {'<' if (direction == 'DESC') == forward else '>'} ?")
+	return (
+		f"{base_query} AND {' AND '.join(conditions)} "
+		f"ORDER BY {_list_order_sql(PRODUCT_LIST_ORDER[depth:], forward)} LIMIT ?"
+	)
+
+def _fetch_keyset_page(cursor, base_query, anchor, forward=True):
+	"""anchor - kursor qatorining PRODUCT_LIST_ORDER qiymatlari.
+	Aralash yo'nalishli tartib bitta taqqoslash bilan ifodalanmaydi, shuning uchun kalit darajalarga
+	bo'linadi: avval oxirgi ustun bo'yicha (qolganlari teng), keyin undan oldingisi va h.k.
+	Har bir daraja indeksda bitta diapazon - sahifa chuqurligidan qat'i nazar LIMIT qatorgina o'qiladi."""
+	products = []
+	for depth in range(len(PRODUCT_LIST_ORDER) - 1, -1, -1):
+		cursor.execute(
+			_keyset_page_sql(base_query, depth, forward),
+			(*anchor[:depth + 1], PRODUCTS_PER_PAGE - len(products))
+		)
+		products.extend(ProductListItem(*row) for row in cursor.fetchall())
+		if len(products) >= PRODUCTS_PER_PAGE:
+			break
+	
+	if not forward:
+		products.reverse()
+	return products
+
+def get_products_page(active_only=False, page=1, after_id=None, before_id=None):
+	"""Bitta sahifa va jami soni: ([ProductListItem], total).
+	after_id / before_id - keyingi / oldingi sahifa uchun kursor (joriy sahifaning chekka qatori id si).
+	Kursorsiz (1-sahifa, eski tugmalar yoki kursor qatori o'chirilgan) - OFFSET bilan."""
+	conn = create_connection()
+	if not conn:
+		return [], 0
+	
+	cursor = conn.cursor()
+	
+	try:
+		base_query = _products_list_query(active_only)
+		
+		anchor = None
+		cursor_id = after_id or before_id
+		if cursor_id and page > 1:
+			key_columns = ", ".join(column for column, _ in PRODUCT_LIST_ORDER)
+			cursor.execute(f"SELECT {key_columns} FROM products WHERE id = ?", (cursor_id,))
+			anchor = cursor.fetchone()
+		
+		if anchor:
+			products = _fetch_keyset_page(cursor, base_query, anchor, forward=after_id is not None)
+		else:
+			cursor.execute(
+				_offset_page_sql(base_query),
+				(PRODUCTS_PER_PAGE, (max(page, 1) - 1) * PRODUCTS_PER_PAGE)
+			)
+			products = [ProductListItem(*row) for row in cursor.fetchall()]
+		
+		# Jami son trigger hisoblagichidan - COUNT(*) butun jadvalni o'qimaydi
+		cursor.execute(
+			"SELECT value FROM stats_counters WHERE name = ?",
+			("products_active" if active_only else "products_total",)
+		)
+		row = cursor.fetchone()
+		total = int(row[0]) if row else 0
+		return products, total
+	except Exception as e:
+		logger.error(f"Error getting products page: {e}")
+		return [], 0
+	finally:
+		conn.close()
+
 def update_product_status(product_id, is_active):
 	conn = create_connection()
 	if not conn:
@@ -342,6 +412,7 @@ def update_product_status(product_id, is_active):
 	try:
 		cursor.execute("UPDATE products SET is_active = ? WHERE product_id = ?", (is_active, product_id))
 		conn.commit()
+		invalidate_product(product_id)
 		return True
 	except Exception as e:
 		logger.error(f"Error updating product status: {e}")
@@ -379,6 +450,7 @@ def update_product_info(product_id, **kwargs):
 			params.append(product_id)
 			cursor.execute(query, params)
 			conn.commit()
+			invalidate_product(product_id)
 			logger.info(f"Product updated successfully: {product_id}")
 			return True
 		
@@ -401,6 +473,7 @@ def delete_product_permanently(product_id):
 		cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
 		
 		conn.commit()
+		invalidate_product(product_id)
 		logger.info(f"Product deleted permanently: {product_id}")
 		return True
 	except Exception as e:
@@ -417,14 +490,15 @@ def duplicate_product(product_id):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
-		original = cursor.fetchone()
+		cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE product_id = ?", (product_id,))
+		row = cursor.fetchone()
 		
-		if not original:
+		if not row:
 			return None
 		
+		original = Product(*row)
 		new_product_id = str(uuid.uuid4())[:8]
-		new_name = f"{original[2]} (nusxa)"
+		new_name = f"{original.name} (nusxa)"
 		
 		cursor.execute('''
             INSERT INTO products (
@@ -436,15 +510,17 @@ def duplicate_product(product_id):
                 sort_order, seo_title, seo_description, seo_keywords
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-			new_product_id, new_name, original[3], original[4], original[5],
-			original[6], original[7], original[8], original[10], original[15],
-			original[16], original[17], original[18], original[19], original[20],
-			original[21], original[22], original[23], original[24], original[25],
-			original[26], original[27], original[28], 0, original[30],
-			original[31], original[32], original[33]
+			new_product_id, new_name, original.description, original.price, original.uzum_link,
+			original.image_file_id, original.video_file_id, original.product_type, original.created_by,
+			original.category, original.tags, original.discount_percent, original.stock_quantity,
+			original.min_order_quantity, original.max_order_quantity, original.weight, original.dimensions,
+			original.warranty_months, original.brand, original.model, original.color, original.material,
+			original.origin_country, 0, original.sort_order,
+			original.seo_title, original.seo_description, original.seo_keywords
 		))
 		
 		conn.commit()
+		invalidate_product(new_product_id)
 		logger.info(f"Product duplicated: {product_id} -> {new_product_id}")
 		return new_product_id
 	except Exception as e:
@@ -453,8 +529,33 @@ def duplicate_product(product_id):
 	finally:
 		conn.close()
 
+# Sotuv bitta tranzaksiyada yoziladi; SQL matni o'zgarmas - pool ulanishlarida tayyorlangan holda keshlanadi.
+# payment_key (telegram_payment_charge_id yoki tasdiqlash xabari) unikal - takroriy to'lov ikkinchi marta sanalmaydi
+SALE_INSERT_SQL = '''
+            INSERT INTO product_sales (
+                product_id, user_id, product_price, paid_amount, remaining_amount,
+                payment_method, customer_name, customer_phone, customer_location,
+                status, quantity, unit_price, payment_key
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'completed', ?, ?, ?)
+            ON CONFLICT (payment_key) DO NOTHING
+        '''
+
+SALE_PRODUCT_UPDATE_SQL = '''
+            UPDATE products
+            SET sales_count = sales_count + ?,
+                total_revenue = total_revenue + ?,
+                last_sold = CURRENT_TIMESTAMP,
+                stock_quantity = CASE
+                    WHEN stock_quantity > 0 THEN MAX(stock_quantity - ?, 0)
+                    ELSE stock_quantity
+                END
+            WHERE product_id = ?
+        '''
+
 def record_sale(product_id, user_id, product_price, payment_method, customer_name=None, customer_phone=None,
-                customer_location=None, **kwargs):
+                customer_location=None, payment_key=None, **kwargs):
+	"""Yangi sotuv yozilsa True; xato yoki shu payment_key bilan oldin yozilgan bo'lsa False"""
 	conn = create_connection()
 	if not conn:
 		logger.error("Database connection failed in record_sale")
@@ -468,54 +569,21 @@ def record_sale(product_id, user_id, product_price, payment_method, customer_nam
 		quantity = kwargs.get('quantity', 1)
 		unit_price = product_price / quantity if quantity > 0 else product_price
 		
-		cursor.execute("PRAGMA table_info(product_sales)")
-		columns = [column[1] for column in cursor.fetchall()]
-		logger.info(f"Product_sales table columns: {columns}")
-		
-		required_columns = [
-			('status', 'TEXT DEFAULT "completed"'),
-			('product_price', 'REAL DEFAULT 0'),
-			('paid_amount', 'REAL DEFAULT 0'),
-			('remaining_amount', 'REAL DEFAULT 0'),
-			('quantity', 'INTEGER DEFAULT 1'),
-			('unit_price', 'REAL DEFAULT 0')
-		]
-		
-		for column_name, column_type in required_columns:
-			if column_name not in columns:
-				logger.info(f"Adding {column_name} column to product_sales table")
-				cursor.execute(f'ALTER TABLE product_sales ADD COLUMN {column_name} {column_type}')
-				conn.commit()
-		
-		cursor.execute('''
-            INSERT INTO product_sales (
-                product_id, user_id, product_price, paid_amount, remaining_amount,
-                payment_method, customer_name, customer_phone, customer_location,
-                status, quantity, unit_price
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (product_id, user_id, product_price, paid_amount, remaining_amount,
-		      payment_method, customer_name, customer_phone, customer_location,
-		      'completed', quantity, unit_price))
+		cursor.execute(SALE_INSERT_SQL, (
+			product_id, user_id, product_price, paid_amount, remaining_amount,
+			payment_method, customer_name, customer_phone, customer_location,
+			quantity, unit_price, payment_key
+		))
 		
-		cursor.execute('''
-            UPDATE products
-            SET sales_count = sales_count + ?,
-                total_revenue = total_revenue + ?,
-                last_sold = CURRENT_TIMESTAMP
-            WHERE product_id = ?
-        ''', (quantity, paid_amount, product_id))
+		if cursor.rowcount == 0:
+			conn.rollback()
+			logger.warning(f"Duplicate sale ignored: payment_key={payment_key}, product_id={product_id}")
+			return False
 		
-		cursor.execute('''
-            UPDATE products
-            SET stock_quantity = CASE
-                WHEN stock_quantity > 0 THEN stock_quantity - ?
-                ELSE stock_quantity
-            END
-            WHERE product_id = ? AND stock_quantity > 0
-        ''', (quantity, product_id))
+		cursor.execute(SALE_PRODUCT_UPDATE_SQL, (quantity, paid_amount, quantity, product_id))
 		
 		conn.commit()
+		invalidate_product(product_id)
 		logger.info(f"Sale recorded successfully: product_id={product_id}, user_id={user_id}, amount={paid_amount}")
 		return True
 	
@@ -527,38 +595,37 @@ def record_sale(product_id, user_id, product_price, payment_method, customer_nam
 		conn.close()
 
 def get_product_statistics():
-	conn = create_connection()
-	if not conn:
+	# Counters are kept up to date by triggers on products (see migrations._migrate_stats_counters)
+	counters = get_stats_counters()
+	if not counters:
 		return {}
 	
-	cursor = conn.cursor()
+	return {
+		'total_products': counters.get('products_total', 0),
+		'active_products': counters.get('products_active', 0),
+		'inactive_products': counters.get('products_inactive', 0),
+		'total_sales': counters.get('sales_total', 0),
+		'total_revenue': counters.get('revenue_total', 0)
+	}
+
+def _sales_history_query(product_id=None, user_id=None, limit=50):
+	query = "SELECT * FROM product_sales WHERE 1=1"
+	params = []
 	
-	try:
-		stats = {}
-		
-		cursor.execute("SELECT COUNT(*) FROM products")
-		stats['total_products'] = cursor.fetchone()[0]
-		
-		cursor.execute("SELECT COUNT(*) FROM products WHERE is_active = 1")
-		stats['active_products'] = cursor.fetchone()[0]
-		
-		cursor.execute("SELECT COUNT(*) FROM products WHERE is_active = 0")
-		stats['inactive_products'] = cursor.fetchone()[0]
-		
-		cursor.execute("SELECT SUM(sales_count) FROM products")
-		result = cursor.fetchone()[0]
-		stats['total_sales'] = result if result else 0
-		
-		cursor.execute("SELECT SUM(total_revenue) FROM products")
-		result = cursor.fetchone()[0]
-		stats['total_revenue'] = result if result else 0
-		
-		return stats
-	except Exception as e:
-		logger.error(f"Error getting product statistics: {e}")
-		return {}
-	finally:
-		conn.close()
+	if product_id:
+		query += " AND product_id = ?"
+		params.append(product_id)
+	
+	if user_id:
+		query += " AND user_id = ?"
+		params.append(user_id)
+	
+	query += " ORDER BY sale_date DESC"
+	
+	if limit:
+		query += f" LIMIT {limit}"
+	
+	return query, params
 
 def get_product_sales_history(product_id=None, user_id=None, limit=50):
 	conn = create_connection()
@@ -568,23 +635,7 @@ def get_product_sales_history(product_id=None, user_id=None, limit=50):
 	cursor = conn.cursor()
 	
 	try:
-		query = "SELECT * FROM product_sales WHERE 1=1"
-		params = []
-		
-		if product_id:
-			query += " AND product_id = ?"
-			params.append(product_id)
-		
-		if user_id:
-			query += " AND user_id = ?"
-			params.append(user_id)
-		
-		query += " ORDER BY sale_date DESC"
-		
-		if limit:
-			query += f" LIMIT {limit}"
-		
-		cursor.execute(query, params)
+		cursor.execute(*_sales_history_query(product_id, user_id, limit))
 		sales = cursor.fetchall()
 		return sales
 	except Exception as e:
@@ -601,13 +652,8 @@ def get_top_selling_products(limit=10):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-            SELECT * FROM products
-            WHERE is_active = 1
-            ORDER BY sales_count DESC, total_revenue DESC
-            LIMIT ?
-        ''', (limit,))
-		products = cursor.fetchall()
+		cursor.execute(TOP_SELLING_SQL, (limit,))
+		products = [Product(*row) for row in cursor.fetchall()]
 		return products
 	except Exception as e:
 		logger.error(f"Error getting top selling products: {e}")
@@ -623,22 +669,12 @@ def search_products(query, limit=20):
 	cursor = conn.cursor()
 	
 	try:
-		search_query = f"%{query}%"
-		cursor.execute('''
-            SELECT * FROM products
-            WHERE is_active = 1 AND (
-                name LIKE ? OR
-                description LIKE ? OR
-                tags LIKE ? OR
-                brand LIKE ? OR
-                category LIKE ?
-            )
-            ORDER BY
-                CASE WHEN name LIKE ? THEN 1 ELSE 2 END,
-                sales_count DESC
-            LIMIT ?
-        ''', (search_query, search_query, search_query, search_query, search_query, search_query, limit))
-		products = cursor.fetchall()
+		match = build_search_match(query)
+		if not match:
+			return []
+		
+		cursor.execute(SEARCH_PRODUCTS_SQL, (match, limit))
+		products = [Product(*row) for row in cursor.fetchall()]
 		return products
 	except Exception as e:
 		logger.error(f"Error searching products: {e}")
@@ -646,6 +682,13 @@ def search_products(query, limit=20):
 	finally:
 		conn.close()
 
+PRODUCTS_BY_CATEGORY_SQL = f'''
+            SELECT {PRODUCT_COLUMNS} FROM products
+            WHERE is_active = 1 AND category = ?
+            ORDER BY is_featured DESC, sales_count DESC
+            LIMIT ?
+        '''
+
 def get_products_by_category(category, limit=20):
 	conn = create_connection()
 	if not conn:
@@ -654,13 +697,8 @@ def get_products_by_category(category, limit=20):
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-            SELECT * FROM products
-            WHERE is_active = 1 AND category = ?
-            ORDER BY is_featured DESC, sales_count DESC
-            LIMIT ?
-        ''', (category, limit))
-		products = cursor.fetchall()
+		cursor.execute(PRODUCTS_BY_CATEGORY_SQL, (category, limit))
+		products = [Product(*row) for row in cursor.fetchall()]
 		return products
 	except Exception as e:
 		logger.error(f"Error getting products by category: {e}")
@@ -668,6 +706,14 @@ def get_products_by_category(category, limit=20):
 	finally:
 		conn.close()
 
+CATEGORIES_SQL = '''
+            SELECT DISTINCT category, COUNT(*) as count
+            FROM products
+            WHERE is_active = 1
+            GROUP BY category
+            ORDER BY count DESC
+        '''
+
 def get_all_categories():
 	conn = create_connection()
 	if not conn:
@@ -676,13 +722,7 @@ def get_all_categories():
 	cursor = conn.cursor()
 	
 	try:
-		cursor.execute('''
-            SELECT DISTINCT category, COUNT(*) as count
-            FROM products
-            WHERE is_active = 1
-            GROUP BY category
-            ORDER BY count DESC
-        ''')
+		cursor.execute(CATEGORIES_SQL)
 		categories = cursor.fetchall()
 		return categories
 	except Exception as e:
@@ -704,6 +744,28 @@ def test_google_sheets_connection():
 		logger.error(f"Google Sheets connection test failed: {e}")
 		return False, str(e)
 
+def build_order_row(order_data, number):
+	"""Buyurtma ma'lumotlaridan Google Sheets qatorini yasash"""
+	return [
+		number,
+		order_data.get('sana', ''),
+		order_data.get('mijoz_ismi', ''),
+		order_data.get('telefon', ''),
+		order_data.get('manzil', ''),
+		order_data.get('tovar', ''),
+		order_data.get('kategoriya', 'Umumiy'),
+		order_data.get('asosiy_narx', ''),
+		order_data.get('tolangan_summa', ''),
+		order_data.get('qolgan_qarz', ''),
+		order_data.get('tolov_usuli', ''),
+		order_data.get('username', ''),
+		order_data.get('user_id', ''),
+		order_data.get('miqdor', '1'),
+		order_data.get('chegirma', '0'),
+		order_data.get('status', 'Completed'),
+		order_data.get('izohlar', '')
+	]
+
 def save_order_to_google_sheets(order_data, max_retries=3):
 	for attempt in range(max_retries):
 		try:
@@ -714,7 +776,7 @@ def save_order_to_google_sheets(order_data, max_retries=3):
 			
 			creds = Credentials.from_service_account_info(
 				get_google_sheets_credentials(),
-				scopes=['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+				scopes=SHEETS_SCOPES
 			)
 			
 			gc = gspread.authorize(creds)
@@ -732,11 +794,7 @@ def save_order_to_google_sheets(order_data, max_retries=3):
 			worksheet = spreadsheet.sheet1
 			logger.info(f"Successfully accessed worksheet: {worksheet.title}")
 			
-			expected_headers = [
-				"№", "Sana", "Ism", "Telefon", "Manzil", "Tovar", "Kategoriya",
-				"Asosiy Narx", "To'langan", "Qolgan Qarz", "To'lov Usuli",
-				"Username", "User ID", "Miqdor", "Chegirma", "Status", "Izohlar"
-			]
+			expected_headers = SHEETS_ORDER_HEADERS
 			
 			try:
 				headers = worksheet.row_values(1)
@@ -756,25 +814,7 @@ def save_order_to_google_sheets(order_data, max_retries=3):
 			except:
 				next_number = 1
 			
-			row_data = [
-				next_number,
-				order_data.get('sana', ''),
-				order_data.get('mijoz_ismi', ''),
-				order_data.get('telefon', ''),
-				order_data.get('manzil', ''),
-				order_data.get('tovar', ''),
-				order_data.get('kategoriya', 'Umumiy'),
-				order_data.get('asosiy_narx', ''),
-				order_data.get('tolangan_summa', ''),
-				order_data.get('qolgan_qarz', ''),
-				order_data.get('tolov_usuli', ''),
-				order_data.get('username', ''),
-				order_data.get('user_id', ''),
-				order_data.get('miqdor', '1'),
-				order_data.get('chegirma', '0'),
-				order_data.get('status', 'Completed'),
-				order_data.get('izohlar', '')
-			]
+			row_data = build_order_row(order_data, next_number)
 			
 			worksheet.append_row(row_data)
 			logger.info(f"Successfully added order data to Google Sheets: {order_data.get('user_id', 'Unknown')}")
@@ -790,12 +830,10 @@ def save_order_to_google_sheets(order_data, max_retries=3):
 	
 	return False
 
-create_products_table()
-
 async def show_product_with_payment_buttons(callback_or_message, product_id, is_callback=False):
 	try:
-		product = get_product(product_id)
-		if not product or not product[9]:
+		product = await run_db(get_product, product_id)
+		if not product or not product.is_active:
 			error_msg = "❌ Bu tovar mavjud emas yoki faol emas."
 			if is_callback:
 				await callback_or_message.answer(error_msg)
@@ -803,22 +841,22 @@ async def show_product_with_payment_buttons(callback_or_message, product_id, is_
 				await callback_or_message.answer(error_msg)
 			return
 		
-		name = product[2]
-		description = product[3]
-		original_price = product[4]
-		uzum_link = product[5]
-		image_file_id = product[6]
-		video_file_id = product[7]
-		product_type = product[8]
-		category = product[15] if len(product) > 15 and product[15] else 'Umumiy'
-		brand = product[23] if len(product) > 23 and product[23] else None
-		warranty_months = product[22] if len(product) > 22 and product[22] is not None else 0
+		name = product.name
+		description = product.description
+		original_price = product.price
+		uzum_link = product.uzum_link
+		image_file_id = product.image_file_id
+		video_file_id = product.video_file_id
+		product_type = product.product_type
+		category = product.category or 'Umumiy'
+		brand = product.brand or None
+		warranty_months = product.warranty_months or 0
 		
 		logger.info(f"Creating payment buttons for product {product_id}: {name}")
 		
 		try:
-			wallets = get_all_wallets()
-			payment_methods = get_all_payment_methods()
+			wallets = await run_db(get_all_wallets)
+			payment_methods = await run_db(get_all_payment_methods)
 			
 			logger.info(f"Database query results:")
 			logger.info(f"- Wallets: {len(wallets) if wallets else 0}")
@@ -998,97 +1036,220 @@ async def show_product_with_payment_buttons(callback_or_message, product_id, is_
 		else:
 			await callback_or_message.answer(error_msg)
 
-async def show_all_products(message_or_callback, page=1, is_callback=False):
-	try:
-		products = get_all_products(status_filter=1, sort_by="is_featured", sort_order="DESC")
-		total_products = len(products)
-		
-		if total_products == 0:
-			text = (
-				"📋 <b>TOVARLAR BOSHQARUVI</b>\n"
-				"---------------------------------------------\n\n"
-				"❌ Hozircha faol tovarlar mavjud emas.\n\n"
-				"🔄 Tez orada yangi tovarlar qo'shiladi!"
-			)
-			
-			keyboard = InlineKeyboardMarkup(
-				inline_keyboard=[
-					[InlineKeyboardButton(text="🔙 Bosh menyu", callback_data="back_to_main")]
-				]
-			)
-			
-			if is_callback:
-				await message_or_callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
-			else:
-				await message_or_callback.answer(text, reply_markup=keyboard, parse_mode="HTML")
-			return
-		
-		start_index = (page - 1) * PRODUCTS_PER_PAGE
-		end_index = start_index + PRODUCTS_PER_PAGE
-		page_products = products[start_index:end_index]
-		
-		total_pages = math.ceil(total_products / PRODUCTS_PER_PAGE)
-		
-		text = "📋 <b>TOVARLAR BOSHQARUVI</b>\n"
-		text += "---------------------------------------------\n\n"
-		
-		for i, product in enumerate(page_products, start=start_index + 1):
-			name = product[2]
-			text += f"{i}. {name}\n"
-		
-		text += f"\n📄 Sahifa: {page}/{total_pages}\n"
-		text += f"📊 Jami: {total_products} ta tovar\n\n"
-		text += "---------------------------------------------\n\n"
-		text += "👇 Bu bo'lim orqali siz tovarlarni boshqara olmaysiz shunchaki ularni korishinigz va yangi tovar qoshishinigz mumkin \n📦Tovarlarni boshqarish uchun Tovarlar royxati bolimiga oting  "
-		
-		inline_keyboard = []
-		
-		number_buttons = []
-		for i, product in enumerate(page_products, start=1):
-			product_id = product[1]
-			number_buttons.append(
-				InlineKeyboardButton(
-					text=str(i),
-					callback_data=f"show_product_{product_id}"
-				)
-			)
-		
-		for i in range(0, len(number_buttons), 5):
-			row = number_buttons[i:i + 5]
-			inline_keyboard.append(row)
-		
-		nav_buttons = []
-		if page > 1:
-			nav_buttons.append(
-				InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"products_page_{page - 1}")
-			)
-		
-		if total_pages > 1:
-			nav_buttons.append(
-				InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="current_page")
-			)
+def _render_all_products_page(page_products, total_products, page):
+	if total_products == 0:
+		text = (
+			"📋 <b>TOVARLAR BOSHQARUVI</b>\n"
+			"---------------------------------------------\n\n"
+			"❌ Hozircha faol tovarlar mavjud emas.\n\n"
+			"🔄 Tez orada yangi tovarlar qo'shiladi!"
+		)
 		
-		if page < total_pages:
-			nav_buttons.append(
-				InlineKeyboardButton(text="➡️ Keyingi", callback_data=f"products_page_{page + 1}")
+		keyboard = InlineKeyboardMarkup(
+			inline_keyboard=[
+				[InlineKeyboardButton(text="🔙 Bosh menyu", callback_data="back_to_main")]
+			]
+		)
+		return text, keyboard
+	
+	start_index = (page - 1) * PRODUCTS_PER_PAGE
+	total_pages = math.ceil(total_products / PRODUCTS_PER_PAGE)
+	
+	text = "📋 <b>TOVARLAR BOSHQARUVI</b>\n"
+	text += "---------------------------------------------\n\n"
+	
+	for i, product in enumerate(page_products, start=start_index + 1):
+		name = product.name
+		text += f"{i}. {name}\n"
+	
+	text += f"\n📄 Sahifa: {page}/{total_pages}\n"
+	text += f"📊 Jami: {total_products} ta tovar\n\n"
+	text += "---------------------------------------------\n\n"
+	text += "👇 Bu bo'lim orqali siz tovarlarni boshqara olmaysiz shunchaki ularni korishinigz va yangi tovar qoshishinigz mumkin \n📦Tovarlarni boshqarish uchun Tovarlar royxati bolimiga oting  "
+	
+	inline_keyboard = []
+	
+	number_buttons = []
+	for i, product in enumerate(page_products, start=1):
+		product_id = product.product_id
+		number_buttons.append(
+			InlineKeyboardButton(
+				text=str(i),
+				callback_data=f"show_product_{product_id}"
 			)
+		)
+	
+	for i in range(0, len(number_buttons), 5):
+		row = number_buttons[i:i + 5]
+		inline_keyboard.append(row)
+	
+	# Kursor: oldingi/keyingi sahifa shu sahifaning chekka qatoridan boshlab o'qiladi
+	nav_buttons = []
+	if page > 1 and page_products:
+		nav_buttons.append(
+			InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"products_page_{page - 1}_b{page_products[0].id}")
+		)
+	
+	if total_pages > 1:
+		nav_buttons.append(
+			InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="current_page")
+		)
+	
+	if page < total_pages and page_products:
+		nav_buttons.append(
+			InlineKeyboardButton(text="➡️ Keyingi", callback_data=f"products_page_{page + 1}_a{page_products[-1].id}")
+		)
+	
+	if nav_buttons:
+		inline_keyboard.append(nav_buttons)
+	
+	extra_buttons = [
+		[
+			InlineKeyboardButton(text="➕ Tovar qo'shish", callback_data="add_product"),
+			InlineKeyboardButton(text="🔄 Yangilash", callback_data="show_all_products")
+		],
+		[
+			InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
+		]
+	]
+	
+	inline_keyboard.extend(extra_buttons)
+	
+	return text, InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+def _render_manage_products_page(page_products, total_products, page):
+	if total_products == 0:
+		text = (
+			"📋 <b>TOVARLARNI BOSHQARISH</b>\n"
+			"---------------------------------------------\n\n"
+			"❌ Hozircha tovarlar mavjud emas.\n\n"
+			"➕ Yangi tovar qo'shish uchun tugmani bosing."
+		)
 		
-		if nav_buttons:
-			inline_keyboard.append(nav_buttons)
-		
-		extra_buttons = [
-			[
-				InlineKeyboardButton(text="➕ Tovar qo'shish", callback_data="add_product"),
-				InlineKeyboardButton(text="🔄 Yangilash", callback_data="show_all_products")
-			],
-			[
-				InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
+		keyboard = InlineKeyboardMarkup(
+			inline_keyboard=[
+				[
+					InlineKeyboardButton(text="➕ Tovar qo'shish", callback_data="add_product")
+				],
+				[
+					InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
+				]
 			]
+		)
+		return text, keyboard
+	
+	start_index = (page - 1) * PRODUCTS_PER_PAGE
+	total_pages = math.ceil(total_products / PRODUCTS_PER_PAGE)
+	
+	text = "📋 <b>TOVARLARNI BOSHQARISH</b>\n"
+	text += "---------------------------------------------\n\n"
+	
+	for i, product in enumerate(page_products, start=start_index + 1):
+		status_icon = "✅" if product.is_active else "❌"
+		text += f"{i}. {status_icon} {product.name}\n"
+		text += f"---------------------------------------------\n"
+	
+	text += f"📄 Sahifa: {page}/{total_pages}\n"
+	text += f"📊 Jami: {total_products} ta tovar\n\n"
+	text += f"---------------------------------------------\n"
+	text += "👇 Tovarni tanlash uchun raqamini bosing:"
+	
+	inline_keyboard = []
+	
+	# Sahifadagi tovarlar uchun raqamli tugmalar
+	number_buttons = []
+	for i, product in enumerate(page_products, start=start_index + 1):
+		product_id = product.product_id
+		number_buttons.append(
+			InlineKeyboardButton(
+				text=str(i),
+				callback_data=f"manage_product_{product_id}"
+			)
+		)
+	
+	# Raqamli tugmalarni 5 tadan qatorga joylashtirish
+	for i in range(0, len(number_buttons), 5):
+		row = number_buttons[i:i + 5]
+		inline_keyboard.append(row)
+	
+	# Navigatsiya tugmalari (kursor - sahifaning chekka qatori id si)
+	nav_buttons = []
+	if page > 1 and page_products:
+		nav_buttons.append(
+			InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"manage_page_{page - 1}_b{page_products[0].id}")
+		)
+	
+	if total_pages > 1:
+		nav_buttons.append(
+			InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="current_manage_page")
+		)
+	
+	if page < total_pages and page_products:
+		nav_buttons.append(
+			InlineKeyboardButton(text="➡️ Keyingi", callback_data=f"manage_page_{page + 1}_a{page_products[-1].id}")
+		)
+	
+	if nav_buttons:
+		inline_keyboard.append(nav_buttons)
+	
+	# Qo'shimcha tugmalar
+	extra_buttons = [
+		[
+			InlineKeyboardButton(text="➕ Yangi qo'shish", callback_data="add_product"),
+			InlineKeyboardButton(text="🔄 Yangilash", callback_data="manage_products")
+		],
+		[
+			InlineKeyboardButton(text="📊 Statistika", callback_data="product_statistics"),
+			InlineKeyboardButton(text="🔍 Qidirish", callback_data="admin_search_products")
+		],
+		[
+			InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
 		]
-		
-		inline_keyboard.extend(extra_buttons)
-		
-		markup = InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+	]
+	
+	inline_keyboard.extend(extra_buttons)
+	
+	return text, InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+PRODUCT_PAGE_VIEWS = {
+	"all": (True, _render_all_products_page),
+	"manage": (False, _render_manage_products_page),
+}
+
+def get_products_page_view(view, page=1, after_id=None, before_id=None):
+	"""Tayyor sahifa (text, markup). O'qish paytida katalog o'zgargan bo'lsa natija keshlanmaydi"""
+	active_only, render = PRODUCT_PAGE_VIEWS[view]
+	version = get_catalog_version()
+	key = (view, page, after_id, before_id)
+	cached = product_page_cache.get(key)
+	if cached is not None:
+		return cached
+	
+	page_products, total_products = get_products_page(active_only, page, after_id, before_id)
+	if page > 1 and (not page_products or page > math.ceil(total_products / PRODUCTS_PER_PAGE)):
+		# Eski tugma: tovarlar o'chirilgan va sahifa endi mavjud emas
+		return get_products_page_view(view)
+	
+	result = render(page_products, total_products, page)
+	if version == get_catalog_version():
+		product_page_cache.set(key, result)
+	return result
+
+def parse_page_callback(data):
+	"""products_page_3_a120 -> (3, 120, None); eski products_page_3 -> (3, None, None)"""
+	parts = data.split("_")
+	page = int(parts[2])
+	after_id = before_id = None
+	if len(parts) > 3 and parts[3][1:].isdigit():
+		if parts[3][0] == "a":
+			after_id = int(parts[3][1:])
+		elif parts[3][0] == "b":
+			before_id = int(parts[3][1:])
+	return page, after_id, before_id
+
+async def show_all_products(message_or_callback, page=1, is_callback=False, after_id=None, before_id=None):
+	try:
+		text, markup = await run_db(get_products_page_view, "all", page, after_id, before_id)
 		
 		if is_callback:
 			await message_or_callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
@@ -1107,115 +1268,10 @@ async def show_all_products(message_or_callback, page=1, is_callback=False):
 		else:
 			await message_or_callback.answer(error_text, parse_mode="HTML")
 
-async def show_manage_products(callback: CallbackQuery, page=1):
+async def show_manage_products(callback: CallbackQuery, page=1, after_id=None, before_id=None):
 	"""Tovarlarni boshqarish (adminlar uchun)"""
 	try:
-		products = get_all_products(sort_by="created_at", sort_order="DESC")
-		total_products = len(products)
-		
-		if total_products == 0:
-			text = (
-				"📋 <b>TOVARLARNI BOSHQARISH</b>\n"
-				"---------------------------------------------\n\n"
-				"❌ Hozircha tovarlar mavjud emas.\n\n"
-				"➕ Yangi tovar qo'shish uchun tugmani bosing."
-			)
-			
-			keyboard = InlineKeyboardMarkup(
-				inline_keyboard=[
-					[
-						InlineKeyboardButton(text="➕ Tovar qo'shish", callback_data="add_product")
-					],
-					[
-						InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
-					]
-				]
-			)
-			
-			await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
-			return
-		
-		start_index = (page - 1) * PRODUCTS_PER_PAGE
-		end_index = start_index + PRODUCTS_PER_PAGE
-		page_products = products[start_index:end_index]
-		
-		total_pages = math.ceil(total_products / PRODUCTS_PER_PAGE)
-		
-		text = "📋 <b>TOVARLARNI BOSHQARISH</b>\n"
-		text += "---------------------------------------------\n\n"
-		
-		for i, product in enumerate(page_products, start=start_index + 1):
-			name = product[2]
-			price = product[4]
-			is_active = product[9]
-			sales_count = product[12]
-			
-			status_icon = "✅" if is_active else "❌"
-			text += f"{i}. {status_icon} {name}\n"
-			text += f"---------------------------------------------\n"
-		
-		text += f"📄 Sahifa: {page}/{total_pages}\n"
-		text += f"📊 Jami: {total_products} ta tovar\n\n"
-		text += f"---------------------------------------------\n"
-		text += "👇 Tovarni tanlash uchun raqamini bosing:"
-		
-		inline_keyboard = []
-		
-		# Sahifadagi tovarlar uchun raqamli tugmalar
-		number_buttons = []
-		for i, product in enumerate(page_products, start=start_index + 1):
-			product_id = product[1]
-			number_buttons.append(
-				InlineKeyboardButton(
-					text=str(i),
-					callback_data=f"manage_product_{product_id}"
-				)
-			)
-		
-		# Raqamli tugmalarni 5 tadan qatorga joylashtirish
-		for i in range(0, len(number_buttons), 5):
-			row = number_buttons[i:i + 5]
-			inline_keyboard.append(row)
-		
-		# Navigatsiya tugmalari
-		nav_buttons = []
-		if page > 1:
-			nav_buttons.append(
-				InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"manage_page_{page - 1}")
-			)
-		
-		if total_pages > 1:
-			nav_buttons.append(
-				InlineKeyboardButton(text=f"📄 {page}/{total_pages}", callback_data="current_manage_page")
-			)
-		
-		if page < total_pages:
-			nav_buttons.append(
-				InlineKeyboardButton(text="➡️ Keyingi", callback_data=f"manage_page_{page + 1}")
-			)
-		
-		if nav_buttons:
-			inline_keyboard.append(nav_buttons)
-		
-		# Qo'shimcha tugmalar
-		extra_buttons = [
-			[
-				InlineKeyboardButton(text="➕ Yangi qo'shish", callback_data="add_product"),
-				InlineKeyboardButton(text="🔄 Yangilash", callback_data="manage_products")
-			],
-			[
-				InlineKeyboardButton(text="📊 Statistika", callback_data="product_statistics"),
-				InlineKeyboardButton(text="🔍 Qidirish", callback_data="admin_search_products")
-			],
-			[
-				InlineKeyboardButton(text="🔙 Admin panel", callback_data="back_to_admin_panel")
-			]
-		]
-		
-		inline_keyboard.extend(extra_buttons)
-		
-		markup = InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
-		
+		text, markup = await run_db(get_products_page_view, "manage", page, after_id, before_id)
 		await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
 	
 	except Exception as e:
@@ -1225,21 +1281,21 @@ async def show_manage_products(callback: CallbackQuery, page=1):
 async def show_product_management(callback: CallbackQuery, product_id: str):
 	"""Tovar boshqaruvi menyusi"""
 	try:
-		product = get_product(product_id)
+		product = await run_db(get_product, product_id)
 		if not product:
 			await callback.answer("❌ Tovar topilmadi")
 			return
 		
-		name = product[2]
-		description = product[3]
-		price = product[4]
-		uzum_link = product[5] if len(product) > 5 else None
-		is_active = product[9]
-		sales_count = product[12]
-		total_revenue = product[13]
-		category = product[15] if len(product) > 15 else 'Umumiy'
-		brand = product[23] if len(product) > 23 else None
-		warranty_months = product[22] if len(product) > 22 else 0
+		name = product.name
+		description = product.description
+		price = product.price
+		uzum_link = product.uzum_link
+		is_active = product.is_active
+		sales_count = product.sales_count
+		total_revenue = product.total_revenue
+		category = product.category
+		brand = product.brand
+		warranty_months = product.warranty_months
 		
 		status_text = "✅ Faol" if is_active else "❌ Nofaol"
 		
@@ -1304,12 +1360,12 @@ async def referral_link_callback(callback: CallbackQuery):
 	"""Taklif havolasini ko'rsatish"""
 	product_id = callback.data.split("_")[2]
 	
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
 		return
 	
-	product_name = product[2]
+	product_name = product.name
 	bot_username = get_bot_username()
 	referral_link = f"https://t.me/{bot_username}?start=product_{product_id}"
 	
@@ -1357,12 +1413,12 @@ async def copy_link_callback(callback: CallbackQuery):
 	
 async def show_product_edit_menu(callback: CallbackQuery, product_id: str):
 	try:
-		product = get_product(product_id)
+		product = await run_db(get_product, product_id)
 		if not product:
 			await callback.answer("❌ Tovar topilmadi")
 			return
 		
-		name = product[2]
+		name = product.name
 		
 		text = f"✏️ <b>TOVAR TAHRIRLASH</b>\n"
 		text += f"---------------------------------------------\n\n"
@@ -1406,9 +1462,9 @@ async def show_product_edit_menu(callback: CallbackQuery, product_id: str):
 
 async def show_product_statistics_detailed(callback: CallbackQuery):
 	try:
-		stats = get_product_statistics()
-		top_products = get_top_selling_products(5)
-		categories = get_all_categories()
+		stats = await run_db(get_product_statistics)
+		top_products = await run_db(get_top_selling_products, 5)
+		categories = await run_db(get_all_categories)
 		
 		text = "📊 <b>TOVARLAR STATISTIKASI</b>\n"
 		text += "---------------------------------------------\n\n"
@@ -1444,7 +1500,7 @@ async def show_product_statistics_detailed(callback: CallbackQuery):
 
 async def show_google_sheets_settings(callback: CallbackQuery):
 	try:
-		current_url = get_setting("google_sheets_url", "")
+		current_url = await run_db(get_setting, "google_sheets_url", "")
 		connection_status, email = test_google_sheets_connection()
 		
 		text = "⚙️ <b>GOOGLE SHEETS SOZLAMALARI</b>\n"
@@ -1486,66 +1542,62 @@ async def show_google_sheets_settings(callback: CallbackQuery):
 		logger.error(f"Error showing Google Sheets settings: {e}")
 		await callback.answer("❌ Xatolik yuz berdi")
 
+def build_product_post(product, bot_username):
+	"""Kanal posti va inline natija matni: (text, markup) - "SOTIB OLISH" tugmasi botga deep link"""
+	category = product.category or 'Umumiy'
+	brand = product.brand or None
+	warranty_months = product.warranty_months or 0
+	original_price = product.price
+	
+	channel_text = f"🛍 <b>{product.name}</b>\n\n"
+	channel_text += f"{product.description}\n\n"
+	
+	if category and category != 'Umumiy':
+		channel_text += f"📂 <b>Kategoriya:</b> {category}\n"
+	
+	if brand:
+		channel_text += f"🏷 <b>Brend:</b> {brand}\n"
+	
+	if warranty_months and warranty_months > 0:
+		channel_text += f"🛡 <b>Kafolat:</b> {warranty_months} oy\n"
+	
+	channel_text += f"\n💰 <b>Narx:</b> {original_price:,} UZS\n"
+	channel_text += f"💳 <b>Tolashingiz kerak </b> {FIXED_PAYMENT_AMOUNT:,}  UZS \n\n"
+	
+	remaining_debt = original_price - FIXED_PAYMENT_AMOUNT
+	if remaining_debt > 0:
+		channel_text += f"🎁 <b>Yetkazilgach:</b> {abs(remaining_debt):,} UZS\n"
+	else:
+		channel_text += "✅ <b>To'liq to'lov</b>\n"
+	
+	inline_keyboard = []
+	
+	inline_keyboard.append([
+		InlineKeyboardButton(
+			text="🛒 SOTIB OLISH",
+			url=f"https://t.me/{bot_username}?start=product_{product.product_id}"
+		)
+	])
+	
+	return channel_text, InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
 async def send_product_to_channel(bot, product_id):
 	try:
 		if not PRODUCT_CHANNEL:
 			logger.warning("PRODUCT_CHANNEL not configured")
 			return False
 		
-		product = get_product(product_id)
+		product = await run_db(get_product, product_id)
 		if not product:
 			logger.error(f"Product not found: {product_id}")
 			return False
 		
-		name = product[2]
-		description = product[3]
-		original_price = product[4]
-		uzum_link = product[5]
-		image_file_id = product[6]
-		video_file_id = product[7]
-		product_type = product[8]
-		category = product[15] if len(product) > 15 and product[15] else 'Umumiy'
-		brand = product[23] if len(product) > 23 and product[23] else None
-		warranty_months = product[22] if len(product) > 22 and product[22] is not None else 0
+		image_file_id = product.image_file_id
+		video_file_id = product.video_file_id
+		product_type = product.product_type
 		
 		bot_info = await bot.get_me()
-		bot_username = bot_info.username
-		
-		channel_text = f"🛍 <b>{name}</b>\n\n"
-		channel_text += f"{description}\n\n"
-		
-		if category and category != 'Umumiy':
-			channel_text += f"📂 <b>Kategoriya:</b> {category}\n"
-		
-		if brand:
-			channel_text += f"🏷 <b>Brend:</b> {brand}\n"
-		
-		if warranty_months and warranty_months > 0:
-			channel_text += f"🛡 <b>Kafolat:</b> {warranty_months} oy\n"
-		
-		channel_text += f"\n💰 <b>Narx:</b> {original_price:,} UZS\n"
-		channel_text += f"💳 <b>Tolashingiz kerak </b> {FIXED_PAYMENT_AMOUNT:,}  UZS \n\n"
-		
-		remaining_debt = original_price - FIXED_PAYMENT_AMOUNT
-		if remaining_debt > 0:
-			channel_text += f"🎁 <b>Yetkazilgach:</b> {abs(remaining_debt):,} UZS\n"
-		else:
-			channel_text += "✅ <b>To'liq to'lov</b>\n"
-		
-		
-		inline_keyboard = []
-		
-		inline_keyboard.append([
-			InlineKeyboardButton(
-				text="🛒 SOTIB OLISH",
-				url=f"https://t.me/{bot_username}?start=product_{product_id}"
-			)
-		])
-		
-
-		
-		
-		markup = InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+		channel_text, markup = build_product_post(product, bot_info.username)
 		
 		if product_type == "image" and image_file_id:
 			await bot.send_photo(
@@ -1585,7 +1637,7 @@ async def tovar_admin_panel(message: Message):
 		return
 	
 	try:
-		stats = get_product_statistics()
+		stats = await run_db(get_product_statistics)
 		
 		text = "🛍 <b>TOVAR BOSHQARUV PANELI</b>\n"
 		text += "---------------------------------------------\n\n"
@@ -1628,8 +1680,8 @@ async def show_all_products_callback(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("products_page_"))
 async def products_page_callback(callback: CallbackQuery):
-	page = int(callback.data.split("_")[2])
-	await show_all_products(callback, page=page, is_callback=True)
+	page, after_id, before_id = parse_page_callback(callback.data)
+	await show_all_products(callback, page=page, is_callback=True, after_id=after_id, before_id=before_id)
 	await callback.answer()
 
 @router.callback_query(F.data.startswith("show_product_"))
@@ -1645,8 +1697,8 @@ async def manage_products_callback(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("manage_page_"))
 async def manage_page_callback(callback: CallbackQuery):
-	page = int(callback.data.split("_")[2])
-	await show_manage_products(callback, page=page)
+	page, after_id, before_id = parse_page_callback(callback.data)
+	await show_manage_products(callback, page=page, after_id=after_id, before_id=before_id)
 	await callback.answer()
 
 @router.callback_query(F.data.startswith("manage_product_"))
@@ -1674,7 +1726,7 @@ async def edit_name_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -1683,7 +1735,7 @@ async def edit_name_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="name")
 	await state.set_state(ProductState.waiting_for_edit_name)
 	
-	current_name = product[2]
+	current_name = product.name
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1716,7 +1768,7 @@ async def edit_name_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, name=new_name)
+	success = await run_write(update_product_info, product_id, name=new_name)
 	
 	if success:
 		await message.answer(f"✅ Tovar nomi yangilandi: {new_name}")
@@ -1741,7 +1793,7 @@ async def edit_description_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -1750,7 +1802,7 @@ async def edit_description_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="description")
 	await state.set_state(ProductState.waiting_for_edit_description)
 	
-	current_description = product[3]
+	current_description = product.description
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1783,7 +1835,7 @@ async def edit_description_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, description=new_description)
+	success = await run_write(update_product_info, product_id, description=new_description)
 	
 	if success:
 		await message.answer("✅ Tovar tavsifi yangilandi")
@@ -1808,7 +1860,7 @@ async def edit_price_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -1817,7 +1869,7 @@ async def edit_price_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="price")
 	await state.set_state(ProductState.waiting_for_edit_price)
 	
-	current_price = product[4]
+	current_price = product.price
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1853,7 +1905,7 @@ async def edit_price_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, price=new_price)
+	success = await run_write(update_product_info, product_id, price=new_price)
 	
 	if success:
 		await message.answer(f"✅ Tovar narxi yangilandi: {new_price:,.0f} UZS")
@@ -1878,7 +1930,7 @@ async def edit_category_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -1887,7 +1939,7 @@ async def edit_category_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="category")
 	await state.set_state(ProductState.waiting_for_edit_category)
 	
-	current_category = product[15] if len(product) > 15 else 'Umumiy'
+	current_category = product.category
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1920,7 +1972,7 @@ async def edit_category_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, category=new_category)
+	success = await run_write(update_product_info, product_id, category=new_category)
 	
 	if success:
 		await message.answer(f"✅ Tovar kategoriyasi yangilandi: {new_category}")
@@ -1945,7 +1997,7 @@ async def edit_brand_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -1954,7 +2006,7 @@ async def edit_brand_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="brand")
 	await state.set_state(ProductState.waiting_for_edit_brand)
 	
-	current_brand = product[23] if len(product) > 23 and product[23] else "Belgilanmagan"
+	current_brand = product.brand or "Belgilanmagan"
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -1990,7 +2042,7 @@ async def edit_brand_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, brand=new_brand)
+	success = await run_write(update_product_info, product_id, brand=new_brand)
 	
 	if success:
 		await message.answer(f"✅ Tovar brendi yangilandi: {new_brand}")
@@ -2016,7 +2068,7 @@ async def clear_brand_callback(callback: CallbackQuery, state: FSMContext):
 	
 	product_id = callback.data.split("_")[2]
 	
-	success = update_product_info(product_id, brand=None)
+	success = await run_write(update_product_info, product_id, brand=None)
 	
 	if success:
 		await callback.answer("✅ Brend o'chirildi")
@@ -2032,7 +2084,7 @@ async def edit_warranty_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -2041,7 +2093,7 @@ async def edit_warranty_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="warranty")
 	await state.set_state(ProductState.waiting_for_edit_warranty)
 	
-	current_warranty = product[22] if len(product) > 22 and product[22] else 0
+	current_warranty = product.warranty_months or 0
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -2084,7 +2136,7 @@ async def edit_warranty_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, warranty_months=new_warranty)
+	success = await run_write(update_product_info, product_id, warranty_months=new_warranty)
 	
 	if success:
 		warranty_text = f"{new_warranty} oy" if new_warranty > 0 else "Kafolatsiz"
@@ -2111,7 +2163,7 @@ async def clear_warranty_callback(callback: CallbackQuery, state: FSMContext):
 	
 	product_id = callback.data.split("_")[2]
 	
-	success = update_product_info(product_id, warranty_months=0)
+	success = await run_write(update_product_info, product_id, warranty_months=0)
 	
 	if success:
 		await callback.answer("✅ Kafolat o'chirildi")
@@ -2127,7 +2179,7 @@ async def edit_uzum_link_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[3]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -2136,7 +2188,7 @@ async def edit_uzum_link_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="uzum_link")
 	await state.set_state(ProductState.waiting_for_edit_uzum_link)
 	
-	current_link = product[5] if len(product) > 5 and product[5] else "Mavjud emas"
+	current_link = product.uzum_link or "Mavjud emas"
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -2172,7 +2224,7 @@ async def edit_uzum_link_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, uzum_link=new_link)
+	success = await run_write(update_product_info, product_id, uzum_link=new_link)
 	
 	if success:
 		await message.answer("✅ Uzum linki yangilandi")
@@ -2198,7 +2250,7 @@ async def clear_uzum_link_callback(callback: CallbackQuery, state: FSMContext):
 	
 	product_id = callback.data.split("_")[3]
 	
-	success = update_product_info(product_id, uzum_link=None)
+	success = await run_write(update_product_info, product_id, uzum_link=None)
 	
 	if success:
 		await callback.answer("✅ Uzum linki o'chirildi")
@@ -2214,7 +2266,7 @@ async def edit_image_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -2223,7 +2275,7 @@ async def edit_image_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="image")
 	await state.set_state(ProductState.waiting_for_edit_image)
 	
-	current_image = "Mavjud" if product[6] else "Mavjud emas"
+	current_image = "Mavjud" if product.image_file_id else "Mavjud emas"
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -2255,7 +2307,7 @@ async def edit_image_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, image_file_id=new_image_id)
+	success = await run_write(update_product_info, product_id, image_file_id=new_image_id)
 	
 	if success:
 		await message.answer("✅ Tovar rasmi yangilandi")
@@ -2288,7 +2340,7 @@ async def clear_image_callback(callback: CallbackQuery, state: FSMContext):
 	
 	product_id = callback.data.split("_")[2]
 	
-	success = update_product_info(product_id, image_file_id=None)
+	success = await run_write(update_product_info, product_id, image_file_id=None)
 	
 	if success:
 		await callback.answer("✅ Rasm o'chirildi")
@@ -2304,7 +2356,7 @@ async def edit_video_callback(callback: CallbackQuery, state: FSMContext):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
@@ -2313,7 +2365,7 @@ async def edit_video_callback(callback: CallbackQuery, state: FSMContext):
 	await state.update_data(editing_product_id=product_id, editing_field="video")
 	await state.set_state(ProductState.waiting_for_edit_video)
 	
-	current_video = "Mavjud" if product[7] else "Mavjud emas"
+	current_video = "Mavjud" if product.video_file_id else "Mavjud emas"
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -2345,7 +2397,7 @@ async def edit_video_handler(message: Message, state: FSMContext):
 	state_data = await state.get_data()
 	product_id = state_data.get('editing_product_id')
 	
-	success = update_product_info(product_id, video_file_id=new_video_id)
+	success = await run_write(update_product_info, product_id, video_file_id=new_video_id)
 	
 	if success:
 		await message.answer("✅ Tovar videosi yangilandi")
@@ -2378,7 +2430,7 @@ async def clear_video_callback(callback: CallbackQuery, state: FSMContext):
 	
 	product_id = callback.data.split("_")[2]
 	
-	success = update_product_info(product_id, video_file_id=None)
+	success = await run_write(update_product_info, product_id, video_file_id=None)
 	
 	if success:
 		await callback.answer("✅ Video o'chirildi")
@@ -2394,16 +2446,16 @@ async def toggle_product_callback(callback: CallbackQuery):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
 		return
 	
-	current_status = product[9]
+	current_status = product.is_active
 	new_status = 0 if current_status else 1
 	
-	success = update_product_status(product_id, new_status)
+	success = await run_write(update_product_status, product_id, new_status)
 	
 	if success:
 		status_text = "faollashtirildi" if new_status else "o'chirildi"
@@ -2419,7 +2471,7 @@ async def duplicate_product_callback(callback: CallbackQuery):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	new_product_id = duplicate_product(product_id)
+	new_product_id = await run_write(duplicate_product, product_id)
 	
 	if new_product_id:
 		await callback.answer(f"✅ Tovar nusxalandi: {new_product_id}")
@@ -2434,13 +2486,13 @@ async def delete_product_callback(callback: CallbackQuery):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	product = get_product(product_id)
+	product = await run_db(get_product, product_id)
 	
 	if not product:
 		await callback.answer("❌ Tovar topilmadi")
 		return
 	
-	name = product[2]
+	name = product.name
 	
 	keyboard = InlineKeyboardMarkup(
 		inline_keyboard=[
@@ -2467,7 +2519,7 @@ async def confirm_delete_callback(callback: CallbackQuery):
 		return
 	
 	product_id = callback.data.split("_")[2]
-	success = delete_product_permanently(product_id)
+	success = await run_write(delete_product_permanently, product_id)
 	
 	if success:
 		await callback.answer("✅ Tovar butunlay o'chirildi")
@@ -2551,7 +2603,7 @@ async def sheets_url_handler(message: Message, state: FSMContext):
 		)
 		return
 	
-	update_setting("google_sheets_url", url)
+	await run_write(update_setting, "google_sheets_url", url)
 	await state.clear()
 	
 	keyboard = InlineKeyboardMarkup(
@@ -2600,7 +2652,8 @@ async def test_sheets_connection_callback(callback: CallbackQuery):
 			'izohlar': 'Bu test ma\'lumoti'
 		}
 		
-		sheets_success = save_order_to_google_sheets(test_data)
+		# Admin testi natijani kutadi, lekin event loop bloklanmaydi
+		sheets_success = await asyncio.to_thread(save_order_to_google_sheets, test_data)
 		
 		if sheets_success:
 			text = "✅ <b>ULANISH MUVAFFAQIYATLI!</b>\n\n"
@@ -2637,7 +2690,7 @@ async def clear_sheets_url_callback(callback: CallbackQuery):
 		await callback.answer("⚠️ Bu funksiya faqat adminlar uchun.")
 		return
 	
-	update_setting("google_sheets_url", "")
+	await run_write(update_setting, "google_sheets_url", "")
 	await callback.answer("✅ URL o'chirildi")
 	await show_google_sheets_settings(callback)
 
@@ -3011,7 +3064,7 @@ async def finalize_product_creation(message: Message, state: FSMContext):
 	image_file_id = state_data.get('image_file_id')
 	video_file_id = state_data.get('video_file_id')
 	
-	success = add_product(
+	success = await run_write(add_product,
 		product_id=product_id,
 		name=product_name,
 		description=product_description,
@@ -3081,7 +3134,7 @@ async def back_to_admin_panel_callback(callback: CallbackQuery):
 		return
 	
 	try:
-		stats = get_product_statistics()
+		stats = await run_db(get_product_statistics)
 		
 		text = "🛍 <b>TOVAR BOSHQARUV PANELI</b>\n"
 		text += "---------------------------------------------\n\n"